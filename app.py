@@ -9,10 +9,26 @@ import time
 # Import your existing modules
 from src.data.map_data import MapData
 from src.data.traffic_data import TrafficData
-from src.algorithms.dijkstra import dijkstra
-from src.algorithms.a_star import a_star
-from src.utils.visualization import create_map_visualization
+from src.data.traffic_history import create_traffic_history
+from src.data.traffic_profiles import get_traffic_profiles, refresh_traffic_profiles_async
+from src.data.graph_builder import get_compiled_graph
+from src.data.street_index import get_street_index
+from src.data.street_search import DEFAULT_LIMIT as DEFAULT_SUGGESTIONS, get_street_search
+from src.algorithms.contraction_hierarchies import load_contraction_hierarchy, refresh_hierarchy_async
+from src.algorithms.customizable_ch import customize, get_cch_topology
+from src.algorithms.landmarks import LandmarksNotReady, get_landmark_tables, refresh_landmarks_async
+from src.algorithms.alternatives import alternative_routes
+from src.algorithms.isochrone import isochrone
+from src.algorithms.time_dependent import departure_hours
+from src.algorithms.matrix import METHODS as MATRIX_METHODS, travel_time_matrix
+from src.api.routing_api import ALGORITHMS, find_path
+from src.api.batch_routing import BatchRouter
+from src.api.route_cache import create_route_cache
+from src.api.traffic_api import create_traffic_api
+from src.utils.map_layers import create_base_layer_cache
 from src.utils.geocoding import GeocodingService
+from src.utils.geocode_cache import create_geocode_cache
+from src.utils.spatial_index import get_spatial_index
 from src.utils.config import load_config
 
 app = Flask(__name__, 
@@ -33,28 +49,147 @@ except Exception as e:
 
 api_key = config.get('traffic', {}).get('api_key') or os.environ.get('TOMTOM_API_KEY')
 update_interval = config.get('traffic', {}).get('update_interval', 300)
+routing_engine = config.get('routing', {}).get('engine', "objects")
+default_algorithm = config.get('routing', {}).get('default_algorithm', "a_star")
+customizable = config.get('routing', {}).get('customizable', True)
+heuristic = config.get('routing', {}).get('heuristic', "haversine")
+max_matrix_elements = config.get('routing', {}).get('max_matrix_elements', 10000)
+max_isochrone_minutes = config.get('routing', {}).get('max_isochrone_minutes', 60)
+max_batch_pairs = config.get('routing', {}).get('max_batch_pairs', 10000)
+max_alternatives = config.get('routing', {}).get('max_alternatives', 3)
+max_suggestions = config.get('geocoding', {}).get('max_suggestions', 20)
 
 # Load map data (this is done once when app starts)
 print("Loading map data...")
-map_data = MapData(city=config.get('map', {}).get('city', "Tempe, AZ"))
+map_data = MapData(
+    city=config.get('map', {}).get('city', "Tempe, AZ"),
+    network_type=config.get('map', {}).get('network_type', "drive")
+)
 map_data.load_map()
 print(f"Loaded {len(map_data.intersections)} intersections and {len(map_data.roads)} roads")
 
+# Any client may ask for "ch", so the hierarchy is prepared whatever the
+# default. The customizable variant orders the network once and is cheaply
+# re-weighted after every traffic update; otherwise a hierarchy is loaded
+# from (or saved to) the cache directory and contracted again in the
+# background after updates. Requests never contract the graph themselves:
+# until a hierarchy matches the traffic, "ch" falls back to bidirectional
+# search (see HierarchyNotReady).
+hierarchy_path = 'cache/contraction_hierarchy.npz'
+
+def prepare_hierarchy():
+    if customizable:
+        print("Building customizable hierarchy topology...")
+        get_cch_topology(map_data)
+        customize(map_data)
+    else:
+        os.makedirs('cache', exist_ok=True)
+        load_contraction_hierarchy(map_data, hierarchy_path)
+
+if default_algorithm == "ch":
+    prepare_hierarchy()
+else:
+    # Startup doesn't wait for an algorithm few requests use
+    threading.Thread(target=prepare_hierarchy, daemon=True).start()
+get_compiled_graph(map_data).contract_on_demand = False
+
+# Landmarks for the ALT heuristic are selected once; their distance
+# tables are recomputed in the background after traffic updates. Any
+# client may ask for "alt", so they are built in the background when the
+# config doesn't use them, and "alt" is refused until then.
+def prepare_landmarks():
+    print("Selecting ALT landmarks...")
+    get_landmark_tables(
+        map_data,
+        count=config.get('routing', {}).get('landmarks', 16),
+        strategy=config.get('routing', {}).get('landmark_strategy', "avoid"),
+        build=True
+    )
+
+if heuristic == "alt" or default_algorithm == "alt":
+    prepare_landmarks()
+else:
+    threading.Thread(target=prepare_landmarks, daemon=True).start()
+get_compiled_graph(map_data).landmarks_on_demand = False
+
+def refresh_speedups(delta=None):
+    """
+    Bring precomputed routing structures in use up to date with traffic
+
+    Subscribed to traffic updates, so it only runs when a road changed.
+    Landmark tables stay admissible lower bounds while roads only get
+    slower, so they are recomputed once a delta makes some road faster.
+    """
+    if getattr(map_data.compiled_graph, 'cch_topology', None) is not None:
+        start = time.time()
+        customize(map_data)
+        print(f"Hierarchy customized in {time.time() - start:.2f}s")
+    elif getattr(map_data.compiled_graph, 'contraction_hierarchy', None) is not None:
+        # Saved too, so the file matches the traffic a restart restores
+        refresh_hierarchy_async(map_data, path=hierarchy_path)
+    if delta is None or delta.faster:
+        refresh_landmarks_async(map_data)
+    # Render the new base layer now rather than in the next request
+    base_layers.url(map_data, traffic_data)
+
 # Initialize services
-traffic_data = TrafficData(map_data, api_key=api_key)
-geocoding = GeocodingService()
+history_settings = config.get('traffic', {}).get('history', {})
+traffic_history = create_traffic_history(config, get_compiled_graph(map_data))
+traffic_data = TrafficData(map_data, history=traffic_history,
+                           traffic_api=create_traffic_api(config, api_key),
+                           delta_threshold=config.get('traffic', {}).get('delta_threshold', 0.05))
+# Geocoded addresses on disk, shared between workers and restarts
+geocoding = GeocodingService(cache=create_geocode_cache(config),
+                             street_index=get_street_index(map_data))
+# Build the autocomplete index now rather than on the first keystroke
+get_street_search(map_data)
+# Route results per traffic version; None when disabled in config
+route_cache = create_route_cache(config)
+# Traffic-colored road layer, rendered once per traffic state
+base_layers = create_base_layer_cache(config)
+# Updates publish the roads they changed, and caches drop only what
+# those roads affect
+if route_cache is not None:
+    traffic_data.subscribe(route_cache.apply_delta)
+traffic_data.subscribe(base_layers.apply_delta)
+# Worker processes for /api/routes/batch, started on the first large batch
+batch_router = BatchRouter(
+    map_data,
+    processes=config.get('routing', {}).get('batch_processes') or None
+)
 
 # Background traffic updates
 def update_traffic_periodically(traffic_data, interval):
     """Background thread to update traffic at regular intervals"""
+    profiles_built = time.time()
     while True:
         try:
-            traffic_data.update_traffic()
-            print(f"Traffic updated at {time.strftime('%H:%M:%S')}")
+            delta = traffic_data.update_traffic()
+            print(f"Traffic updated at {time.strftime('%H:%M:%S')}: {len(delta)} roads changed")
+            if traffic_history is not None:
+                traffic_history.compact(
+                    history_settings.get('retention_days', 90) * 86400,
+                    downsample_after=history_settings.get('downsample_after_days', 14) * 86400
+                )
+                # Fold the traffic recorded since into the departure profiles
+                if time.time() - profiles_built >= history_settings.get('profile_refresh_interval', 3600):
+                    refresh_traffic_profiles_async(map_data, traffic_history)
+                    profiles_built = time.time()
         except Exception as e:
             print(f"Error updating traffic: {e}")
         time.sleep(interval)
 
+# Warm restart: start from the last recorded traffic rather than waiting
+# for the first API call, and route departures on the profiles observed
+# so far once the history covers a whole day (until then, on the current
+# traffic; see get_traffic_profiles)
+restored = traffic_data.restore_latest(max_age=history_settings.get('restore_max_age', 3600))
+if traffic_history is not None:
+    refresh_traffic_profiles_async(map_data, traffic_history)
+
+# From here on the speedups are refreshed by updates that change a road
+traffic_data.subscribe(refresh_speedups)
+
 # Start the background traffic update thread
 traffic_thread = threading.Thread(
     target=update_traffic_periodically,
@@ -63,61 +198,26 @@ traffic_thread = threading.Thread(
 )
 traffic_thread.start()
 
-# Initial traffic update
-traffic_data.update_traffic()
+# Initial traffic update, unless the history already provided one; the
+# background thread fetches fresh data either way. An update that changed
+# roads has already refreshed the speedups through its subscription.
+if restored or not traffic_data.update_traffic():
+    refresh_speedups()
 
 # Helper functions
-def get_node_description(node_id):
-    """Generate a human-readable description of an intersection node"""
-    intersection = map_data.intersections[node_id]
-    
-    # Get all road names connected to this intersection
-    road_names = set()
-    for road in intersection.connections:
-        if road.name:
-            # Handle if road.name is a list
-            if isinstance(road.name, list):
-                for name in road.name:
-                    if name:  # Only add non-empty names
-                        road_names.add(name)
-            else:
-                road_names.add(road.name)
-    
-    if not road_names:
-        return f"Unnamed intersection at {intersection.lat:.6f}, {intersection.lon:.6f}"
-    
-    if len(road_names) == 1:
-        return f"{next(iter(road_names))}"
-    
-    # If we have two or more road names, it's an intersection
-    road_list = sorted(list(road_names))
-    if len(road_list) == 2:
-        return f"Intersection of {road_list[0]} and {road_list[1]}"
-    else:
-        main_roads = road_list[:2]
-        return f"Intersection of {main_roads[0]} and {main_roads[1]} (+ {len(road_list)-2} more)"
-
 def find_nodes_by_coordinates(lat, lon, max_count=5):
     """Find nearest nodes to the given coordinates"""
-    from src.utils.geospatial import haversine_distance
-    
-    # Calculate distances to all nodes
-    nodes_with_distances = []
-    
-    for node_id, intersection in map_data.intersections.items():
-        distance = haversine_distance(lat, lon, intersection.lat, intersection.lon)
-        description = get_node_description(node_id)
-        nodes_with_distances.append({
+    nodes = []
+    for node_id, distance in get_spatial_index(map_data).nearest(lat, lon, max_count):
+        intersection = map_data.intersections[node_id]
+        nodes.append({
             "node_id": node_id,
             "distance": distance,
-            "description": description,
+            "description": map_data.describe(node_id),
             "lat": intersection.lat,
             "lon": intersection.lon
         })
-    
-    # Sort by distance and return the closest ones
-    nodes_with_distances.sort(key=lambda x: x["distance"])
-    return nodes_with_distances[:max_count]
+    return nodes
 
 def find_node_by_id(node_id):
     """Helper function to find a node by ID, handling type conversion if needed"""
@@ -139,6 +239,29 @@ def find_node_by_id(node_id):
     
     return None
 
+def route_details(route):
+    """Path, points, time, distance and directions of a Route for responses"""
+    # Route points are drawn by the frontend on top of the shared
+    # traffic base layer, so nothing is rendered per route
+    route_points = []
+    for node_id in route.path:
+        node = map_data.intersections[node_id]
+        route_points.append({"lat": node.lat, "lon": node.lon})
+    
+    return {
+        "path": route.path,
+        "route_points": route_points,
+        "time_minutes": route.total_time,
+        "distance_km": route.total_distance / 1000,
+        # Turn-by-turn directions straight from the roads the search used
+        "directions": route.directions(map_data)
+    }
+
+def resolve_node_id(node_id):
+    """Matching intersection ID, or the input unchanged if there is none"""
+    found = find_node_by_id(node_id)
+    return node_id if found is None else found
+
 # Define API routes
 @app.route('/')
 def index():
@@ -169,6 +292,20 @@ def geocode_location():
         "nearest_nodes": nearest_nodes
     })
 
+@app.route('/api/autocomplete', methods=['GET'])
+def autocomplete():
+    """Streets and intersections of the map matching a partly typed location"""
+    query = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SUGGESTIONS))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not 1 <= limit <= max_suggestions:
+        return jsonify({"error": f"limit must be between 1 and {max_suggestions}"}), 400
+    
+    suggestions = get_street_search(map_data).complete(query, limit) if query.strip() else []
+    return jsonify({"query": query, "suggestions": suggestions})
+
 @app.route('/api/explore-area', methods=['POST'])
 def explore_area():
     """Get nodes in a specific area"""
@@ -180,27 +317,21 @@ def explore_area():
     lon = float(data['lon'])
     radius = float(data.get('radius', 0.01))  # Default ~1km radius
     
-    # Find nodes in this area
+    # Find nodes in this area, closest first
     area_nodes = []
-    for node_id, intersection in map_data.intersections.items():
-        dist = ((intersection.lat - lat) ** 2 + 
-                (intersection.lon - lon) ** 2) ** 0.5
-        if dist < radius:
-            description = get_node_description(node_id)
-            area_nodes.append({
-                "node_id": node_id,
-                "distance": dist,
-                "description": description,
-                "lat": intersection.lat,
-                "lon": intersection.lon
-            })
-    
-    # Sort by distance
-    area_nodes.sort(key=lambda x: x["distance"])
+    for node_id, dist in get_spatial_index(map_data).within_degrees(lat, lon, radius, limit=50):
+        intersection = map_data.intersections[node_id]
+        area_nodes.append({
+            "node_id": node_id,
+            "distance": dist,
+            "description": map_data.describe(node_id),
+            "lat": intersection.lat,
+            "lon": intersection.lon
+        })
     
     return jsonify({
         "center": {"lat": lat, "lon": lon},
-        "nodes": area_nodes[:50]  # Limit to 50 nodes max
+        "nodes": area_nodes  # Limited to 50 nodes max
     })
 
 @app.route('/api/route', methods=['POST'])
@@ -216,86 +347,60 @@ def find_route():
     if not start_node or not end_node:
         return jsonify({"error": "Invalid node IDs"}), 400
     
-    algorithm = data.get('algorithm', 'a_star')
+    algorithm = data.get('algorithm', default_algorithm)
+    if algorithm not in ALGORITHMS:
+        return jsonify({"error": f"Unknown algorithm '{algorithm}'"}), 400
     
     try:
-        # Find route
-        if algorithm == 'a_star':
-            path, time_minutes = a_star(map_data, start_node, end_node)
+        alternatives = int(data.get('alternatives', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid alternatives"}), 400
+    if not 0 <= alternatives <= max_alternatives:
+        return jsonify({"error": f"alternatives must be between 0 and {max_alternatives}"}), 400
+    
+    # With a departure time the route follows the historical traffic
+    # profiles for that time of day rather than current traffic
+    departure = None
+    if data.get('departure_time') is not None:
+        try:
+            # Whole minutes, so nearby requests share a cache entry
+            departure = round(departure_hours(data['departure_time']) * 60) / 60
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid departure_time"}), 400
+        if alternatives:
+            return jsonify({"error": "alternatives are not available with departure_time"}), 400
+    
+    key = None
+    if alternatives:
+        key = (start_node, end_node, algorithm, alternatives)
+    elif departure is not None:
+        # Profiles rebuilt from history take effect without a traffic update
+        profiles = get_traffic_profiles(map_data)
+        key = (start_node, end_node, algorithm, "departure", departure, profiles.created)
+    if route_cache is not None:
+        if key is None:
+            cached = route_cache.get(start_node, end_node, algorithm, traffic_data)
         else:
-            path, time_minutes = dijkstra(map_data, start_node, end_node)
+            cached = route_cache.lookup(key, traffic_data)
+        if cached is not None:
+            return jsonify(base_layers.attach(cached, map_data, traffic_data))
+    traffic_version = traffic_data.version
+    
+    try:
+        # Find route
+        route = find_path(map_data, start_node, end_node,
+                          algorithm=algorithm, engine=routing_engine,
+                          heuristic=heuristic, departure_time=departure)
+        path = route.path
         
         if not path or len(path) < 2:
             return jsonify({"error": "No route found"}), 404
-            
-        # Generate route details
-        route_details = []
-        total_distance = 0
-        prev_road_name = None
-        
-        # Create map visualization
-        map_file = f"route_{start_node}_{end_node}.html"
-        create_map_visualization(
-            map_data, 
-            path=path, 
-            traffic_data=traffic_data,
-            output_file=f"static/{map_file}"
-        )
-        
-        # Get route points for frontend
-        route_points = []
-        for node_id in path:
-            node = map_data.intersections[node_id]
-            route_points.append({"lat": node.lat, "lon": node.lon})
-            
-        # Generate turn-by-turn directions
-        directions = []
-        
-        for i in range(len(path)-1):
-            current = path[i]
-            next_node = path[i+1]
-            
-            current_desc = get_node_description(current)
-            next_desc = get_node_description(next_node)
-            
-            for road in map_data.intersections[current].connections:
-                if road.end.id == next_node:
-                    road_name = road.name if road.name else "unnamed road"
-                    if isinstance(road_name, list):
-                        road_name = road_name[0] if road_name else "unnamed road"
-                    
-                    traffic_level = road.current_traffic
-                    if traffic_level > 1.8:
-                        traffic_status = "heavy traffic"
-                    elif traffic_level > 1.2:
-                        traffic_status = "moderate traffic"
-                    else:
-                        traffic_status = "light traffic"
-                    
-                    if i == 0:
-                        direction = "Start on"
-                    else:
-                        direction = "Continue on" if prev_road_name == road_name else "Turn onto"
-                    
-                    directions.append({
-                        "direction": direction,
-                        "road_name": road_name,
-                        "next_intersection": next_desc,
-                        "distance": road.length,
-                        "traffic_status": traffic_status,
-                        "current_node": current,
-                        "next_node": next_node
-                    })
-                    
-                    total_distance += road.length
-                    prev_road_name = road_name
-                    break
         
         # Prepare response
         response = {
             "start_node": {
                 "id": start_node,
-                "description": get_node_description(start_node),
+                "description": map_data.describe(start_node),
                 "coordinates": {
                     "lat": map_data.intersections[start_node].lat,
                     "lon": map_data.intersections[start_node].lon
@@ -303,36 +408,228 @@ def find_route():
             },
             "end_node": {
                 "id": end_node,
-                "description": get_node_description(end_node),
+                "description": map_data.describe(end_node),
                 "coordinates": {
                     "lat": map_data.intersections[end_node].lat,
                     "lon": map_data.intersections[end_node].lon
                 }
             },
-            "path": path,
-            "route_points": route_points,
-            "time_minutes": time_minutes,
-            "distance_km": total_distance / 1000,
-            "directions": directions,
-            "map_url": map_file
+            **route_details(route)
         }
+        if departure is not None:
+            response["departure_time"] = data['departure_time']
+            # "history" for observed time-of-day means, or "current" while
+            # the history is too short and every road keeps its current
+            # multiplier for the whole trip
+            response["traffic_profile"] = profiles.source
+        
+        # Only cache results computed on the traffic that is still current.
+        # Compiled engines report the snapshot they pinned; the objects
+        # engine reads live traffic, so fall back to the version at the start.
+        if route.traffic_version is not None:
+            traffic_version = route.traffic_version
         
-        return jsonify(response)
+        if alternatives:
+            # Alternatives are filtered for overlap and detours against the
+            # route shown above, not the generator's own (equal-time) best
+            routes = alternative_routes(map_data, start_node, end_node,
+                                        count=alternatives + 1, main=route)
+            response["alternatives"] = [route_details(alternative) for alternative in routes[1:]]
+            if any(alternative.traffic_version != traffic_version for alternative in routes[1:]):
+                traffic_version = None
+        
+        # The base layer URL is added per request, not cached: entries
+        # outlive traffic updates that change the layer (see apply_delta)
+        if route_cache is not None and traffic_version is not None:
+            if key is None:
+                route_cache.put(start_node, end_node, algorithm, traffic_data, response,
+                                edge_ids=route.edge_ids, traffic_version=traffic_version)
+            else:
+                route_cache.store(key, traffic_data, response, traffic_version=traffic_version)
+        
+        return jsonify(base_layers.attach(response, map_data, traffic_data))
     
+    except LandmarksNotReady as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": f"Error finding route: {str(e)}"}), 500
 
+@app.route('/api/matrix', methods=['POST'])
+def route_matrix():
+    """Travel times between many start and end nodes"""
+    data = request.json
+    if not data or not data.get('sources'):
+        return jsonify({"error": "Missing sources"}), 400
+    
+    source_ids = data['sources']
+    target_ids = data.get('targets') or source_ids  # Square matrix by default
+    sources = [find_node_by_id(node_id) for node_id in source_ids]
+    targets = [find_node_by_id(node_id) for node_id in target_ids]
+    invalid = list(dict.fromkeys(str(node_id) for node_id, found
+                                 in zip(source_ids + target_ids, sources + targets)
+                                 if found is None))
+    if invalid:
+        return jsonify({"error": "Invalid node IDs", "invalid": invalid}), 400
+    if len(sources) * len(targets) > max_matrix_elements:
+        return jsonify({"error": f"Matrix larger than {max_matrix_elements} elements"}), 400
+    
+    method = data.get('method', "auto")
+    if method not in MATRIX_METHODS:
+        return jsonify({"error": f"Unknown method '{method}'"}), 400
+    
+    try:
+        matrix = travel_time_matrix(map_data, sources, targets, method=method,
+                                    include_paths=bool(data.get('include_paths', False)))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"Error computing matrix: {str(e)}"}), 500
+    
+    response = {
+        "sources": sources,
+        "targets": targets,
+        "durations_minutes": matrix.minutes(),
+        "method": matrix.method,
+        "traffic_version": matrix.traffic_version
+    }
+    if matrix.paths is not None:
+        response["paths"] = matrix.paths
+    return jsonify(response)
+
+@app.route('/api/routes/batch', methods=['POST'])
+def route_batch():
+    """Route many independent start/end pairs in parallel"""
+    data = request.json
+    if not data or not data.get('pairs'):
+        return jsonify({"error": "Missing pairs"}), 400
+    pairs = data['pairs']
+    if len(pairs) > max_batch_pairs:
+        return jsonify({"error": f"Batch larger than {max_batch_pairs} pairs"}), 400
+    
+    algorithm = data.get('algorithm', default_algorithm)
+    if algorithm not in ALGORITHMS:
+        return jsonify({"error": f"Unknown algorithm '{algorithm}'"}), 400
+    
+    # Pairs are [start, end] or {"start_node": ..., "end_node": ...}; IDs
+    # that do not resolve are passed through and reported per item
+    resolved = []
+    for pair in pairs:
+        if isinstance(pair, dict):
+            pair = (pair.get('start_node'), pair.get('end_node'))
+        if not isinstance(pair, (list, tuple)) or len(pair) != 2:
+            return jsonify({"error": "Each pair needs a start and end node"}), 400
+        start_node, end_node = pair
+        resolved.append((resolve_node_id(start_node), resolve_node_id(end_node)))
+    
+    try:
+        results = batch_router.route(resolved, algorithm=algorithm, heuristic=heuristic)
+    except LandmarksNotReady as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"Error routing batch: {str(e)}"}), 500
+    
+    return jsonify({
+        "algorithm": algorithm,
+        "routes": results,
+        "failed": sum(1 for result in results if "error" in result)
+    })
+
+@app.route('/api/isochrone', methods=['POST'])
+def drive_time_area():
+    """Everything reachable from a node (or coordinates) within a time budget"""
+    data = request.json
+    if not data or 'minutes' not in data:
+        return jsonify({"error": "Missing minutes"}), 400
+    try:
+        minutes = float(data['minutes'])
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid minutes"}), 400
+    if not 0 < minutes <= max_isochrone_minutes:
+        return jsonify({"error": f"minutes must be between 0 and {max_isochrone_minutes}"}), 400
+    
+    if 'node_id' in data:
+        origin = find_node_by_id(data['node_id'])
+        if origin is None:
+            return jsonify({"error": "Invalid node ID"}), 400
+    elif 'lat' in data and 'lon' in data:
+        nearest = get_spatial_index(map_data).nearest(float(data['lat']), float(data['lon']), 1)
+        if not nearest:
+            return jsonify({"error": "No intersection near location"}), 404
+        origin = nearest[0][0]
+    else:
+        return jsonify({"error": "Missing node_id or lat/lon"}), 400
+    
+    # Budgets are rounded so near-identical requests share a cache entry
+    minutes = round(minutes, 1)
+    key = ("isochrone", origin, minutes)
+    if route_cache is not None:
+        cached = route_cache.lookup(key, traffic_data)
+        if cached is not None:
+            return jsonify(cached)
+    
+    try:
+        area = isochrone(map_data, origin, minutes / 60)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"Error computing isochrone: {str(e)}"}), 500
+    
+    response = {
+        "origin": {
+            "id": origin,
+            "description": map_data.describe(origin),
+            "coordinates": {
+                "lat": map_data.intersections[origin].lat,
+                "lon": map_data.intersections[origin].lon
+            }
+        },
+        "minutes": minutes,
+        "nodes": area.nodes,
+        "times_minutes": [round(hours * 60, 2) for hours in area.times],
+        "polygon": area.to_geojson(),
+        "traffic_version": area.traffic_version
+    }
+    if route_cache is not None:
+        route_cache.store(key, traffic_data, response, traffic_version=area.traffic_version)
+    return jsonify(response)
+
 @app.route('/api/traffic/update', methods=['POST'])
 def update_traffic():
     """Force traffic update"""
     try:
-        traffic_data.update_traffic()
-        return jsonify({"message": "Traffic data updated"})
+        delta = traffic_data.update_traffic()
+        return jsonify({
+            "message": "Traffic data updated",
+            "changed_edges": len(delta),
+            "traffic_version": traffic_data.version
+        })
     except Exception as e:
         return jsonify({"error": f"Error updating traffic: {str(e)}"}), 500
 
+@app.route('/api/traffic/stats', methods=['GET'])
+def traffic_stats():
+    """Traffic update counters, including the roads changed per update"""
+    return jsonify(traffic_data.stats())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Route cache hit/miss counters"""
+    if route_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(route_cache.stats(), enabled=True))
+
+@app.route('/api/map/base-layer', methods=['GET'])
+def base_layer():
+    """URL of the traffic-colored road layer for the current traffic"""
+    return jsonify({
+        "url": base_layers.url(map_data, traffic_data),
+        "traffic_version": traffic_data.version
+    })
+
 @app.route('/api/map-data', methods=['GET'])
 def get_map_bounds():
     """Get map bounds and center"""
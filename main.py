@@ -1,12 +1,15 @@
 # main.py
 from src.data.map_data import MapData
 from src.data.traffic_data import TrafficData
-from src.algorithms.dijkstra import dijkstra
-from src.algorithms.a_star import a_star
+from src.api.routing_api import find_path
+from src.api.traffic_api import create_traffic_api
+from src.algorithms.landmarks import refresh_landmarks_async
 from src.utils.visualization import create_map_visualization
 from src.utils.geocoding import GeocodingService
+from src.utils.geocode_cache import create_geocode_cache
+from src.data.street_index import get_street_index
 from src.utils.config import load_config
-from src.utils.geospatial import haversine_distance
+from src.utils.spatial_index import get_spatial_index
 import time
 import os
 import threading
@@ -16,7 +19,10 @@ def update_traffic_periodically(traffic_data, interval):
     """Background thread to update traffic at regular intervals"""
     while True:
         try:
-            traffic_data.update_traffic()
+            delta = traffic_data.update_traffic()
+            # Tables stay admissible while roads only get slower
+            if delta.faster:
+                refresh_landmarks_async(traffic_data.map_data)
             print(f"Traffic updated at {datetime.datetime.now().strftime('%H:%M:%S')}")
         except Exception as e:
             print(f"Error updating traffic: {e}")
@@ -69,52 +75,12 @@ def find_node_by_id(node_id, map_data):
     
     return None
 
-def get_node_description(map_data, node_id):
-    """Generate a human-readable description of an intersection node"""
-    intersection = map_data.intersections[node_id]
-    
-    # Get all road names connected to this intersection
-    road_names = set()
-    for road in intersection.connections:
-        if road.name:
-            # Handle if road.name is a list
-            if isinstance(road.name, list):
-                for name in road.name:
-                    if name:  # Only add non-empty names
-                        road_names.add(name)
-            else:
-                road_names.add(road.name)
-    
-    if not road_names:
-        return f"Unnamed intersection at {intersection.lat:.6f}, {intersection.lon:.6f}"
-    
-    if len(road_names) == 1:
-        return f"{next(iter(road_names))}"
-    
-    # If we have two or more road names, it's an intersection
-    road_list = sorted(list(road_names))
-    if len(road_list) == 2:
-        return f"Intersection of {road_list[0]} and {road_list[1]}"
-    else:
-        main_roads = road_list[:2]
-        return f"Intersection of {main_roads[0]} and {main_roads[1]} (+ {len(road_list)-2} more)"
-
 def find_nearest_nodes(map_data, lat, lon, count=5):
     """Find the nearest nodes to the given coordinates with descriptions"""
-    # Calculate distances to all nodes
-    nodes_with_distances = []
-    
-    for node_id, intersection in map_data.intersections.items():
-        distance = haversine_distance(lat, lon, intersection.lat, intersection.lon)
-        
-        # Get description based on connected roads
-        description = get_node_description(map_data, node_id)
-        
-        nodes_with_distances.append((node_id, distance, description))
-    
-    # Sort by distance and return the closest ones
-    nodes_with_distances.sort(key=lambda x: x[1])
-    return nodes_with_distances[:count]
+    return [
+        (node_id, distance, map_data.describe(node_id))
+        for node_id, distance in get_spatial_index(map_data).nearest(lat, lon, count)
+    ]
 
 def find_nodes_by_location(map_data, geocoding):
     """Find nodes by address, landmark, or nearby road intersections"""
@@ -208,17 +174,8 @@ def explore_node_area(map_data):
     area_name, area_lat, area_lon = areas[int(choice) - 1]
     print(f"\nExploring {area_name} area...")
     
-    # 4. Find nodes in this area
-    area_nodes = []
-    for node_id, intersection in map_data.intersections.items():
-        dist = ((intersection.lat - area_lat) ** 2 + 
-                (intersection.lon - area_lon) ** 2) ** 0.5
-        if dist < 0.01:  # Roughly 1.1 km radius
-            description = get_node_description(map_data, node_id)
-            area_nodes.append((node_id, dist, description))
-    
-    # Sort by distance
-    area_nodes.sort(key=lambda x: x[1])
+    # 4. Find nodes in this area (roughly 1.1 km radius), closest first
+    area_nodes = get_spatial_index(map_data).within_degrees(area_lat, area_lon, 0.01)
     
     # 5. Display nodes with their descriptions
     if not area_nodes:
@@ -226,8 +183,8 @@ def explore_node_area(map_data):
         return None
     
     print(f"\nFound {len(area_nodes)} nodes in the {area_name} area:")
-    for i, (node_id, dist, description) in enumerate(area_nodes[:20]):
-        print(f"{i+1}. {description} (Node ID: {node_id})")
+    for i, (node_id, dist) in enumerate(area_nodes[:20]):
+        print(f"{i+1}. {map_data.describe(node_id)} (Node ID: {node_id})")
     
     # 6. Let user select a node
     selection = input("\nSelect a node number (or press Enter to cancel): ")
@@ -261,13 +218,18 @@ def main():
     
     # Load map data
     print("Loading map data...")
-    map_data = MapData(city=config.get('map', {}).get('city', "Tempe, AZ"))
+    map_data = MapData(
+        city=config.get('map', {}).get('city', "Tempe, AZ"),
+        network_type=config.get('map', {}).get('network_type', "drive")
+    )
     map_data.load_map()
     print(f"Loaded {len(map_data.intersections)} intersections and {len(map_data.roads)} roads")
     
     # Initialize services
-    traffic_data = TrafficData(map_data, api_key=api_key)
-    geocoding = GeocodingService()
+    traffic_data = TrafficData(map_data, traffic_api=create_traffic_api(config, api_key),
+                               delta_threshold=config.get('traffic', {}).get('delta_threshold', 0.05))
+    geocoding = GeocodingService(cache=create_geocode_cache(config),
+                                 street_index=get_street_index(map_data))
     
     # Do an initial traffic update
     print("Fetching initial traffic data...")
@@ -352,49 +314,40 @@ def main():
             print(f"Finding best route from {start_node} to {end_node}...")
             
             # Choose algorithm
-            use_astar = config.get('routing', {}).get('default_algorithm', "a_star") == "a_star"
-            if use_astar:
+            algorithm = config.get('routing', {}).get('default_algorithm', "a_star")
+            engine = config.get('routing', {}).get('engine', "objects")
+            heuristic = config.get('routing', {}).get('heuristic', "haversine")
+            if algorithm == "alt" or (algorithm == "a_star" and heuristic == "alt"):
+                print("Using A* with landmarks (ALT) for routing")
+            elif algorithm == "a_star":
                 print("Using A* algorithm for routing")
+            elif algorithm == "ch":
+                print("Using Contraction Hierarchies for routing")
             else:
                 print("Using Dijkstra's algorithm for routing")
             
             try:
                 # Find route
-                if use_astar:
-                    path, time_minutes = a_star(map_data, start_node, end_node)
-                else:
-                    path, time_minutes = dijkstra(map_data, start_node, end_node)
+                route = find_path(map_data, start_node, end_node,
+                                  algorithm=algorithm, engine=engine,
+                                  heuristic=heuristic)
+                path, time_minutes = route
                 
                 if path and len(path) > 1:
                     print(f"Found route with {len(path)-1} segments")
                     print(f"Estimated travel time: {time_minutes:.1f} minutes")
                     
                     # Start and end descriptions
-                    start_desc = get_node_description(map_data, path[0])
-                    end_desc = get_node_description(map_data, path[-1])
+                    start_desc = map_data.describe(path[0])
+                    end_desc = map_data.describe(path[-1])
                     print(f"\nRoute from {start_desc} to {end_desc}:")
                     
                     # Display route info
                     print("\nTurn-by-turn directions:")
-                    total_distance = 0
-                    prev_road_name = None
-                    
-                    for i in range(len(path)-1):
-                        current = path[i]
-                        next_node = path[i+1]
-                        for road in map_data.intersections[current].connections:
-                            if road.end.id == next_node:
-                                road_name = road.name or "unnamed road"
-                                next_intersection = get_node_description(map_data, next_node)
-                                traffic_status = "heavy traffic" if road.current_traffic > 1.8 else \
-                                               "moderate traffic" if road.current_traffic > 1.2 else \
-                                               "light traffic"
-                                direction = "Start on" if i == 0 else ("Continue on" if prev_road_name == road_name else "Turn onto")
-                                print(f"  {i+1}. {direction} {road_name} toward {next_intersection}")
-                                print(f"     Travel {road.length:.0f}m ({traffic_status})")
-                                total_distance += road.length
-                                prev_road_name = road_name
-                                break
+                    for i, step in enumerate(route.directions(map_data)):
+                        print(f"  {i+1}. {step['direction']} {step['road_name']} toward {step['next_intersection']}")
+                        print(f"     Travel {step['distance']:.0f}m ({step['traffic_status']})")
+                    total_distance = route.total_distance
                     
                     print(f"\nTotal distance: {total_distance/1000:.2f} km")
                     
@@ -430,8 +383,10 @@ def main():
 
         elif choice == "4":
             print("Forcing traffic update...")
-            traffic_data.update_traffic()
-            print("Traffic data updated")
+            delta = traffic_data.update_traffic()
+            if delta.faster:
+                refresh_landmarks_async(map_data)
+            print(f"Traffic data updated: {len(delta)} roads changed")
 
         elif choice == "5":
             print("Exiting...")
@@ -1,4 +1,9 @@
 from .priority_queue import PriorityQueue
+from .dijkstra import _unwind_roads, _unwind_route
+from .landmarks import get_landmark_tables
+from ..data.graph_builder import get_compiled_graph
+from ..models.route import Route
+import heapq
 import math
 
 def haversine_distance(lat1, lon1, lat2, lon2):
@@ -15,7 +20,7 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     
     return c * r
 
-def a_star(graph, start, end):
+def a_star(graph, start, end, engine="objects", heuristic="haversine", stats=None):
     """
     Find shortest path using A* algorithm
     
@@ -23,10 +28,24 @@ def a_star(graph, start, end):
         graph: Graph representation with nodes and edges
         start: Starting intersection ID
         end: Destination intersection ID
+        engine: "objects" to walk Road objects, "csr" to search the
+            compiled array graph (see src/data/graph_builder.py)
+        heuristic: "haversine" (straight line at 50 km/h) or "alt"
+            (landmark lower bounds, see landmarks.py; always uses the
+            csr engine)
+        stats: Optional dict, receives the number of settled nodes
     
     Returns:
-        Tuple of (path, total_time) or (None, math.inf) if no path exists
+        Route (unpacks as (path, total_time)); its path is None and
+        total_time math.inf if no path exists
     """
+    if heuristic == "alt":
+        compiled = get_compiled_graph(graph)
+        get_landmark_tables(graph)
+        return a_star_csr(compiled, start, end, heuristic="alt", stats=stats)
+    if engine == "csr":
+        return a_star_csr(get_compiled_graph(graph), start, end, stats=stats)
+    
     # Get end coordinates for heuristic
     end_node = graph.intersections[end]
     end_lat, end_lon = end_node.lat, end_node.lon
@@ -49,11 +68,13 @@ def a_star(graph, start, end):
     ) / 50  # Assuming 50 km/h average speed
     f_score[start] = h_start
     
-    # Track path
+    # Track path: the road each node was reached by
     previous = {node: None for node in graph.intersections}
+    settled = 0
     
     while not queue.empty():
         current = queue.pop()
+        settled += 1
         
         # Found destination
         if current == end:
@@ -69,7 +90,7 @@ def a_star(graph, start, end):
             
             # If we found a better path, update
             if tentative_g_score < g_score[neighbor]:
-                previous[neighbor] = current
+                previous[neighbor] = road
                 g_score[neighbor] = tentative_g_score
                 
                 # Calculate heuristic
@@ -82,16 +103,86 @@ def a_star(graph, start, end):
                 f_score[neighbor] = tentative_g_score + h_score
                 queue.add(neighbor, f_score[neighbor])
     
+    if stats is not None:
+        stats['settled'] = settled
+    
     # Build path from start to end
     if g_score[end] == math.inf:
-        return None, math.inf
+        return Route.unreachable()
+    
+    return Route.from_roads(start, _unwind_roads(previous, start, end), g_score[end])
+
+def a_star_csr(compiled, start, end, heuristic="haversine", stats=None):
+    """
+    A* over a CompiledGraph
+    
+    Args:
+        compiled: CompiledGraph
+        start: Starting intersection ID
+        end: Destination intersection ID
+        heuristic: "haversine" (same estimate as a_star) or "alt" (uses
+            the landmark tables attached to the compiled graph)
+        stats: Optional dict, receives the number of settled nodes
+    
+    Returns:
+        Route, or an unreachable Route if no path exists
+    """
+    # Pin one traffic snapshot for the whole search
+    snapshot = compiled.traffic_snapshot
+    offsets, targets, weights = compiled.adjacency(snapshot)
+    source = compiled.index_of(start)
+    target = compiled.index_of(end)
+    
+    if heuristic == "alt":
+        estimate = compiled.landmark_tables.heuristic(target, snapshot.weights)
+    else:
+        lats, lons = compiled.coordinates()
+        end_lat, end_lon = lats[target], lons[target]
+        
+        def estimate(node):
+            return haversine_distance(
+                lats[node], lons[node],
+                end_lat, end_lon
+            ) / 50  # Assuming 50 km/h average speed
+    
+    g_score = [math.inf] * compiled.num_nodes
+    previous = [-1] * compiled.num_nodes  # edge each node was reached by
+    g_score[source] = 0
+    
+    h_start = estimate(source)
+    
+    # Lazy-deletion heap with the same tie-breaking and re-add semantics as
+    # PriorityQueue, so both engines expand nodes in the same order
+    counter = 0
+    latest = [-1] * compiled.num_nodes
+    latest[source] = counter
+    heap = [(h_start, counter, source)]
+    settled = 0
+    while heap:
+        _, count, current = heapq.heappop(heap)
+        if latest[current] != count:
+            continue
+        latest[current] = -1
+        settled += 1
+        if current == target:
+            break
         
-    path = []
-    current = end
-    while current != start:
-        path.append(current)
-        current = previous[current]
-    path.append(start)
-    path.reverse()
-    
-    return path, g_score[end]
\ No newline at end of file
+        current_g = g_score[current]
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            tentative_g_score = current_g + weights[edge]
+            if tentative_g_score < g_score[neighbor]:
+                g_score[neighbor] = tentative_g_score
+                previous[neighbor] = edge
+                h_score = estimate(neighbor)
+                counter += 1
+                latest[neighbor] = counter
+                heapq.heappush(heap, (tentative_g_score + h_score, counter, neighbor))
+    
+    if stats is not None:
+        stats['settled'] = settled
+    
+    if g_score[target] == math.inf:
+        return Route.unreachable()
+    
+    return _unwind_route(compiled, previous, source, target, g_score[target], snapshot)
@@ -0,0 +1,226 @@
+import heapq
+import math
+
+from .dijkstra import shortest_path_tree
+from ..data.graph_builder import get_compiled_graph
+from ..models.route import Route
+
+DEFAULT_MAX_STRETCH = 0.25       # alternative at most 25% slower than the best route
+DEFAULT_MAX_OVERLAP = 0.8        # share at most 80% of its time with accepted routes
+DEFAULT_LOCAL_OPTIMALITY = 0.25  # detours around the via node up to 25% of the best time are shortest paths
+DEFAULT_MAX_CANDIDATES = 64      # via paths evaluated before giving up
+
+
+def alternative_routes(graph, start, end, count=3, max_stretch=DEFAULT_MAX_STRETCH,
+                       max_overlap=DEFAULT_MAX_OVERLAP,
+                       local_optimality=DEFAULT_LOCAL_OPTIMALITY,
+                       max_candidates=DEFAULT_MAX_CANDIDATES, main=None):
+    """
+    Best route plus up to count - 1 reasonable alternatives (via-node method)
+
+    One forward search from start, continued past end until the stretch
+    bound, and one backward search from end give the shortest path through
+    every node v: start -> v -> end. Those via paths are the candidates, so
+    only two full searches run however many alternatives are requested.
+    Nodes on the same plateau (where both search trees follow the same
+    roads) produce the same via path, so each distinct path is evaluated
+    once. A candidate is accepted if it is
+    - at most max_stretch slower than the best route,
+    - shares at most max_overlap of its time with the routes accepted so far,
+    - locally optimal: the stretch of it within local_optimality * best
+      time on either side of the via node is itself a shortest path, so
+      the alternative takes no pointless detour.
+
+    Args:
+        graph: Graph representation with nodes and edges
+        start: Starting intersection ID
+        end: Destination intersection ID
+        count: Maximum number of routes returned, the best one included
+        max_stretch: Allowed extra travel time as a fraction of the best
+        max_overlap: Allowed shared travel time as a fraction of the candidate
+        local_optimality: Size of the local optimality test as a fraction of
+            the best travel time (0 disables it)
+        max_candidates: Via paths evaluated at most
+        main: Route already shown as the best one (e.g. from find_path). It
+            is returned first and the alternatives are checked against it,
+            rather than against the via path this search finds best, which
+            may be a different route of equal time.
+
+    Returns:
+        List of Routes, fastest first; empty if end is unreachable
+    """
+    compiled = get_compiled_graph(graph)
+    snapshot = compiled.traffic_snapshot
+    source = compiled.index_of(start)
+    target = compiled.index_of(end)
+
+    forward_adjacency = compiled.adjacency(snapshot)
+    forward, forward_edge = _search_tree(forward_adjacency, source, target, max_stretch)
+    best = forward[target]
+    if best == math.inf:
+        return []
+    if source == target:
+        return [Route.from_edges(compiled, source, [], 0, snapshot=snapshot)]
+
+    limit = best * (1 + max_stretch)
+    reverse_adjacency = compiled.reverse_adjacency(snapshot)
+    order = compiled.reverse_order().tolist()
+    backward, backward_position = _search_tree(reverse_adjacency, target, limit=limit)
+    # Edge each node leaves by on its shortest path to target
+    backward_edge = {node: order[position] for node, position in backward_position.items()}
+
+    weights = snapshot.weight_list()
+    sources = compiled.sources().tolist()
+    targets = forward_adjacency[1]
+
+    candidates = sorted(
+        (forward[node] + backward[node], node)
+        for node in forward
+        if node in backward and forward[node] + backward[node] <= limit
+    )
+
+    routes = []
+    accepted_edges = set()
+    if main is not None:
+        routes.append(main)
+        accepted_edges.update(_route_edges(compiled, main))
+    done = set()
+    evaluated = 0
+    for length, via in candidates:
+        if len(routes) >= count or evaluated >= max_candidates:
+            break
+        if via in done:
+            continue
+        evaluated += 1
+
+        edges, nodes, via_position = _via_path(forward_edge, backward_edge, sources, targets,
+                                               source, target, via)
+        done.update(_plateau(nodes, edges, via_position, forward_edge, backward_edge))
+        if len(set(nodes)) != len(nodes):
+            continue  # Goes through some intersection twice
+        if routes and all(edge in accepted_edges for edge in edges):
+            continue  # The main route itself, or made of accepted routes
+        if routes:
+            shared = sum(weights[edge] for edge in edges if edge in accepted_edges)
+            if shared > max_overlap * length:
+                continue
+            if local_optimality > 0 and not _locally_optimal(
+                    forward_adjacency, forward, backward, nodes, via_position,
+                    local_optimality * best):
+                continue
+
+        routes.append(Route.from_edges(compiled, source, edges, length, snapshot=snapshot))
+        accepted_edges.update(edges)
+    return routes
+
+
+def _route_edges(compiled, route):
+    """Compiled edge indices of a Route, matched by its road ids"""
+    edges = []
+    offsets = compiled.offsets
+    for node_id, edge_id in zip(route.nodes, route.edge_ids):
+        node = compiled.index_of(node_id)
+        for edge in range(offsets[node], offsets[node + 1]):
+            if compiled.edge_ids[edge] == edge_id:
+                edges.append(edge)
+                break
+    return edges
+
+
+def _search_tree(adjacency, source, target=None, max_stretch=0.0, limit=math.inf):
+    """
+    Dijkstra recording the adjacency position each node was reached by
+
+    With a target, the limit becomes (1 + max_stretch) times its distance
+    once it is settled. Only settled nodes are returned, so all distances
+    are final.
+
+    Returns:
+        Tuple of (distances, positions) dicts keyed by node
+    """
+    offsets, neighbors, weights = adjacency
+    distances = {source: 0}
+    positions = {}
+    settled = {}
+    heap = [(0, source)]
+    while heap:
+        distance, current = heapq.heappop(heap)
+        if current in settled:
+            continue
+        if distance > limit:
+            break
+        settled[current] = distance
+        if current == target:
+            limit = distance * (1 + max_stretch)
+
+        for position in range(offsets[current], offsets[current + 1]):
+            neighbor = neighbors[position]
+            new_distance = distance + weights[position]
+            if new_distance < distances.get(neighbor, math.inf):
+                distances[neighbor] = new_distance
+                positions[neighbor] = position
+                heapq.heappush(heap, (new_distance, neighbor))
+
+    if target is not None and target not in settled:
+        settled[target] = math.inf
+    return settled, {node: positions[node] for node in settled if node in positions}
+
+
+def _via_path(forward_edge, backward_edge, sources, targets, source, target, via):
+    """Edges and nodes of the path source -> via -> target, and the index of via in nodes"""
+    head = []
+    current = via
+    while current != source:
+        edge = forward_edge[current]
+        head.append(edge)
+        current = sources[edge]
+    head.reverse()
+
+    tail = []
+    current = via
+    while current != target:
+        edge = backward_edge[current]
+        tail.append(edge)
+        current = targets[edge]
+
+    edges = head + tail
+    nodes = [source] + [targets[edge] for edge in edges]
+    return edges, nodes, len(head)
+
+
+def _plateau(nodes, edges, via_position, forward_edge, backward_edge):
+    """Nodes of the path whose own via path is the same path"""
+    plateau = [nodes[via_position]]
+    # Before via, nodes share the path while their backward tree edge follows it
+    i = via_position - 1
+    while i >= 0 and backward_edge.get(nodes[i]) == edges[i]:
+        plateau.append(nodes[i])
+        i -= 1
+    # After via, while their forward tree edge follows it
+    i = via_position + 1
+    while i < len(nodes) and forward_edge.get(nodes[i]) == edges[i - 1]:
+        plateau.append(nodes[i])
+        i += 1
+    return plateau
+
+
+def _locally_optimal(adjacency, forward, backward, nodes, via_position, window):
+    """
+    T-test: is the part of the path within window of the via node a shortest path?
+
+    Picks u up to window before the via node and w up to window after it,
+    then checks that no route from u to w beats the path's own time.
+    """
+    via = nodes[via_position]
+    u_position = via_position
+    while u_position > 0 and forward[via] - forward[nodes[u_position]] < window:
+        u_position -= 1
+    w_position = via_position
+    while w_position < len(nodes) - 1 and backward[via] - backward[nodes[w_position]] < window:
+        w_position += 1
+    u = nodes[u_position]
+    w = nodes[w_position]
+
+    along_path = (forward[via] - forward[u]) + (backward[via] - backward[w])
+    distances, _ = shortest_path_tree(adjacency, u, max_distance=along_path)
+    return distances[w] >= along_path * (1 - 1e-9)
@@ -0,0 +1,280 @@
+import heapq
+import math
+
+import numpy as np
+
+from .a_star import haversine_distance
+from .landmarks import get_landmark_tables
+from ..data.graph_builder import get_compiled_graph
+from ..models.route import Route
+
+
+def reverse_adjacency_index(graph):
+    """
+    Map each intersection ID to the roads that arrive at it
+
+    Built once from graph.roads and cached on the graph, so backward
+    searches over Road objects don't have to scan every road.
+    """
+    index = getattr(graph, 'reverse_index', None)
+    if index is None:
+        index = {node_id: [] for node_id in graph.intersections}
+        for road in graph.roads.values():
+            index[road.end.id].append(road)
+        graph.reverse_index = index
+    return index
+
+
+def bidirectional_dijkstra(graph, start, end, engine="objects", stats=None):
+    """
+    Find shortest path with two Dijkstra searches, from start and from end
+
+    The searches alternate and stop once the smallest distances on both
+    queues add up to at least the best path found, which settles roughly
+    half the area of a single search on long routes.
+
+    Args:
+        graph: Graph representation with nodes and edges
+        start: Starting intersection ID
+        end: Destination intersection ID
+        engine: "objects" to walk Road objects, "csr" to search the
+            compiled array graph
+        stats: Optional dict, receives the number of settled nodes
+
+    Returns:
+        Route, or an unreachable Route if no path exists
+    """
+    expand_forward, expand_backward, source, target, make_route = _expanders(graph, start, end, engine)
+    best, edges = _bidirectional_search(expand_forward, expand_backward,
+                                        source, target, stats=stats)
+    return make_route(edges, best)
+
+
+def bidirectional_a_star(graph, start, end, engine="objects", heuristic="haversine",
+                         stats=None):
+    """
+    Find shortest path with bidirectional A* (symmetric potentials)
+
+    Both searches share one potential, the average of a lower bound on the
+    time to end and a lower bound on the time from start, with opposite
+    signs. Because the forward and backward reduced costs then agree, the
+    bidirectional Dijkstra stopping rule stays correct. This needs
+    consistent bounds, so the "haversine" variant divides by the fastest
+    straight-line speed any edge achieves rather than the fixed 50 km/h
+    a_star uses.
+
+    Args:
+        graph: Graph representation with nodes and edges
+        start: Starting intersection ID
+        end: Destination intersection ID
+        engine: "objects" to walk Road objects, "csr" to search the
+            compiled array graph
+        heuristic: "haversine" or "alt" (landmark bounds)
+        stats: Optional dict, receives the number of settled nodes
+
+    Returns:
+        Route, or an unreachable Route if no path exists
+    """
+    compiled = get_compiled_graph(graph)
+    # Pin one traffic snapshot for the searches and their bounds
+    snapshot = compiled.traffic_snapshot
+    expand_forward, expand_backward, source, target, make_route = _expanders(
+        graph, start, end, engine, snapshot)
+    to_index = (lambda node: node) if engine == "csr" else compiled.index_of
+
+    if heuristic == "alt":
+        tables = get_landmark_tables(graph)
+        to_end = tables.heuristic(compiled.index_of(end), snapshot.weights)
+        from_start = tables.heuristic(compiled.index_of(start), snapshot.weights, reverse=True)
+
+        def bounds(node):
+            index = to_index(node)
+            return to_end(index), from_start(index)
+    else:
+        lats, lons = compiled.coordinates()
+        max_speed = _straight_line_speed(compiled, snapshot)
+        start_index = compiled.index_of(start)
+        end_index = compiled.index_of(end)
+
+        def straight_line(a, b):
+            return haversine_distance(lats[a], lons[a], lats[b], lons[b]) / max_speed
+
+        def bounds(node):
+            index = to_index(node)
+            return straight_line(index, end_index), straight_line(start_index, index)
+
+    def estimate_forward(node):
+        to_target, from_source = bounds(node)
+        potential = (to_target - from_source) / 2
+        # inf - inf: neither bound says anything, so stay neutral
+        return 0.0 if potential != potential else potential
+
+    def estimate_backward(node):
+        return -estimate_forward(node)
+
+    best, edges = _bidirectional_search(expand_forward, expand_backward, source, target,
+                                        estimate_forward, estimate_backward, stats=stats)
+    return make_route(edges, best)
+
+
+def _straight_line_speed(compiled, snapshot):
+    """
+    Largest straight-line distance covered per hour on any edge, in km/h
+
+    Dividing a straight-line distance by it gives a consistent lower bound
+    on travel time. Cached on the compiled graph per traffic snapshot.
+    """
+    cached = getattr(compiled, 'straight_line_speed', None)
+    if cached is not None and cached[0] is snapshot:
+        return cached[1]
+
+    speed = max_straight_line_speed(compiled, snapshot.weights)
+    compiled.straight_line_speed = (snapshot, speed)
+    return speed
+
+
+def max_straight_line_speed(compiled, weights):
+    """Largest straight-line distance per hour over edges with the given travel times, in km/h"""
+    sources = compiled.sources()
+    lat1, lon1 = np.radians(compiled.lats[sources]), np.radians(compiled.lons[sources])
+    lat2, lon2 = np.radians(compiled.lats[compiled.targets]), np.radians(compiled.lons[compiled.targets])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    # Same formula and earth radius as a_star.haversine_distance
+    chords = 2 * np.arcsin(np.sqrt(a)) * 6371
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speeds = chords / weights
+    speeds = speeds[np.isfinite(speeds)]
+    return float(speeds.max()) if len(speeds) and speeds.max() > 0 else math.inf
+
+
+def _expanders(graph, start, end, engine, snapshot=None):
+    """
+    Neighbour generators for both directions, the source/target keys and
+    a function turning the edges found into a Route
+
+    Generators yield (neighbor, weight, edge) where edge is a compiled
+    edge index ("csr") or a Road ("objects"), always the edge as driven.
+    The csr engine reads weights from `snapshot` (default: the current one).
+    """
+    if engine == "csr":
+        compiled = get_compiled_graph(graph)
+        if snapshot is None:
+            snapshot = compiled.traffic_snapshot
+        offsets, targets, weights = compiled.adjacency(snapshot)
+        reverse_offsets, reverse_sources, reverse_weights = compiled.reverse_adjacency(snapshot)
+        reverse_order = compiled.reverse_order()
+
+        def expand_forward(node):
+            begin, stop = offsets[node], offsets[node + 1]
+            return zip(targets[begin:stop], weights[begin:stop], range(begin, stop))
+
+        def expand_backward(node):
+            begin, stop = reverse_offsets[node], reverse_offsets[node + 1]
+            return zip(reverse_sources[begin:stop], reverse_weights[begin:stop],
+                       reverse_order[begin:stop].tolist())
+
+        source = compiled.index_of(start)
+
+        def make_route(edges, best):
+            if edges is None:
+                return Route.unreachable()
+            return Route.from_edges(compiled, source, edges, best, snapshot=snapshot)
+
+        return expand_forward, expand_backward, source, compiled.index_of(end), make_route
+
+    intersections = graph.intersections
+    reverse_index = reverse_adjacency_index(graph)
+
+    def expand_forward(node):
+        return ((road.end.id, road.travel_time(), road) for road in intersections[node].connections)
+
+    def expand_backward(node):
+        return ((road.start.id, road.travel_time(), road) for road in reverse_index[node])
+
+    def make_route(roads, best):
+        if roads is None:
+            return Route.unreachable()
+        return Route.from_roads(start, roads, best)
+
+    return expand_forward, expand_backward, start, end, make_route
+
+
+def _bidirectional_search(expand_forward, expand_backward, source, target,
+                          estimate_forward=None, estimate_backward=None, stats=None):
+    """
+    Core of both bidirectional searches
+
+    Without estimates this is bidirectional Dijkstra; with them (a
+    potential and its negation) it runs on reduced costs, which is the
+    symmetric bidirectional A*. Either way it stops once the two queue
+    minimums add up to the best path found through a node both reached.
+
+    Returns:
+        Tuple of (best_distance, edges) with the edges from source to
+        target in driving order, or (math.inf, None) if none was found
+    """
+    if source == target:
+        if stats is not None:
+            stats['settled'] = 1
+        return 0, []
+
+    guided = estimate_forward is not None
+    expand = (expand_forward, expand_backward)
+    estimate = (estimate_forward, estimate_backward)
+    distances = ({source: 0}, {target: 0})
+    parents = ({source: None}, {target: None})
+    settled_sets = (set(), set())
+    heaps = (
+        [(estimate_forward(source) if guided else 0, 0, source)],
+        [(estimate_backward(target) if guided else 0, 0, target)]
+    )
+
+    best = math.inf
+    meeting = None
+    settled = 0
+    while heaps[0] and heaps[1]:
+        top_forward = heaps[0][0][0]
+        top_backward = heaps[1][0][0]
+        if top_forward + top_backward >= best:
+            break
+
+        direction = 0 if top_forward <= top_backward else 1
+        _, distance, current = heapq.heappop(heaps[direction])
+        dist = distances[direction]
+        if distance > dist[current] or current in settled_sets[direction]:
+            continue
+        settled_sets[direction].add(current)
+        settled += 1
+
+        other = distances[1 - direction]
+
+        parent = parents[direction]
+        heap = heaps[direction]
+        for neighbor, weight, edge in expand[direction](current):
+            new_distance = distance + weight
+            if new_distance < dist.get(neighbor, math.inf):
+                dist[neighbor] = new_distance
+                parent[neighbor] = (current, edge)
+                key = new_distance + estimate[direction](neighbor) if guided else new_distance
+                heapq.heappush(heap, (key, new_distance, neighbor))
+                if neighbor in other and new_distance + other[neighbor] < best:
+                    best = new_distance + other[neighbor]
+                    meeting = neighbor
+
+    if stats is not None:
+        stats['settled'] = settled
+
+    if meeting is None:
+        return math.inf, None
+
+    edges = []
+    step = parents[0][meeting]
+    while step is not None:
+        edges.append(step[1])
+        step = parents[0][step[0]]
+    edges.reverse()
+    step = parents[1][meeting]
+    while step is not None:
+        edges.append(step[1])
+        step = parents[1][step[0]]
+    return best, edges
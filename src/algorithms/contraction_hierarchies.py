@@ -0,0 +1,698 @@
+import heapq
+import math
+import threading
+
+import numpy as np
+
+from ..data.graph_builder import get_compiled_graph
+from ..models.route import Route
+
+# Witness searches stop after settling this many nodes. A larger limit finds
+# more witnesses (fewer shortcuts) at the cost of slower preprocessing.
+WITNESS_SETTLE_LIMIT = 100
+
+FORMAT_VERSION = 1
+
+# Guards creating the per-graph locks of hierarchy_lock
+_locks_lock = threading.Lock()
+# Guards the refresh thread and dirty flag of refresh_hierarchy_async
+_refresh_lock = threading.Lock()
+
+
+class ContractionHierarchy:
+    """
+    Contraction Hierarchy over a CompiledGraph
+
+    Every node has a rank (its position in the contraction order). The
+    hierarchy keeps two CSR edge sets indexed by node:
+
+    - up: edges u -> v of the augmented graph with rank[v] > rank[u]
+    - down: edges u -> v with rank[u] > rank[v], stored at v and pointing
+      at u, so the backward search can climb from the target
+
+    Each edge is either an original road (`edge` holds its CompiledGraph
+    edge index) or a shortcut (`middle` holds the contracted node it
+    bypasses). A query only ever climbs to higher-ranked nodes, so it
+    settles a few hundred nodes even on a city-wide graph.
+    """
+
+    def __init__(self, node_ids, rank, up, down, weights=None):
+        self.node_ids = list(node_ids)
+        self.rank = np.asarray(rank, dtype=np.int32)
+        self.up = _EdgeSet(*up)
+        self.down = _EdgeSet(*down)
+        # Metric the hierarchy was built for, to detect stale weights
+        self.weights = weights
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_shortcuts(self):
+        return int((self.up.middle >= 0).sum() + (self.down.middle >= 0).sum())
+
+    def matches(self, metric):
+        """
+        True if this hierarchy was built for the given weights
+
+        Args:
+            metric: CompiledGraph (its current weights) or TrafficSnapshot
+        """
+        weights = metric.weights
+        if self.weights is weights:
+            return True
+        if self.weights is None or not np.array_equal(self.weights, weights):
+            return False
+        # Same metric in a new array; remember it to skip the comparison next time
+        self.weights = weights
+        return True
+
+    @classmethod
+    def build(cls, compiled, weights=None, witness_limit=WITNESS_SETTLE_LIMIT):
+        """
+        Contract every node of a compiled graph
+
+        Nodes are ordered lazily by edge difference (shortcuts added minus
+        edges removed) plus the number of already contracted neighbours,
+        which spreads contraction evenly over the map.
+
+        Args:
+            compiled: CompiledGraph
+            weights: Per-edge travel times (defaults to compiled.weights)
+            witness_limit: Settle limit for the local witness searches
+
+        Returns:
+            ContractionHierarchy
+        """
+        if weights is None:
+            weights = compiled.weights
+        n = compiled.num_nodes
+
+        # Remaining graph: out_arcs[u][v] = in_arcs[v][u] = (weight, middle, edge)
+        # Parallel roads collapse to the fastest one and self-loops are dropped
+        out_arcs = [dict() for _ in range(n)]
+        in_arcs = [dict() for _ in range(n)]
+        sources = compiled.sources().tolist()
+        targets = compiled.targets.tolist()
+        weight_list = np.asarray(weights, dtype=np.float64).tolist()
+        for edge, (u, v, weight) in enumerate(zip(sources, targets, weight_list)):
+            if u == v:
+                continue
+            existing = out_arcs[u].get(v)
+            if existing is None or weight < existing[0]:
+                arc = (weight, -1, edge)
+                out_arcs[u][v] = arc
+                in_arcs[v][u] = arc
+
+        contracted = bytearray(n)
+        deleted_neighbors = [0] * n
+        rank = [0] * n
+        up_edges = [None] * n
+        down_edges = [None] * n
+
+        def priority(v):
+            shortcuts = _find_shortcuts(v, out_arcs, in_arcs, witness_limit)
+            edge_difference = len(shortcuts) - len(out_arcs[v]) - len(in_arcs[v])
+            return edge_difference + deleted_neighbors[v], shortcuts
+
+        heap = [(priority(v)[0], v) for v in range(n)]
+        heapq.heapify(heap)
+
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+
+            # Lazy update: re-evaluate and postpone if no longer the cheapest
+            new_priority, shortcuts = priority(v)
+            if heap and new_priority > heap[0][0]:
+                heapq.heappush(heap, (new_priority, v))
+                continue
+
+            # All remaining neighbours will be ranked above v
+            up_edges[v] = [(w, arc) for w, arc in out_arcs[v].items()]
+            down_edges[v] = [(u, arc) for u, arc in in_arcs[v].items()]
+
+            neighbors = set(out_arcs[v]) | set(in_arcs[v])
+            for u in in_arcs[v]:
+                del out_arcs[u][v]
+            for w in out_arcs[v]:
+                del in_arcs[w][v]
+            out_arcs[v] = {}
+            in_arcs[v] = {}
+
+            for u, w, weight in shortcuts:
+                existing = out_arcs[u].get(w)
+                if existing is None or weight < existing[0]:
+                    arc = (weight, v, -1)
+                    out_arcs[u][w] = arc
+                    in_arcs[w][u] = arc
+
+            contracted[v] = 1
+            rank[v] = order
+            order += 1
+
+            for neighbor in neighbors:
+                deleted_neighbors[neighbor] += 1
+
+        return cls(
+            node_ids=compiled.node_ids,
+            rank=rank,
+            up=_pack_edges(up_edges),
+            down=_pack_edges(down_edges),
+            weights=weights
+        )
+
+    def query(self, start, end, stats=None):
+        """
+        Bidirectional upward search between two node IDs
+
+        Args:
+            start: Starting intersection ID
+            end: Destination intersection ID
+            stats: Optional dict, receives the number of settled nodes
+
+        Returns:
+            Tuple of (path, total_time) or (None, math.inf) if no path exists
+        """
+        total_time, nodes, _ = self.search(start, end, stats=stats)
+        if nodes is None:
+            return None, math.inf
+        return [self.node_ids[i] for i in nodes], total_time
+
+    def search(self, start, end, stats=None):
+        """
+        Run a query and unpack the roads it found
+
+        Args:
+            start: Starting intersection ID
+            end: Destination intersection ID
+            stats: Optional dict, receives the number of settled nodes
+
+        Returns:
+            Tuple of (total_time, nodes, edges): node indices along the path
+            and the CompiledGraph edge index of each road between them, or
+            (math.inf, None, None) if no path exists
+        """
+        node_index = self._node_index()
+        source = node_index[start]
+        target = node_index[end]
+        if source == target:
+            return 0, [source], []
+
+        up = self.up.lists()
+        down = self.down.lists()
+        distances = ({source: 0}, {target: 0})
+        parents = ({source: None}, {target: None})
+        heaps = ([(0, source)], [(0, target)])
+        # Forward climbs `up` edges and is stalled via `down`, backward the reverse
+        graphs = ((up, down), (down, up))
+
+        best = math.inf
+        meeting = -1
+        settled = 0
+        while heaps[0] or heaps[1]:
+            top_forward = heaps[0][0][0] if heaps[0] else math.inf
+            top_backward = heaps[1][0][0] if heaps[1] else math.inf
+            if min(top_forward, top_backward) >= best:
+                break
+            direction = 0 if top_forward <= top_backward else 1
+
+            distance, current = heapq.heappop(heaps[direction])
+            dist = distances[direction]
+            if distance > dist[current]:
+                continue
+            settled += 1
+
+            other_distance = distances[1 - direction].get(current)
+            if other_distance is not None and distance + other_distance < best:
+                best = distance + other_distance
+                meeting = current
+
+            (offsets, targets, weights, _), (stall_offsets, stall_targets, stall_weights, _) = graphs[direction]
+
+            # Stall-on-demand: a higher neighbour already offers a shorter
+            # way here, so this label cannot be on a shortest path
+            stalled = False
+            for pos in range(stall_offsets[current], stall_offsets[current + 1]):
+                neighbor_distance = dist.get(stall_targets[pos])
+                if neighbor_distance is not None and neighbor_distance + stall_weights[pos] < distance:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+
+            parent = parents[direction]
+            heap = heaps[direction]
+            for pos in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[pos]
+                new_distance = distance + weights[pos]
+                if new_distance < dist.get(neighbor, math.inf):
+                    dist[neighbor] = new_distance
+                    parent[neighbor] = (current, pos)
+                    heapq.heappush(heap, (new_distance, neighbor))
+
+        if stats is not None:
+            stats['settled'] = settled
+
+        if meeting < 0:
+            return math.inf, None, None
+
+        nodes, edges = self.unpack(meeting, parents[0], parents[1])
+        return best, nodes, edges
+
+    def many_to_many(self, sources, targets):
+        """
+        Travel times between every source and target (bucket algorithm)
+
+        One backward upward search per target leaves (target, distance)
+        entries in a bucket at every node it settles. One forward upward
+        search per source then combines its distances with the buckets of
+        the nodes it settles. That is len(sources) + len(targets) small
+        searches instead of one query per pair.
+
+        Args:
+            sources: Dense node indices
+            targets: Dense node indices
+
+        Returns:
+            Float64 array of shape (len(sources), len(targets)), math.inf
+            where no path exists
+        """
+        up = self.up.lists()
+        down = self.down.lists()
+        buckets = {}
+        for column, target in enumerate(targets):
+            for node, distance in _upward_search(down, up, target).items():
+                buckets.setdefault(node, []).append((column, distance))
+
+        matrix = np.full((len(sources), len(targets)), math.inf)
+        for row_index, source in enumerate(sources):
+            row = matrix[row_index].tolist()
+            for node, distance in _upward_search(up, down, source).items():
+                for column, remaining in buckets.get(node, ()):
+                    if distance + remaining < row[column]:
+                        row[column] = distance + remaining
+            matrix[row_index] = row
+        return matrix
+
+    def unpack(self, meeting, forward_parents, backward_parents):
+        """
+        Expand the search trees around a meeting node into the original graph
+
+        Returns:
+            Tuple of (nodes, edges): original node indices and the
+            CompiledGraph edge index of each road between consecutive nodes
+        """
+        arcs = []
+        current = meeting
+        while forward_parents[current] is not None:
+            previous, pos = forward_parents[current]
+            arcs.append((previous, current, self.up, pos))
+            current = previous
+        arcs.reverse()
+
+        current = meeting
+        while backward_parents[current] is not None:
+            following, pos = backward_parents[current]
+            arcs.append((current, following, self.down, pos))
+            current = following
+
+        nodes = [arcs[0][0]] if arcs else [meeting]
+        edges = []
+        for u, v, edge_set, pos in arcs:
+            for node, edge in self._unpack_arc(u, v, edge_set, pos):
+                nodes.append(node)
+                edges.append(edge)
+        return nodes, edges
+
+    def _unpack_arc(self, u, v, edge_set, pos):
+        """(node, edge) pairs after u along arc u -> v, expanding shortcuts iteratively"""
+        steps = []
+        stack = [(u, v, edge_set, pos)]
+        while stack:
+            u, v, edge_set, pos = stack.pop()
+            middle = edge_set.middle[pos]
+            if middle < 0:
+                steps.append((v, int(edge_set.edge[pos])))
+                continue
+            # u -> middle is stored at middle's down edges and
+            # middle -> v at its up edges, since middle ranks below both
+            first = self.down.find(middle, u)
+            second = self.up.find(middle, v)
+            stack.append((middle, v, self.up, second))
+            stack.append((u, middle, self.down, first))
+        return steps
+
+    def _node_index(self):
+        node_index = getattr(self, '_node_index_cache', None)
+        if node_index is None:
+            node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+            self._node_index_cache = node_index
+        return node_index
+
+    def arrays(self):
+        """Dict of the NumPy arrays making up the hierarchy, see from_arrays"""
+        return dict(
+            rank=self.rank,
+            weights=np.asarray(self.weights, dtype=np.float64),
+            **self.up.arrays('up_'),
+            **self.down.arrays('down_')
+        )
+
+    @classmethod
+    def from_arrays(cls, node_ids, arrays):
+        """Hierarchy over arrays() output (e.g. memory maps), without copying them"""
+        return cls(
+            node_ids=node_ids,
+            rank=arrays['rank'],
+            up=_EdgeSet.read_arrays(arrays, 'up_'),
+            down=_EdgeSet.read_arrays(arrays, 'down_'),
+            weights=arrays['weights']
+        )
+
+    def save(self, path):
+        """Serialize the hierarchy to a compressed .npz file"""
+        np.savez_compressed(
+            path,
+            format_version=np.array(FORMAT_VERSION),
+            node_ids=np.array(self.node_ids),
+            **self.arrays()
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a hierarchy written by save()"""
+        with np.load(path) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported hierarchy format in {path}")
+            return cls.from_arrays(data['node_ids'].tolist(), data)
+
+
+class _EdgeSet:
+    """One CSR edge set of a hierarchy (targets, weights, middle node, original edge)"""
+
+    FIELDS = ('offsets', 'targets', 'weights', 'middle', 'edge')
+
+    def __init__(self, offsets, targets, weights, middle, edge):
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.middle = np.asarray(middle, dtype=np.int32)
+        self.edge = np.asarray(edge, dtype=np.int32)
+        self._lists = None
+
+    def lists(self):
+        """Plain-list copies of (offsets, targets, weights, middle) for queries"""
+        if self._lists is None:
+            self._lists = (self.offsets.tolist(), self.targets.tolist(),
+                           self.weights.tolist(), self.middle.tolist())
+        return self._lists
+
+    def find(self, node, target):
+        """Position of the edge from node to target"""
+        offsets, targets, _, _ = self.lists()
+        for pos in range(offsets[node], offsets[node + 1]):
+            if targets[pos] == target:
+                return pos
+        raise KeyError(f"No hierarchy edge between {node} and {target}")
+
+    def arrays(self, prefix):
+        return {prefix + field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def read_arrays(cls, data, prefix):
+        return tuple(data[prefix + field] for field in cls.FIELDS)
+
+
+def _upward_search(edges, stall_edges, start):
+    """
+    Complete upward search from one node, with stall-on-demand
+
+    Args:
+        edges: lists() of the edge set to climb
+        stall_edges: lists() of the opposite edge set, used for stalling
+        start: Dense node index
+
+    Returns:
+        Dict of settled (non-stalled) node -> distance
+    """
+    offsets, targets, weights, _ = edges
+    stall_offsets, stall_targets, stall_weights, _ = stall_edges
+    distances = {start: 0}
+    settled = {}
+    heap = [(0, start)]
+    while heap:
+        distance, current = heapq.heappop(heap)
+        if distance > distances[current] or current in settled:
+            continue
+
+        # A higher neighbour already offers a shorter way here
+        stalled = False
+        for pos in range(stall_offsets[current], stall_offsets[current + 1]):
+            neighbor_distance = distances.get(stall_targets[pos])
+            if neighbor_distance is not None and neighbor_distance + stall_weights[pos] < distance:
+                stalled = True
+                break
+        if stalled:
+            continue
+        settled[current] = distance
+
+        for pos in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[pos]
+            new_distance = distance + weights[pos]
+            if new_distance < distances.get(neighbor, math.inf):
+                distances[neighbor] = new_distance
+                heapq.heappush(heap, (new_distance, neighbor))
+    return settled
+
+
+def _find_shortcuts(v, out_arcs, in_arcs, witness_limit):
+    """Shortcuts (u, w, weight) needed to preserve distances if v is removed"""
+    shortcuts = []
+    outgoing = out_arcs[v]
+    if not outgoing:
+        return shortcuts
+    max_outgoing = max(arc[0] for arc in outgoing.values())
+
+    for u, (weight_in, _, _) in in_arcs[v].items():
+        witness = _witness_search(out_arcs, u, v, weight_in + max_outgoing,
+                                  witness_limit)
+        for w, (weight_out, _, _) in outgoing.items():
+            if w == u:
+                continue
+            through_v = weight_in + weight_out
+            if witness.get(w, math.inf) > through_v:
+                shortcuts.append((u, w, through_v))
+    return shortcuts
+
+
+def _witness_search(out_arcs, source, skip, max_distance, settle_limit):
+    """Bounded Dijkstra from source in the remaining graph, avoiding node skip"""
+    distances = {source: 0}
+    heap = [(0, source)]
+    settled = 0
+    while heap:
+        distance, current = heapq.heappop(heap)
+        if distance > distances[current]:
+            continue
+        if distance > max_distance or settled >= settle_limit:
+            break
+        settled += 1
+        for neighbor, (weight, _, _) in out_arcs[current].items():
+            if neighbor == skip:
+                continue
+            new_distance = distance + weight
+            if new_distance < distances.get(neighbor, math.inf):
+                distances[neighbor] = new_distance
+                heapq.heappush(heap, (new_distance, neighbor))
+    return distances
+
+
+def _pack_edges(per_node):
+    """Flatten per-node [(neighbor, (weight, middle, edge))] lists into CSR arrays"""
+    offsets = [0]
+    targets = []
+    weights = []
+    middle = []
+    edge = []
+    for edges in per_node:
+        for neighbor, (weight, via, original) in edges:
+            targets.append(neighbor)
+            weights.append(weight)
+            middle.append(via)
+            edge.append(original)
+        offsets.append(len(targets))
+    return offsets, targets, weights, middle, edge
+
+
+class HierarchyNotReady(RuntimeError):
+    """No hierarchy matches the traffic yet, and contracting one was not allowed"""
+
+
+def get_contraction_hierarchy(graph, snapshot=None, contract=None):
+    """
+    Return the hierarchy for a traffic snapshot, building it if needed
+
+    The hierarchy is cached on the compiled graph and replaced when the
+    traffic multipliers have changed since it was built. If a customizable
+    topology exists (see customizable_ch.py) it is re-customized, otherwise
+    the graph is contracted from scratch. Builds hold hierarchy_lock, so
+    concurrent callers for the same traffic share one build.
+
+    Contracting from scratch takes seconds on a city, so a server sets
+    `compiled.contract_on_demand = False` and refreshes hierarchies in the
+    background (see refresh_hierarchy_async) instead of in requests.
+
+    Args:
+        graph: Graph representation with nodes and edges
+        snapshot: TrafficSnapshot to match (default: the current one)
+        contract: Whether to contract the graph if there is no topology to
+            customize (default: compiled.contract_on_demand, else True)
+
+    Raises:
+        HierarchyNotReady: Nothing matches the snapshot and `contract` is false
+    """
+    compiled = get_compiled_graph(graph)
+    if snapshot is None:
+        snapshot = compiled.traffic_snapshot
+    if contract is None:
+        contract = getattr(compiled, 'contract_on_demand', True)
+    hierarchy = getattr(compiled, 'contraction_hierarchy', None)
+    if hierarchy is not None and hierarchy.matches(snapshot):
+        return hierarchy
+
+    # One thread builds; the others wait and take its result
+    with hierarchy_lock(compiled):
+        for hierarchy in (getattr(compiled, 'contraction_hierarchy', None),
+                          getattr(compiled, 'last_built_hierarchy', None)):
+            if hierarchy is not None and hierarchy.matches(snapshot):
+                return hierarchy
+        topology = getattr(compiled, 'cch_topology', None)
+        if topology is not None:
+            hierarchy = topology.customize(snapshot.weights)
+        elif contract:
+            hierarchy = ContractionHierarchy.build(compiled, weights=snapshot.weights)
+        else:
+            raise HierarchyNotReady(
+                f"No contraction hierarchy for traffic version {snapshot.version} yet")
+        # Kept for waiters even if traffic moved on meanwhile
+        compiled.last_built_hierarchy = hierarchy
+        # Don't replace a hierarchy for newer traffic with an older one
+        if snapshot is compiled.traffic_snapshot:
+            compiled.contraction_hierarchy = hierarchy
+    return hierarchy
+
+
+def hierarchy_lock(compiled):
+    """Lock serializing hierarchy builds and customizations of a compiled graph"""
+    lock = getattr(compiled, 'hierarchy_lock', None)
+    if lock is None:
+        with _locks_lock:
+            lock = getattr(compiled, 'hierarchy_lock', None)
+            if lock is None:
+                lock = threading.Lock()
+                compiled.hierarchy_lock = lock
+    return lock
+
+
+def refresh_hierarchy_async(graph, path=None):
+    """
+    Contract the graph for the current traffic in a background thread
+
+    Queries that cannot wait keep falling back (see HierarchyNotReady)
+    until the new hierarchy is swapped in. Each graph has at most one
+    refresh thread: requests arriving while it builds only mark the
+    hierarchy dirty, and the thread then rebuilds once, for whatever
+    traffic is current by then, so slow builds never queue up behind
+    each other for snapshots that are already stale.
+
+    Args:
+        graph: Graph representation with nodes and edges
+        path: Also save the new hierarchy here, so a restart on the same
+            traffic loads it instead of contracting again
+
+    Returns:
+        The refresh Thread (already running if one was)
+    """
+    compiled = get_compiled_graph(graph)
+    with _refresh_lock:
+        compiled.hierarchy_dirty = True
+        compiled.hierarchy_path = path
+        thread = getattr(compiled, 'hierarchy_refresher', None)
+        if thread is None:
+            thread = threading.Thread(target=_refresh_hierarchy, args=(graph, compiled),
+                                      daemon=True)
+            compiled.hierarchy_refresher = thread
+            thread.start()
+    return thread
+
+
+def _refresh_hierarchy(graph, compiled):
+    """Body of the refresh thread: rebuild until no request is pending"""
+    while True:
+        with _refresh_lock:
+            if not compiled.hierarchy_dirty:
+                compiled.hierarchy_refresher = None
+                return
+            compiled.hierarchy_dirty = False
+            path = compiled.hierarchy_path
+        try:
+            snapshot = compiled.traffic_snapshot
+            hierarchy = getattr(compiled, 'contraction_hierarchy', None)
+            if hierarchy is not None and hierarchy.matches(snapshot):
+                continue
+            hierarchy = get_contraction_hierarchy(graph, snapshot, contract=True)
+            if path is not None:
+                hierarchy.save(path)
+        except Exception as e:
+            print(f"Error refreshing contraction hierarchy: {e}")
+
+
+def load_contraction_hierarchy(graph, path):
+    """
+    Attach a serialized hierarchy to a graph, rebuilding and saving it if the
+    file is missing or was built for a different network or metric
+
+    Returns:
+        ContractionHierarchy
+    """
+    compiled = get_compiled_graph(graph)
+    try:
+        hierarchy = ContractionHierarchy.load(path)
+        if hierarchy.node_ids == compiled.node_ids and hierarchy.matches(compiled):
+            compiled.contraction_hierarchy = hierarchy
+            return hierarchy
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not load contraction hierarchy: {e}")
+
+    print("Building contraction hierarchy...")
+    hierarchy = get_contraction_hierarchy(graph, contract=True)
+    hierarchy.save(path)
+    print(f"Saved contraction hierarchy with {hierarchy.num_shortcuts} shortcuts to {path}")
+    return hierarchy
+
+
+def contraction_hierarchies(graph, start, end, stats=None):
+    """
+    Find shortest path using a Contraction Hierarchy query
+
+    Args:
+        graph: Graph representation with nodes and edges
+        start: Starting intersection ID
+        end: Destination intersection ID
+        stats: Optional dict, receives the number of settled nodes
+
+    Returns:
+        Route, or an unreachable Route if no path exists
+    """
+    compiled = get_compiled_graph(graph)
+    # Pin one traffic snapshot; the hierarchy returned is built for it
+    snapshot = compiled.traffic_snapshot
+    hierarchy = get_contraction_hierarchy(graph, snapshot)
+    total_time, nodes, edges = hierarchy.search(start, end, stats=stats)
+    if nodes is None:
+        return Route.unreachable()
+    return Route.from_edges(compiled, nodes[0], edges, total_time, snapshot=snapshot)
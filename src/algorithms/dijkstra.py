@@ -1,7 +1,10 @@
 from .priority_queue import PriorityQueue
+from ..data.graph_builder import get_compiled_graph
+from ..models.route import Route
+import heapq
 import math
 
-def dijkstra(graph, start, end):
+def dijkstra(graph, start, end, engine="objects", stats=None):
     """
     Find shortest path using Dijkstra's algorithm
     
@@ -9,10 +12,17 @@ def dijkstra(graph, start, end):
         graph: Graph representation with nodes and edges
         start: Starting intersection ID
         end: Destination intersection ID
+        engine: "objects" to walk Road objects, "csr" to search the
+            compiled array graph (see src/data/graph_builder.py)
+        stats: Optional dict, receives the number of settled nodes
     
     Returns:
-        Tuple of (path, total_time) or (None, math.inf) if no path exists
+        Route (unpacks as (path, total_time)); its path is None and
+        total_time math.inf if no path exists
     """
+    if engine == "csr":
+        return dijkstra_csr(get_compiled_graph(graph), start, end, stats=stats)
+    
     queue = PriorityQueue()
     queue.add(start, 0)
     
@@ -20,11 +30,13 @@ def dijkstra(graph, start, end):
     distances = {node: math.inf for node in graph.intersections}
     distances[start] = 0
     
-    # Track path
+    # Track path: the road each node was reached by
     previous = {node: None for node in graph.intersections}
+    settled = 0
     
     while not queue.empty():
         current = queue.pop()
+        settled += 1
         
         # Found destination
         if current == end:
@@ -41,19 +53,137 @@ def dijkstra(graph, start, end):
             # If we found a better path, update
             if distance < distances[neighbor]:
                 distances[neighbor] = distance
-                previous[neighbor] = current
+                previous[neighbor] = road
                 queue.add(neighbor, distance)
     
+    if stats is not None:
+        stats['settled'] = settled
+    
     # Build path from start to end
     if distances[end] == math.inf:
-        return None, math.inf
+        return Route.unreachable()
+    
+    return Route.from_roads(start, _unwind_roads(previous, start, end), distances[end])
+
+def dijkstra_csr(compiled, start, end, stats=None):
+    """
+    Dijkstra's algorithm over a CompiledGraph
+    
+    Args:
+        compiled: CompiledGraph
+        start: Starting intersection ID
+        end: Destination intersection ID
+        stats: Optional dict, receives the number of settled nodes
+    
+    Returns:
+        Route, or an unreachable Route if no path exists
+    """
+    # Pin one traffic snapshot for the whole search
+    snapshot = compiled.traffic_snapshot
+    offsets, targets, weights = compiled.adjacency(snapshot)
+    source = compiled.index_of(start)
+    target = compiled.index_of(end)
+    
+    distances = [math.inf] * compiled.num_nodes
+    previous = [-1] * compiled.num_nodes  # edge each node was reached by
+    distances[source] = 0
+    
+    # Plain heap with lazy deletion. Like PriorityQueue, ties are broken by
+    # insertion order and re-adding a node supersedes its earlier entry.
+    counter = 0
+    latest = [-1] * compiled.num_nodes
+    latest[source] = counter
+    heap = [(0, counter, source)]
+    settled = 0
+    while heap:
+        distance, count, current = heapq.heappop(heap)
+        if latest[current] != count:
+            continue
+        latest[current] = -1
+        settled += 1
+        if current == target:
+            break
         
-    path = []
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            new_distance = distance + weights[edge]
+            if new_distance < distances[neighbor]:
+                distances[neighbor] = new_distance
+                previous[neighbor] = edge
+                counter += 1
+                latest[neighbor] = counter
+                heapq.heappush(heap, (new_distance, counter, neighbor))
+    
+    if stats is not None:
+        stats['settled'] = settled
+    
+    if distances[target] == math.inf:
+        return Route.unreachable()
+    
+    return _unwind_route(compiled, previous, source, target, distances[target], snapshot)
+
+def shortest_path_tree(adjacency, sources, max_distance=math.inf):
+    """
+    One-to-all Dijkstra over plain-list adjacency
+    
+    Args:
+        adjacency: (offsets, targets, weights) lists, e.g. from
+            CompiledGraph.adjacency() or reverse_adjacency()
+        sources: Node index, or list of indices searched simultaneously
+        max_distance: Stop once the next node is farther than this
+    
+    Returns:
+        Tuple of (distances, previous) lists indexed by node; unreached
+        nodes have distance math.inf and previous -1. With max_distance,
+        nodes beyond it may keep tentative (upper bound) distances.
+    """
+    offsets, targets, weights = adjacency
+    num_nodes = len(offsets) - 1
+    if isinstance(sources, int):
+        sources = [sources]
+    
+    distances = [math.inf] * num_nodes
+    previous = [-1] * num_nodes
+    heap = []
+    for source in sources:
+        distances[source] = 0
+        heap.append((0, source))
+    heapq.heapify(heap)
+    
+    while heap:
+        distance, current = heapq.heappop(heap)
+        if distance > distances[current]:
+            continue
+        if distance > max_distance:
+            break
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            new_distance = distance + weights[edge]
+            if new_distance < distances[neighbor]:
+                distances[neighbor] = new_distance
+                previous[neighbor] = current
+                heapq.heappush(heap, (new_distance, neighbor))
+    
+    return distances, previous
+
+def _unwind_roads(previous, start, end):
+    """Follow predecessor roads back from end, returning them in driving order"""
+    roads = []
     current = end
     while current != start:
-        path.append(current)
-        current = previous[current]
-    path.append(start)
-    path.reverse()
-    
-    return path, distances[end]
\ No newline at end of file
+        road = previous[current]
+        roads.append(road)
+        current = road.start.id
+    roads.reverse()
+    return roads
+
+def _unwind_route(compiled, previous, source, target, total_time, snapshot):
+    """Follow predecessor edge indices back from target into a Route"""
+    edges = []
+    current = target
+    while current != source:
+        edge = previous[current]
+        edges.append(edge)
+        current = compiled.source_of(edge)
+    edges.reverse()
+    return Route.from_edges(compiled, source, edges, total_time, snapshot=snapshot)
@@ -0,0 +1,143 @@
+import numpy as np
+
+try:
+    import shapely
+    SHAPELY_AVAILABLE = True
+except ImportError:
+    SHAPELY_AVAILABLE = False
+
+from .dijkstra import shortest_path_tree
+from ..data.graph_builder import get_compiled_graph
+
+# Concave hull tightness passed to shapely (0 = tightest, 1 = convex)
+HULL_RATIO = 0.3
+
+
+class Isochrone:
+    """
+    Everything reachable from an origin within a travel time budget
+
+    nodes and times (hours) list the reachable intersections, nearest
+    first. polygon is the boundary ring as [lon, lat] pairs (GeoJSON
+    order), or an empty list if fewer than three distinct points exist.
+    """
+
+    def __init__(self, origin, max_time, nodes, times, polygon, traffic_version):
+        self.origin = origin
+        self.max_time = max_time
+        self.nodes = nodes
+        self.times = times
+        self.polygon = polygon
+        self.traffic_version = traffic_version
+
+    def to_geojson(self):
+        """Boundary as a GeoJSON Polygon geometry"""
+        return {"type": "Polygon", "coordinates": [self.polygon] if self.polygon else []}
+
+
+def reachable_within(compiled, source, max_time, snapshot=None):
+    """
+    Bounded one-to-all search
+
+    Stops as soon as the next node is farther than max_time, so the work
+    grows with the reachable area rather than the whole graph.
+
+    Args:
+        compiled: CompiledGraph
+        source: Dense index of the origin
+        max_time: Budget in hours
+        snapshot: TrafficSnapshot to search (default: the current one)
+
+    Returns:
+        Float64 array of travel times per node, np.inf beyond the budget
+    """
+    if snapshot is None:
+        snapshot = compiled.traffic_snapshot
+    distances, _ = shortest_path_tree(compiled.adjacency(snapshot), source, max_distance=max_time)
+    # Every label within the budget is final once the search stops;
+    # larger ones are only tentative
+    times = np.array(distances, dtype=np.float64)
+    times[times > max_time] = np.inf
+    return times
+
+
+def isochrone(graph, origin, max_time):
+    """
+    Drive-time isochrone under current traffic
+
+    Args:
+        graph: Graph representation with nodes and edges
+        origin: Starting intersection ID
+        max_time: Budget in hours
+
+    Returns:
+        Isochrone
+    """
+    compiled = get_compiled_graph(graph)
+    snapshot = compiled.traffic_snapshot
+    times = reachable_within(compiled, compiled.index_of(origin), max_time, snapshot)
+
+    reached = np.flatnonzero(np.isfinite(times))
+    reached = reached[np.argsort(times[reached], kind='stable')]
+    polygon = _boundary(compiled, snapshot, times, max_time)
+    return Isochrone(
+        origin=origin,
+        max_time=max_time,
+        nodes=[compiled.node_ids[i] for i in reached.tolist()],
+        times=times[reached].tolist(),
+        polygon=polygon,
+        traffic_version=snapshot.version
+    )
+
+
+def _boundary(compiled, snapshot, times, max_time):
+    """
+    Ring around the reachable area
+
+    Besides the reachable nodes, every edge that leaves the area
+    contributes the point along it where the budget runs out, so the
+    outline does not stop short at the last intersection reached.
+    """
+    sources = compiled.sources()
+    start_times = times[sources]
+    leaving = np.isfinite(start_times) & ~np.isfinite(times[compiled.targets])
+    fraction = (max_time - start_times[leaving]) / snapshot.weights[leaving]
+    fraction = np.clip(np.nan_to_num(fraction), 0, 1)
+    from_nodes = sources[leaving]
+    to_nodes = compiled.targets[leaving]
+
+    reached = np.isfinite(times)
+    lons = np.concatenate([compiled.lons[reached],
+                           compiled.lons[from_nodes] + fraction * (compiled.lons[to_nodes] - compiled.lons[from_nodes])])
+    lats = np.concatenate([compiled.lats[reached],
+                           compiled.lats[from_nodes] + fraction * (compiled.lats[to_nodes] - compiled.lats[from_nodes])])
+    points = np.unique(np.column_stack([lons, lats]).round(6), axis=0)
+    if len(points) < 3:
+        return []
+
+    if SHAPELY_AVAILABLE:
+        hull = shapely.concave_hull(shapely.MultiPoint(points), ratio=HULL_RATIO)
+        if hull.geom_type == "Polygon":
+            return [list(point) for point in hull.exterior.coords]
+    return _convex_hull(points.tolist())
+
+
+def _convex_hull(points):
+    """Closed convex hull ring of sorted [x, y] points (monotone chain)"""
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    ring = lower[:-1] + upper[:-1]
+    if len(ring) < 3:
+        return []
+    return ring + [ring[0]]
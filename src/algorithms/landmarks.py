@@ -0,0 +1,335 @@
+import math
+import random
+import threading
+
+import numpy as np
+
+from .dijkstra import shortest_path_tree
+from ..data.graph_builder import get_compiled_graph
+
+DEFAULT_LANDMARK_COUNT = 16
+STRATEGIES = ("farthest", "avoid")
+
+
+class LandmarkTables:
+    """
+    Precomputed landmark distances for the ALT (A*, Landmarks, Triangle
+    inequality) heuristic
+
+    forward[l, v] is the travel time from landmark l to node v and
+    backward[l, v] the travel time from v to l, stored as float32 (k x n)
+    arrays. By the triangle inequality both
+
+        forward[l, t] - forward[l, v]   and   backward[l, v] - backward[l, t]
+
+    are lower bounds on the travel time from v to t, for every landmark.
+    """
+
+    def __init__(self, landmarks, forward, backward, weights):
+        self.landmarks = list(landmarks)
+        self.forward = np.asarray(forward, dtype=np.float32)
+        self.backward = np.asarray(backward, dtype=np.float32)
+        # Metric the tables were computed for
+        self.weights = weights
+        finite = np.concatenate([self.forward[np.isfinite(self.forward)],
+                                 self.backward[np.isfinite(self.backward)]])
+        # Absolute float32 rounding error a bound can carry; subtracted so
+        # the heuristic stays admissible
+        self.slack = 4 * float(np.finfo(np.float32).eps) * (float(finite.max()) if len(finite) else 0)
+        self._scale = None
+
+    @classmethod
+    def build(cls, compiled, count=DEFAULT_LANDMARK_COUNT, strategy="avoid", seed=0):
+        """
+        Select landmarks and compute their distance tables
+
+        Args:
+            compiled: CompiledGraph
+            count: Number of landmarks
+            strategy: "farthest" or "avoid"
+            seed: Seed for the random start node of the selection
+
+        Returns:
+            LandmarkTables
+        """
+        # One pinned snapshot, so the tables match one metric even if
+        # traffic changes meanwhile
+        snapshot = compiled.traffic_snapshot
+        landmarks, forward, backward = select_landmarks(compiled, count, strategy, seed,
+                                                        snapshot=snapshot)
+        return cls(landmarks, forward, backward, snapshot.weights)
+
+    def recompute(self, compiled):
+        """Tables for the same landmarks under the compiled graph's current weights"""
+        snapshot = compiled.traffic_snapshot
+        forward, backward = _distance_tables(compiled, self.landmarks, snapshot)
+        return LandmarkTables(self.landmarks, forward, backward, snapshot.weights)
+
+    def heuristic(self, target, weights, reverse=False):
+        """
+        Lower-bound function for the travel time from a node to target
+
+        Only the target's column of each table is read up front; the bound
+        of a node is computed the first time the search asks for it and
+        kept for the rest of the query, so a query costs O(k) per node it
+        reaches rather than O(k * n).
+
+        If the tables were computed for older weights, the bounds are
+        scaled by the smallest ratio between new and old edge weights,
+        which keeps them admissible until the tables are refreshed.
+
+        Args:
+            target: Dense node index of the destination
+            weights: Current per-edge weights of the compiled graph
+            reverse: Bound the travel time from target to every node
+                instead, for searches running backward from target
+
+        Returns:
+            Function of a dense node index returning its lower bound
+        """
+        forward = self.forward
+        backward = self.backward
+        if reverse:
+            # Swapping the tables mirrors both triangle inequalities
+            forward, backward = backward, forward
+        from_landmarks = forward[:, target].tolist()
+        to_landmarks = backward[:, target].tolist()
+        slack = self.slack
+        scale = self.scale_for(weights)
+        bounds = {}
+
+        def estimate(node):
+            bound = bounds.get(node)
+            if bound is None:
+                bound = 0.0
+                # inf - inf is NaN (landmark reaches neither node) and never
+                # compares greater, so such landmarks are skipped
+                for a, b in zip(from_landmarks, forward[:, node].tolist()):
+                    if a - b > bound:
+                        bound = a - b
+                for a, b in zip(backward[:, node].tolist(), to_landmarks):
+                    if a - b > bound:
+                        bound = a - b
+                # Infinite bounds mean "unreachable" and stay so under any metric
+                if bound != math.inf:
+                    bound = max(bound - slack, 0.0) * scale
+                bounds[node] = bound
+            return bound
+
+        return estimate
+
+    def scale_for(self, weights):
+        """Factor that keeps these tables admissible under the given weights"""
+        if weights is self.weights:
+            return 1.0
+        # One (weights, scale) pair, swapped in whole, so computed once per
+        # snapshot and safe to read from concurrent queries
+        cached = self._scale
+        if cached is None or cached[0] is not weights:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios = np.asarray(weights) / np.asarray(self.weights)
+            ratios = ratios[np.isfinite(ratios)]
+            cached = (weights, min(1.0, float(ratios.min())) if len(ratios) else 1.0)
+            self._scale = cached
+        return cached[1]
+
+    def memory_usage(self):
+        return self.forward.nbytes + self.backward.nbytes
+
+
+def select_landmarks(compiled, count=DEFAULT_LANDMARK_COUNT, strategy="avoid", seed=0,
+                     snapshot=None):
+    """
+    Choose landmark nodes
+
+    - farthest: repeatedly pick the node farthest from all landmarks chosen
+      so far, which spreads landmarks along the edge of the map
+    - avoid: grow a shortest path tree from a random node and pick a leaf
+      in the subtree whose distances are worst covered by the current
+      landmarks (Goldberg & Werneck), which gives tighter bounds
+
+    Args:
+        compiled: CompiledGraph
+        count: Number of landmarks
+        strategy: One of STRATEGIES
+        seed: Seed for the random start nodes
+        snapshot: TrafficSnapshot to measure distances with (default: current)
+
+    Returns:
+        Tuple of (landmarks, forward, backward) with the distance tables
+        for the chosen landmarks
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown landmark strategy '{strategy}'")
+
+    rng = random.Random(seed)
+    n = compiled.num_nodes
+    count = min(count, n)
+    if snapshot is None:
+        snapshot = compiled.traffic_snapshot
+    adjacency = compiled.adjacency(snapshot)
+
+    landmarks = []
+    forward_rows = []
+    backward_rows = []
+
+    def add_landmark(landmark):
+        forward, backward = _distance_tables(compiled, [landmark], snapshot)
+        landmarks.append(landmark)
+        forward_rows.append(forward[0])
+        backward_rows.append(backward[0])
+
+    while len(landmarks) < count:
+        if strategy == "farthest":
+            if landmarks:
+                distances, _ = shortest_path_tree(adjacency, landmarks)
+            else:
+                distances, _ = shortest_path_tree(adjacency, rng.randrange(n))
+            candidate = _farthest(distances, landmarks)
+        else:
+            candidate = _avoid_candidate(adjacency, rng.randrange(n),
+                                         forward_rows, backward_rows)
+        if candidate is None or candidate in landmarks:
+            # Graph exhausted (tiny or disconnected); fall back to a random node
+            remaining = [v for v in range(n) if v not in set(landmarks)]
+            if not remaining:
+                break
+            candidate = rng.choice(remaining)
+        add_landmark(candidate)
+
+    return landmarks, np.array(forward_rows, dtype=np.float32), np.array(backward_rows, dtype=np.float32)
+
+
+def _farthest(distances, exclude):
+    """Reachable node with the largest distance"""
+    distances = np.asarray(distances)
+    distances[~np.isfinite(distances)] = -1
+    if exclude:
+        distances[exclude] = -1
+    best = int(np.argmax(distances))
+    return best if distances[best] > 0 else None
+
+
+def _avoid_candidate(adjacency, root, forward_rows, backward_rows):
+    """Leaf of the shortest path tree from root that is worst covered by landmarks"""
+    distances, previous = shortest_path_tree(adjacency, root)
+    distances = np.asarray(distances)
+    previous = np.asarray(previous)
+    reached = np.flatnonzero(np.isfinite(distances))
+
+    # weight(v) = d(root, v) - best current lower bound on it
+    weight = distances[reached].copy()
+    if forward_rows:
+        forward = np.asarray(forward_rows, dtype=np.float64)[:, reached]
+        backward = np.asarray(backward_rows, dtype=np.float64)[:, reached]
+        root_forward = np.asarray(forward_rows, dtype=np.float64)[:, root:root + 1]
+        root_backward = np.asarray(backward_rows, dtype=np.float64)[:, root:root + 1]
+        with np.errstate(invalid='ignore'):
+            bound = np.fmax((forward - root_forward).max(axis=0),
+                            (root_backward - backward).max(axis=0))
+        bound = np.nan_to_num(bound, nan=0.0, posinf=0.0, neginf=0.0)
+        weight = np.maximum(weight - bound, 0)
+
+    size = np.zeros(len(distances))
+    size[reached] = weight
+    has_landmark = np.zeros(len(distances), dtype=bool)
+    for row in forward_rows:
+        has_landmark[np.flatnonzero(row == 0)] = True
+
+    # Accumulate subtree sizes from the leaves up; subtrees holding a
+    # landmark are already covered and count as zero
+    for v in reached[np.argsort(-distances[reached], kind='stable')].tolist():
+        parent = previous[v]
+        if has_landmark[v]:
+            size[v] = 0
+        if parent >= 0:
+            if has_landmark[v]:
+                has_landmark[parent] = True
+            else:
+                size[parent] += size[v]
+
+    if not size.any():
+        return None
+
+    children = {}
+    for v in reached.tolist():
+        parent = previous[v]
+        if parent >= 0:
+            children.setdefault(int(parent), []).append(v)
+
+    current = int(np.argmax(size))
+    while current in children:
+        current = max(children[current], key=lambda child: size[child])
+    return current
+
+
+def _distance_tables(compiled, landmarks, snapshot):
+    """Forward (landmark -> v) and backward (v -> landmark) distance rows"""
+    adjacency = compiled.adjacency(snapshot)
+    reverse = compiled.reverse_adjacency(snapshot)
+    forward = np.empty((len(landmarks), compiled.num_nodes), dtype=np.float32)
+    backward = np.empty((len(landmarks), compiled.num_nodes), dtype=np.float32)
+    for i, landmark in enumerate(landmarks):
+        forward[i] = shortest_path_tree(adjacency, landmark)[0]
+        backward[i] = shortest_path_tree(reverse, landmark)[0]
+    return forward, backward
+
+
+class LandmarksNotReady(RuntimeError):
+    """No landmark tables yet, and building them was not allowed"""
+
+
+def get_landmark_tables(graph, count=DEFAULT_LANDMARK_COUNT, strategy="avoid", build=None):
+    """
+    Return the graph's landmark tables, building and caching them on first use
+
+    Building takes seconds on a city, so a server builds them at startup
+    and sets `compiled.landmarks_on_demand = False` to keep requests from
+    doing it.
+
+    Args:
+        graph: Graph representation with nodes and edges
+        count: Number of landmarks
+        strategy: One of STRATEGIES
+        build: Whether to build missing tables (default:
+            compiled.landmarks_on_demand, else True)
+
+    Raises:
+        LandmarksNotReady: There are no tables and `build` is false
+    """
+    compiled = get_compiled_graph(graph)
+    tables = getattr(compiled, 'landmark_tables', None)
+    if tables is None:
+        if build is None:
+            build = getattr(compiled, 'landmarks_on_demand', True)
+        if not build:
+            raise LandmarksNotReady("ALT landmark tables are still being built")
+        tables = LandmarkTables.build(compiled, count=count, strategy=strategy)
+        compiled.landmark_tables = tables
+    return tables
+
+
+def refresh_landmarks_async(graph):
+    """
+    Recompute the landmark tables for the current traffic in a background thread
+
+    Queries keep using the previous (scaled) tables until the new ones are
+    swapped in. Does nothing if no tables have been built yet.
+
+    Returns:
+        The started Thread, or None
+    """
+    compiled = get_compiled_graph(graph)
+    tables = getattr(compiled, 'landmark_tables', None)
+    if tables is None:
+        return None
+
+    def refresh():
+        try:
+            compiled.landmark_tables = tables.recompute(compiled)
+        except Exception as e:
+            print(f"Error refreshing landmark tables: {e}")
+
+    thread = threading.Thread(target=refresh, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,155 @@
+import heapq
+import math
+
+import numpy as np
+
+from .contraction_hierarchies import HierarchyNotReady, get_contraction_hierarchy
+from .dijkstra import _unwind_route
+from ..data.graph_builder import get_compiled_graph
+
+# Names accepted by travel_time_matrix and the /api/matrix "method" field
+METHODS = ("auto", "ch", "dijkstra")
+
+
+class TravelTimeMatrix:
+    """
+    Travel times (hours) from every source to every target
+
+    durations[i][j] is the time from sources[i] to targets[j], math.inf if
+    unreachable. paths[i][j] is the corresponding list of intersection IDs
+    (None if unreachable) when paths were requested, otherwise paths is None.
+    """
+
+    def __init__(self, sources, targets, durations, method, traffic_version, paths=None):
+        self.sources = list(sources)
+        self.targets = list(targets)
+        self.durations = durations
+        self.method = method
+        self.traffic_version = traffic_version
+        self.paths = paths
+
+    def minutes(self, decimals=2):
+        """Durations in minutes as nested lists, with None for unreachable pairs"""
+        rounded = np.round(self.durations * 60, decimals)
+        return [[value if math.isfinite(value) else None for value in row]
+                for row in rounded.tolist()]
+
+
+def travel_time_matrix(graph, sources, targets=None, method="auto", include_paths=False):
+    """
+    Compute a many-to-many travel time matrix
+
+    All searches run on one pinned traffic snapshot.
+
+    - ch: bucket-based many-to-many over the contraction hierarchy, about
+      len(sources) + len(targets) upward searches
+    - dijkstra: one one-to-many search per source, each stopping once
+      every target is settled
+    - auto: ch if a hierarchy (or customizable topology) is already
+      attached to the graph, dijkstra otherwise; building a hierarchy
+      only for one matrix would cost more than it saves. ch also falls
+      back to dijkstra while a hierarchy is not ready (HierarchyNotReady)
+
+    Args:
+        graph: Graph representation with nodes and edges
+        sources: Starting intersection IDs
+        targets: Destination intersection IDs (default: the sources)
+        method: One of METHODS
+        include_paths: Also return the path of every pair. Paths come from
+            the one-to-many search trees, so they cost one search per
+            source even with method "ch".
+
+    Returns:
+        TravelTimeMatrix
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown matrix method '{method}'")
+    if targets is None:
+        targets = sources
+
+    compiled = get_compiled_graph(graph)
+    snapshot = compiled.traffic_snapshot
+    source_indices = [compiled.index_of(node_id) for node_id in sources]
+    target_indices = [compiled.index_of(node_id) for node_id in targets]
+
+    if method == "auto":
+        has_hierarchy = (getattr(compiled, 'contraction_hierarchy', None) is not None
+                         or getattr(compiled, 'cch_topology', None) is not None)
+        method = "ch" if has_hierarchy else "dijkstra"
+
+    hierarchy = None
+    if method == "ch":
+        try:
+            hierarchy = get_contraction_hierarchy(graph, snapshot)
+        except HierarchyNotReady:
+            method = "dijkstra"
+
+    paths = None
+    if hierarchy is not None:
+        durations = hierarchy.many_to_many(source_indices, target_indices)
+        if include_paths:
+            _, paths = _one_to_many_matrix(compiled, snapshot, source_indices,
+                                           target_indices, include_paths=True)
+    else:
+        durations, paths = _one_to_many_matrix(compiled, snapshot, source_indices,
+                                               target_indices, include_paths)
+
+    return TravelTimeMatrix(sources, targets, durations, method, snapshot.version, paths)
+
+
+def one_to_many(compiled, source, targets, snapshot=None):
+    """
+    Dijkstra from one node until every target is settled
+
+    Args:
+        compiled: CompiledGraph
+        source: Dense index of the start node
+        targets: Dense indices of the destinations
+        snapshot: TrafficSnapshot to search (default: the current one)
+
+    Returns:
+        Tuple of (distances, previous): dicts of reached node -> distance
+        and node -> edge index it was reached by
+    """
+    if snapshot is None:
+        snapshot = compiled.traffic_snapshot
+    offsets, edge_targets, weights = compiled.adjacency(snapshot)
+
+    remaining = set(targets)
+    distances = {source: 0}
+    previous = {}
+    settled = set()
+    heap = [(0, source)]
+    while heap and remaining:
+        distance, current = heapq.heappop(heap)
+        if current in settled:
+            continue
+        settled.add(current)
+        remaining.discard(current)
+
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = edge_targets[edge]
+            new_distance = distance + weights[edge]
+            if new_distance < distances.get(neighbor, math.inf):
+                distances[neighbor] = new_distance
+                previous[neighbor] = edge
+                heapq.heappush(heap, (new_distance, neighbor))
+
+    # Tentative labels of unsettled nodes are not final; drop them
+    return {node: distances[node] for node in settled}, previous
+
+
+def _one_to_many_matrix(compiled, snapshot, sources, targets, include_paths):
+    durations = np.full((len(sources), len(targets)), math.inf)
+    paths = [] if include_paths else None
+    for row, source in enumerate(sources):
+        distances, previous = one_to_many(compiled, source, targets, snapshot)
+        durations[row] = [distances.get(target, math.inf) for target in targets]
+        if include_paths:
+            paths.append([
+                _unwind_route(compiled, previous, source, target, distances[target], snapshot).path
+                if target in distances else None
+                for target in targets
+            ])
+    return durations, paths
+
@@ -0,0 +1,170 @@
+import heapq
+import math
+from datetime import datetime, time
+
+import numpy as np
+
+from .a_star import haversine_distance
+from .bidirectional import max_straight_line_speed
+from ..data.graph_builder import get_compiled_graph
+from ..data.traffic_profiles import BIN_HOURS, BINS_PER_DAY, SCALE, get_traffic_profiles
+from ..models.route import Route
+
+
+def departure_hours(departure_time):
+    """
+    Hour of the day (0-24, fractional) to depart at
+
+    Args:
+        departure_time: datetime or time, an ISO 8601 date-time or "HH:MM"
+            string, or a number of hours since midnight
+    """
+    if isinstance(departure_time, str):
+        try:
+            departure_time = datetime.fromisoformat(departure_time)
+        except ValueError:
+            departure_time = time.fromisoformat(departure_time)
+    if isinstance(departure_time, (datetime, time)):
+        return departure_time.hour + departure_time.minute / 60 + departure_time.second / 3600
+    return float(departure_time) % 24
+
+
+def td_dijkstra(graph, start, end, departure_time, stats=None):
+    """
+    Time-dependent Dijkstra: fastest route when leaving at departure_time
+
+    Each road's travel time is its free-flow time scaled by its traffic
+    profile at the moment the route reaches it (see traffic_profiles.py),
+    rather than by the current multiplier.
+
+    Args:
+        graph: Graph representation with nodes and edges
+        start: Starting intersection ID
+        end: Destination intersection ID
+        departure_time: See departure_hours
+        stats: Optional dict, receives the number of settled nodes
+
+    Returns:
+        Route (edge times are those at the time each road is entered), or
+        an unreachable Route if no path exists
+    """
+    compiled = get_compiled_graph(graph)
+    return _td_search(compiled, get_traffic_profiles(graph), start, end,
+                      departure_hours(departure_time), None, stats)
+
+
+def td_a_star(graph, start, end, departure_time, stats=None):
+    """
+    Time-dependent A*, otherwise like td_dijkstra
+
+    The straight-line estimate uses the fastest any road gets during the
+    day, so it never overestimates at any departure time.
+    """
+    compiled = get_compiled_graph(graph)
+    profiles = get_traffic_profiles(graph)
+    speed = _straight_line_speed(compiled, profiles)
+    lats, lons = compiled.coordinates()
+    target = compiled.index_of(end)
+    end_lat, end_lon = lats[target], lons[target]
+
+    def estimate(node):
+        return haversine_distance(lats[node], lons[node], end_lat, end_lon) / speed
+
+    return _td_search(compiled, profiles, start, end, departure_hours(departure_time),
+                      estimate, stats)
+
+
+def _free_flow_times(compiled):
+    """Travel time in hours per edge at multiplier 1, cached on the compiled graph"""
+    times = getattr(compiled, 'free_flow_times', None)
+    if times is None:
+        times = ((compiled.lengths / 1000) / compiled.speeds.astype(np.float64)).tolist()
+        compiled.free_flow_times = times
+    return times
+
+
+def _straight_line_speed(compiled, profiles):
+    """Straight-line speed bound over every edge's fastest time of day"""
+    cached = getattr(compiled, 'td_straight_line_speed', None)
+    if cached is not None and cached[0] is profiles:
+        return cached[1]
+    fastest = np.asarray(_free_flow_times(compiled)) * profiles.min_multipliers()
+    speed = max_straight_line_speed(compiled, fastest)
+    compiled.td_straight_line_speed = (profiles, speed)
+    return speed
+
+
+def _td_search(compiled, profiles, start, end, start_hour, estimate, stats):
+    """
+    Label-setting search on arrival times
+
+    Correct as long as no road lets a later departure arrive earlier (the
+    FIFO property), which holds unless a profile drops faster than one
+    hour of travel time per hour of clock time; quarter-hour multiplier
+    curves on city roads stay far below that.
+    """
+    offsets, targets, _ = compiled.adjacency()
+    free_flow = _free_flow_times(compiled)
+    profile_ids, table = profiles.search_data()
+    stride = BINS_PER_DAY + 1
+    source = compiled.index_of(start)
+    target = compiled.index_of(end)
+
+    arrival = [math.inf] * compiled.num_nodes
+    previous = [-1] * compiled.num_nodes  # edge each node was reached by
+    done = [False] * compiled.num_nodes
+    arrival[source] = start_hour
+    heap = [(start_hour, source)]
+    settled = 0
+    while heap:
+        _, current = heapq.heappop(heap)
+        if done[current]:
+            continue
+        done[current] = True
+        settled += 1
+        if current == target:
+            break
+
+        # Every road out of a node is entered at the same moment, so the
+        # profile bin is found once per node
+        now = arrival[current]
+        position = (now % 24) / BIN_HOURS
+        b = int(position)
+        fraction = position - b
+        for edge in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[edge]
+            if done[neighbor]:
+                continue
+            base = profile_ids[edge] * stride + b
+            low = table[base]
+            multiplier = (low + (table[base + 1] - low) * fraction) / SCALE
+            new_arrival = now + free_flow[edge] * multiplier
+            if new_arrival < arrival[neighbor]:
+                arrival[neighbor] = new_arrival
+                previous[neighbor] = edge
+                key = new_arrival if estimate is None else new_arrival + estimate(neighbor)
+                heapq.heappush(heap, (key, neighbor))
+
+    if stats is not None:
+        stats['settled'] = settled
+
+    if arrival[target] == math.inf:
+        return Route.unreachable()
+
+    edges = []
+    current = target
+    while current != source:
+        edge = previous[current]
+        edges.append(edge)
+        current = compiled.source_of(edge)
+    edges.reverse()
+
+    node_ids = compiled.node_ids
+    path = [source] + [targets[edge] for edge in edges]
+    return Route(
+        nodes=[node_ids[node] for node in path],
+        edge_ids=[compiled.edge_ids[edge] for edge in edges],
+        edge_times=[arrival[b] - arrival[a] for a, b in zip(path, path[1:])],
+        edge_lengths=[float(compiled.lengths[edge]) for edge in edges],
+        total_time=arrival[target] - start_hour
+    )
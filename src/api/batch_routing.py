@@ -0,0 +1,384 @@
+# src/api/batch_routing.py
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from .routing_api import find_path
+from ..algorithms.contraction_hierarchies import (
+    ContractionHierarchy, HierarchyNotReady, get_contraction_hierarchy
+)
+from ..algorithms.landmarks import LandmarkTables, get_landmark_tables
+from ..data.graph_builder import CompiledGraph, TrafficSnapshot, get_compiled_graph
+
+DEFAULT_CHUNK_SIZE = 256
+# Batches smaller than this are routed in the calling process; starting
+# workers would cost more than it saves
+MIN_POOL_PAIRS = 64
+
+# Graph the worker processes route on, set once per worker by _init_worker
+_worker_graph = None
+# Routing state the worker's graph currently carries (see _use_state)
+_worker_state = None
+# Immutable CompiledGraph arrays workers map rather than copy
+_GRAPH_ARRAYS = ("lats", "lons", "offsets", "targets", "lengths", "speeds")
+
+
+class _CompiledOnly:
+    """
+    Stand-in graph carrying just the compiled CSR form
+
+    Workers only run the "csr" engines (and the hierarchy/landmark
+    structures attached to the compiled graph), so the Road and
+    Intersection objects never need to reach them.
+    """
+
+    def __init__(self, compiled):
+        self.compiled_graph = compiled
+
+
+def _map_arrays(paths, mapped=None):
+    """
+    Read-only memory maps of arrays written by BatchRouter._publish
+
+    Args:
+        paths: Dict of name -> .npy path
+        mapped: Dict of path -> array already mapped, so an array shared
+            by several structures is one object in the worker too
+
+    Returns:
+        Dict of name -> array
+    """
+    mapped = {} if mapped is None else mapped
+    for path in paths.values():
+        if path not in mapped:
+            mapped[path] = np.load(path, mmap_mode='r')
+    return {name: mapped[path] for name, path in paths.items()}
+
+
+def _init_worker(node_ids, edge_ids, paths):
+    global _worker_graph, _worker_state
+    compiled = CompiledGraph(node_ids=node_ids, edge_ids=edge_ids, **_map_arrays(paths))
+    # Workers route on what the parent prepared; they never build it
+    compiled.contract_on_demand = False
+    compiled.landmarks_on_demand = False
+    _worker_graph = _CompiledOnly(compiled)
+    _worker_state = None
+
+
+def _use_state(state_id, state):
+    """Switch the worker's graph to the traffic and structures of a routing state"""
+    global _worker_state
+    if state_id == _worker_state:
+        return
+    compiled = _worker_graph.compiled_graph
+    mapped = {}
+    arrays = _map_arrays(state["snapshot"], mapped)
+    compiled.traffic_snapshot = TrafficSnapshot(arrays["traffic"], arrays["weights"],
+                                                version=state["version"])
+    hierarchy = None
+    if state["hierarchy"] is not None:
+        hierarchy = ContractionHierarchy.from_arrays(
+            compiled.node_ids, _map_arrays(state["hierarchy"], mapped))
+    compiled.contraction_hierarchy = hierarchy
+    tables = None
+    if state["landmarks"] is not None:
+        landmarks, paths = state["landmarks"]
+        arrays = _map_arrays(paths, mapped)
+        tables = LandmarkTables(landmarks, arrays["forward"], arrays["backward"], arrays["weights"])
+    compiled.landmark_tables = tables
+    _worker_state = state_id
+
+
+def _route_chunk(task):
+    """Route one shard of pairs in a worker; results stay in input order"""
+    state_id, state, pairs, algorithm, heuristic = task
+    _use_state(state_id, state)
+    return [route_pair(_worker_graph, start, end, algorithm, heuristic) for start, end in pairs]
+
+
+def route_pair(graph, start, end, algorithm="a_star", heuristic="haversine"):
+    """
+    Route one origin-destination pair with the "csr" engine
+
+    Returns:
+        JSON-serializable dict with start, end and either path,
+        duration_minutes, distance_km and traffic_version, or an error
+    """
+    compiled = get_compiled_graph(graph)
+    result = {"start": start, "end": end}
+    if start not in compiled.node_index or end not in compiled.node_index:
+        result["error"] = "Invalid node IDs"
+        return result
+    try:
+        route = find_path(graph, start, end, algorithm=algorithm, engine="csr",
+                          heuristic=heuristic)
+    except Exception as e:
+        result["error"] = f"Error finding route: {str(e)}"
+        return result
+    if not route.found or not math.isfinite(route.total_time):
+        result["error"] = "No route found"
+        return result
+    result.update({
+        "path": route.path,
+        "duration_minutes": round(route.total_time * 60, 2),
+        "distance_km": route.total_distance / 1000,
+        "traffic_version": route.traffic_version
+    })
+    return result
+
+
+class BatchRouter:
+    """
+    Routes many independent origin-destination pairs on a process pool
+
+    Workers are started with forkserver (or spawn), never by forking this
+    multithreaded process. The compiled graph's arrays, and per routing
+    state the traffic weights and any hierarchy or landmark tables, are
+    written once to .npy files in a private temporary directory that every
+    worker maps read-only, so they share one copy in the page cache however
+    many processes there are. A traffic update doesn't restart the pool:
+    the next batch publishes a new routing state (only the arrays that
+    changed are written) and tasks name the state they need, which each
+    worker switches to before routing. A state's files are removed once a
+    newer one exists and no batch uses it.
+    """
+
+    def __init__(self, graph, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 min_pool_pairs=MIN_POOL_PAIRS):
+        self.graph = graph
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.min_pool_pairs = min_pool_pairs
+        self._pool = None
+        self._pool_graph = None  # CompiledGraph the pool's workers map
+        self._directory = None
+        self._files = {}  # id(array) -> [array, path, number of references]
+        self._written = 0
+        self._states = 0  # ids handed out
+        self._state = None  # (id, _prepare result, descriptor, file keys) of the newest state
+        self._batches = {}  # state id -> (running batches, file keys once retired)
+        # Held only to look up, publish and release states and pools, never while routing
+        self._lock = threading.Lock()
+        self.pool_starts = 0
+
+    def route(self, pairs, algorithm="a_star", heuristic="haversine"):
+        """
+        Route every pair
+
+        Args:
+            pairs: Iterable of (start, end) intersection IDs
+            algorithm: One of ALGORITHMS
+            heuristic: a_star heuristic ("haversine" or "alt")
+
+        Returns:
+            List of route_pair results in the order of pairs; a pair that
+            fails carries an "error" instead of failing the batch
+        """
+        pairs = [tuple(pair) for pair in pairs]
+        if self.processes <= 1 or len(pairs) < self.min_pool_pairs:
+            return [route_pair(self.graph, start, end, algorithm, heuristic)
+                    for start, end in pairs]
+
+        # Outside the lock: get_contraction_hierarchy serializes its own
+        # builds, and other batches shouldn't wait on one
+        wanted = self._prepare(algorithm, heuristic)
+        with self._lock:
+            pool, stale = self._current_pool()
+            state_id, state = self._current_state(wanted)
+            count, keys = self._batches.get(state_id, (0, None))
+            self._batches[state_id] = (count + 1, keys)
+        if stale is not None:
+            _stop_pool(stale)
+
+        # Fewer, larger chunks when the batch is small, so every worker gets some
+        chunk_size = max(1, min(self.chunk_size, math.ceil(len(pairs) / self.processes)))
+        tasks = [(state_id, state, pairs[i:i + chunk_size], algorithm, heuristic)
+                 for i in range(0, len(pairs), chunk_size)]
+        try:
+            results = []
+            for chunk in pool.imap(_route_chunk, tasks):
+                results.extend(chunk)
+        finally:
+            with self._lock:
+                self._release(state_id)
+        return results
+
+    def _prepare(self, algorithm, heuristic):
+        """Build what the algorithm needs; returns the routing state workers must share"""
+        compiled = get_compiled_graph(self.graph)
+        snapshot = compiled.traffic_snapshot
+        if algorithm == "ch":
+            try:
+                get_contraction_hierarchy(self.graph, snapshot)
+            except HierarchyNotReady:
+                pass  # workers fall back like find_path does
+        elif algorithm == "alt" or heuristic == "alt":
+            get_landmark_tables(self.graph)
+
+        return (snapshot,
+                getattr(compiled, 'contraction_hierarchy', None),
+                getattr(compiled, 'landmark_tables', None))
+
+    def _current_pool(self):
+        """
+        Pool whose workers map the current compiled graph (lock held)
+
+        Returns:
+            Tuple of (pool, replaced pool the caller must stop, or None)
+        """
+        compiled = get_compiled_graph(self.graph)
+        if self._pool is not None and self._pool_graph is compiled:
+            return self._pool, None
+        stale = self._pool
+
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="grid-smart-batch-")
+        # The graph's arrays stay published for as long as the pool runs
+        paths, _ = self._publish({name: getattr(compiled, name) for name in _GRAPH_ARRAYS})
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._pool = context.Pool(self.processes, initializer=_init_worker,
+                                  initargs=(compiled.node_ids, compiled.edge_ids, paths))
+        self._pool_graph = compiled
+        self.pool_starts += 1
+        return self._pool, stale
+
+    def _current_state(self, wanted):
+        """
+        Id and descriptor of the published routing state for `wanted` (lock held)
+
+        Returns the newest state instead if it is for newer traffic, so a
+        batch prepared just before an update never switches workers back.
+        """
+        if self._state is not None:
+            state_id, current, state, _ = self._state
+            if (all(a is b for a, b in zip(wanted, current))
+                    or wanted[0].version < current[0].version):
+                return state_id, state
+
+        snapshot, hierarchy, tables = wanted
+        state = {"version": snapshot.version, "hierarchy": None, "landmarks": None}
+        state["snapshot"], keys = self._publish({"traffic": snapshot.traffic,
+                                                  "weights": snapshot.weights})
+        if hierarchy is not None:
+            state["hierarchy"], more = self._publish(hierarchy.arrays())
+            keys += more
+        if tables is not None:
+            published, more = self._publish({"forward": tables.forward, "backward": tables.backward,
+                                             "weights": np.asarray(tables.weights)})
+            state["landmarks"] = (tables.landmarks, published)
+            keys += more
+
+        self._states += 1
+        if self._state is not None:
+            self._retire(self._state[0], self._state[3])
+        self._state = (self._states, wanted, state, keys)
+        return self._states, state
+
+    def _publish(self, arrays):
+        """
+        Write arrays as .npy files workers can map (lock held)
+
+        An array already written (the same object) is reused, so a new
+        state only writes what changed. Each array published holds a
+        reference to its file until passed to _unpublish.
+
+        Returns:
+            Tuple of (dict of name -> path, list of the published keys)
+        """
+        published = {}
+        keys = []
+        for name, array in arrays.items():
+            entry = self._files.get(id(array))
+            if entry is None:
+                self._written += 1
+                path = os.path.join(self._directory, f"{self._written}_{name}.npy")
+                np.save(path, array)
+                # The array is kept so its id can't be reused while the file exists
+                entry = self._files[id(array)] = [array, path, 0]
+            entry[2] += 1
+            published[name] = entry[1]
+            keys.append(id(array))
+        return published, keys
+
+    def _unpublish(self, keys):
+        """Drop references taken by _publish, deleting files nobody uses (lock held)"""
+        for key in keys:
+            entry = self._files[key]
+            entry[2] -= 1
+            if entry[2]:
+                continue
+            del self._files[key]
+            try:
+                os.remove(entry[1])
+            except OSError:
+                pass  # still mapped where that prevents removal; close() cleans up
+
+    def _retire(self, state_id, keys):
+        """A newer state replaced this one: unpublish it now or after its last batch"""
+        count, _ = self._batches.get(state_id, (0, None))
+        if count:
+            self._batches[state_id] = (count, keys)
+        else:
+            self._batches.pop(state_id, None)
+            self._unpublish(keys)
+
+    def _release(self, state_id):
+        """A batch on this state finished (lock held)"""
+        count, keys = self._batches[state_id]
+        if count > 1:
+            self._batches[state_id] = (count - 1, keys)
+            return
+        del self._batches[state_id]
+        # keys is only set once the state was retired
+        if keys is not None:
+            self._unpublish(keys)
+
+    def close(self):
+        """Stop the worker processes and remove the published arrays"""
+        with self._lock:
+            pool, self._pool, self._pool_graph = self._pool, None, None
+            directory, self._directory = self._directory, None
+            self._files = {}
+            self._state = None
+            self._batches = {}
+        if pool is not None:
+            _stop_pool(pool)
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def _stop_pool(pool):
+    # No tasks are queued on a pool nobody routes on, so close() returns quickly
+    pool.close()
+    pool.join()
+
+
+def route_batch(graph, pairs, algorithm="a_star", heuristic="haversine",
+                processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Route many origin-destination pairs in parallel
+
+    Starts a pool for this call only; keep a BatchRouter to reuse one.
+
+    Args:
+        graph: Graph representation with nodes and edges
+        pairs: Iterable of (start, end) intersection IDs
+        algorithm: One of ALGORITHMS
+        heuristic: a_star heuristic ("haversine" or "alt")
+        processes: Worker count (default: one per CPU)
+        chunk_size: Pairs sent to a worker at a time
+
+    Returns:
+        List of route_pair results in the order of pairs
+    """
+    router = BatchRouter(graph, processes=processes, chunk_size=chunk_size)
+    try:
+        return router.route(pairs, algorithm=algorithm, heuristic=heuristic)
+    finally:
+        router.close()
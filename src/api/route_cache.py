@@ -0,0 +1,266 @@
+# src/api/route_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300  # seconds
+
+
+class RouteCache:
+    """
+    LRU cache of route results with a size limit and a time-to-live
+
+    Entries are keyed by (start, end, algorithm) and belong to one traffic
+    version: the first lookup after TrafficData.update_traffic() bumps the
+    version drops every local entry, so a result is never served for
+    traffic it was not computed with. Subscribed to TrafficData, the cache
+    instead repairs itself from each update's delta (see apply_delta) and
+    keeps the routes the update cannot have changed.
+
+    An optional shared backend (see SQLiteRouteBackend) lets several
+    worker processes reuse each other's results. Workers refresh traffic
+    independently, so shared entries are keyed by the traffic fingerprint,
+    a hash of the multipliers, rather than the per-process version counter.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # key -> (expires, value, road ids or None)
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.repairs = 0
+        self.repaired_drops = 0
+
+    def _sync_version(self, traffic):
+        """Drop local entries if the traffic version changed (lock held)"""
+        if traffic.version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = traffic.version
+
+    def get(self, start, end, algorithm, traffic):
+        """
+        Look up a cached result
+
+        Args:
+            start: Starting intersection ID
+            end: Destination intersection ID
+            algorithm: Routing algorithm name
+            traffic: TrafficData whose current version the result must match
+
+        Returns:
+            The cached value, or None
+        """
+        return self.lookup((start, end, algorithm), traffic)
+
+    def lookup(self, key, traffic):
+        """
+        Look up a cached result under any tuple key
+
+        Other per-traffic results (e.g. isochrones) share the cache, its
+        limits and its invalidation by using keys that cannot collide with
+        (start, end, algorithm).
+
+        Returns:
+            The cached value, or None
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version(traffic)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.backend is not None and traffic.fingerprint is not None:
+            value = self.backend.get(_shared_key(key, traffic.fingerprint))
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._store(key, value, now, None)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, start, end, algorithm, traffic, value, edge_ids=None, traffic_version=None):
+        """
+        Cache a JSON-serializable result for the current traffic version
+
+        Args:
+            edge_ids: Road ids of the route, which lets the entry survive
+                traffic updates that only slow down other roads
+            traffic_version: Version the result was computed on; it is
+                only stored if that is still the current version
+
+        Returns:
+            True if the result was stored
+        """
+        return self.store((start, end, algorithm), traffic, value, edge_ids, traffic_version)
+
+    def store(self, key, traffic, value, edge_ids=None, traffic_version=None):
+        """Cache a JSON-serializable result under any tuple key (see lookup and put)"""
+        # Read before the version check: if the version still matches
+        # under the lock, no update landed since and this is its fingerprint
+        fingerprint = traffic.fingerprint
+        with self._lock:
+            self._sync_version(traffic)
+            # Checked here, not by the caller, so an update landing between
+            # the check and the store can't file an old result as fresh
+            if traffic_version is not None and traffic_version != self._version:
+                return False
+            self._store(key, value, time.monotonic(), edge_ids)
+        if self.backend is not None and fingerprint is not None:
+            self.backend.put(_shared_key(key, fingerprint), value, self.ttl)
+        return True
+
+    def _store(self, key, value, now, edge_ids):
+        if edge_ids is not None:
+            edge_ids = frozenset(edge_ids)
+        self._entries[key] = (now + self.ttl, value, edge_ids)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def apply_delta(self, delta):
+        """
+        Carry the cache over a traffic update (a TrafficData subscriber)
+
+        If the update only slowed roads down, a cached shortest route that
+        uses none of them is still a shortest route: every other route got
+        no faster. Those entries move to the new version; entries on a
+        changed road, and results stored without their roads (isochrones,
+        alternatives), are dropped. If any road got faster, or the cache
+        missed an update, everything is dropped.
+
+        Args:
+            delta: TrafficDelta
+        """
+        with self._lock:
+            if self._version != delta.previous_version or delta.faster:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+            else:
+                changed = set(delta.edge_ids)
+                stale = [key for key, (_, _, edge_ids) in self._entries.items()
+                         if edge_ids is None or not changed.isdisjoint(edge_ids)]
+                for key in stale:
+                    del self._entries[key]
+                self.repairs += 1
+                self.repaired_drops += len(stale)
+            self._version = delta.version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "repairs": self.repairs,
+                "repaired_drops": self.repaired_drops,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "traffic_version": self._version,
+                "shared": self.backend is not None
+            }
+
+
+class SQLiteRouteBackend:
+    """
+    Route results shared between processes through a SQLite file
+
+    Uses write-ahead logging so readers in other workers are not blocked
+    by writes. Expired rows are ignored on read and purged periodically.
+    """
+
+    PURGE_EVERY = 256  # puts between purges of expired rows
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS routes (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+        )
+        self._connection.commit()
+        self._puts = 0
+
+    def get(self, key):
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT value FROM routes WHERE key = ? AND expires > ?", (key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Route cache backend error: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, ttl):
+        try:
+            with self._lock:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO routes (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time() + ttl)
+                )
+                self._puts += 1
+                if self._puts % self.PURGE_EVERY == 0:
+                    self._connection.execute("DELETE FROM routes WHERE expires <= ?", (time.time(),))
+                self._connection.commit()
+        except sqlite3.Error as e:
+            print(f"Route cache backend error: {e}")
+
+
+def _shared_key(key, fingerprint):
+    return json.dumps([str(part) for part in key] + [fingerprint])
+
+
+def create_route_cache(config):
+    """
+    Build the route cache from the `route_cache` config section
+
+    Returns:
+        RouteCache, or None if caching is disabled
+    """
+    settings = config.get('route_cache', {})
+    if not settings.get('enabled', True):
+        return None
+    backend = None
+    if settings.get('backend', "memory") == "sqlite":
+        backend = SQLiteRouteBackend(settings.get('path', "cache/routes.sqlite"))
+    return RouteCache(
+        max_entries=settings.get('max_entries', DEFAULT_MAX_ENTRIES),
+        ttl=settings.get('ttl', DEFAULT_TTL),
+        backend=backend
+    )
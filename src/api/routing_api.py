@@ -0,0 +1,57 @@
+# src/api/routing_api.py
+from ..algorithms.dijkstra import dijkstra
+from ..algorithms.a_star import a_star
+from ..algorithms.contraction_hierarchies import HierarchyNotReady, contraction_hierarchies
+from ..algorithms.bidirectional import bidirectional_dijkstra, bidirectional_a_star
+from ..algorithms.time_dependent import td_dijkstra, td_a_star
+
+# Names accepted by find_path, the /api/route "algorithm" field and
+# routing.default_algorithm in config.yaml. "alt" is a_star with the
+# landmark heuristic.
+ALGORITHMS = ("dijkstra", "a_star", "alt", "ch",
+              "bidirectional_dijkstra", "bidirectional_a_star")
+
+def find_path(graph, start, end, algorithm="a_star", engine="objects",
+              heuristic="haversine", departure_time=None):
+    """
+    Find a route with the named algorithm
+    
+    Args:
+        graph: Graph representation with nodes and edges
+        start: Starting intersection ID
+        end: Destination intersection ID
+        algorithm: One of ALGORITHMS
+        engine: Search engine for dijkstra/a_star and their bidirectional
+            forms ("objects" or "csr")
+        heuristic: a_star/bidirectional_a_star heuristic ("haversine" or "alt")
+        departure_time: Route on the historical traffic profiles for this
+            departure (see time_dependent.departure_hours) instead of the
+            current traffic. The Dijkstra algorithms then run td_dijkstra,
+            all others td_a_star.
+    
+    Returns:
+        Route with the roads used (unpacks as (path, total_time)); its
+        path is None and total_time math.inf if no path exists
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown routing algorithm '{algorithm}'")
+    if departure_time is not None:
+        if algorithm in ("dijkstra", "bidirectional_dijkstra"):
+            return td_dijkstra(graph, start, end, departure_time)
+        return td_a_star(graph, start, end, departure_time)
+    if algorithm == "alt":
+        return a_star(graph, start, end, heuristic="alt")
+    if algorithm == "a_star":
+        return a_star(graph, start, end, engine=engine, heuristic=heuristic)
+    if algorithm == "dijkstra":
+        return dijkstra(graph, start, end, engine=engine)
+    if algorithm == "ch":
+        try:
+            return contraction_hierarchies(graph, start, end)
+        except HierarchyNotReady:
+            # Same optimal route, just slower, until the hierarchy is rebuilt
+            return bidirectional_dijkstra(graph, start, end, engine=engine)
+    if algorithm == "bidirectional_dijkstra":
+        return bidirectional_dijkstra(graph, start, end, engine=engine)
+    if algorithm == "bidirectional_a_star":
+        return bidirectional_a_star(graph, start, end, engine=engine, heuristic=heuristic)
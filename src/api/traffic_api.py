@@ -1,15 +1,112 @@
 # src/api/traffic_api.py
+import math
 import requests
+import threading
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = "https://api.tomtom.com/traffic/services/4/"
+DEFAULT_TILE_DEGREES = 0.1   # Tile edge; about 11 x 9 km at Tempe's latitude
+DEFAULT_WORKERS = 4          # Tiles fetched at once, and pooled connections
+DEFAULT_TIMEOUT = 10         # Seconds to wait for one tile's response
+DEFAULT_RETRIES = 2          # Extra attempts on connection errors, 429 and 5xx
+DEFAULT_DEADLINE = 30        # Seconds an update waits for all tiles
+
+def rush_hour_congestion(hour):
+    """
+    Typical traffic multiplier for an hour of the day (0-23)
+    
+    The daily pattern used by the simulated feed and by the default
+    time-dependent travel time profiles.
+    """
+    if 7 <= hour <= 9:  # Morning rush
+        return 2.0
+    if 16 <= hour <= 18:  # Evening rush
+        return 2.2
+    if 11 <= hour <= 13:  # Lunch time
+        return 1.5
+    if hour >= 22 or hour <= 5:  # Late night
+        return 0.8
+    return 1.0
+
+def split_bbox(bbox, tile_degrees=DEFAULT_TILE_DEGREES):
+    """
+    Split a bounding box into a grid of tiles no larger than tile_degrees
+
+    Args:
+        bbox: Tuple of (min_lat, min_lon, max_lat, max_lon)
+
+    Returns:
+        List of tile bounding boxes, row by row, covering bbox exactly
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+    # The tolerance keeps 0.2 / 0.1 = 2.0000000000000004 from making 3 tiles
+    rows = max(1, math.ceil((max_lat - min_lat) / tile_degrees - 1e-9))
+    columns = max(1, math.ceil((max_lon - min_lon) / tile_degrees - 1e-9))
+    lat_step = (max_lat - min_lat) / rows
+    lon_step = (max_lon - min_lon) / columns
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            tiles.append((
+                min_lat + row * lat_step,
+                min_lon + column * lon_step,
+                max_lat if row == rows - 1 else min_lat + (row + 1) * lat_step,
+                max_lon if column == columns - 1 else min_lon + (column + 1) * lon_step
+            ))
+    return tiles
+
 
 class TomTomTrafficAPI:
-    """Interface for fetching live traffic data from TomTom"""
+    """
+    Interface for fetching live traffic data from TomTom
+    
+    The area asked for is split into tiles (split_bbox) so no request
+    exceeds the provider's area limits, and the tiles are fetched in
+    parallel over one pooled requests.Session. Each request has its own
+    timeout and is retried on connection errors, 429 and 5xx responses;
+    tiles are sent with If-None-Match / If-Modified-Since when the server
+    gave an ETag or Last-Modified, and a 304 reuses the tile's last data.
+    
+    A tile that still fails, or is not back by the deadline, keeps its
+    last good data if it has any, so one slow tile cannot stall an update
+    or blank part of the map. Only when no tile has data at all does the
+    update fall back to simulated data.
+    """
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, base_url=DEFAULT_BASE_URL, tile_degrees=DEFAULT_TILE_DEGREES,
+                 max_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 deadline=DEFAULT_DEADLINE):
         self.api_key = api_key or os.environ.get("j3vxL9Ym1y775Q3qbGSDw6uxwD1K5VeZ")
-        self.base_url = "https://api.tomtom.com/traffic/services/4/"
+        self.base_url = base_url
+        self.tile_degrees = tile_degrees
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.deadline = deadline
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_workers,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+                raise_on_status=False
+            )
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = None
+        self._lock = threading.Lock()
+        # bbox string -> (ETag, Last-Modified, parsed data) of the last good response
+        self._tiles = {}
+        self.last_fetch = None  # Tile counts of the most recent update
         
     def get_traffic_flow(self, bbox):
         """
@@ -24,30 +121,87 @@ class TomTomTrafficAPI:
         if not self.api_key:
             print("Warning: No TomTom API key provided, using simulated data")
             return self._simulate_traffic_data()
-            
-        min_lat, min_lon, max_lat, max_lon = bbox
-        bbox_str = f"{min_lat},{min_lon},{max_lat},{max_lon}"
         
-        try:
-            url = f"{self.base_url}flowSegmentData/absolute/10/json"
-            response = requests.get(
-                url,
-                params={
-                    "bbox": bbox_str,
-                    "key": self.api_key
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return self._parse_tomtom_response(response.json())
+        start = time.time()
+        tiles = [",".join(f"{value:.6f}" for value in tile) for tile in split_bbox(bbox, self.tile_degrees)]
+        futures = {self._pool().submit(self._fetch_tile, tile): tile for tile in tiles}
+        done, _ = wait(futures, timeout=self.deadline)
+        
+        counts = {"tiles": len(tiles), "fetched": 0, "not_modified": 0, "stale": 0, "failed": 0}
+        traffic_data = {}
+        for future, tile in futures.items():
+            status = None
+            if future in done:
+                try:
+                    status = future.result()
+                except Exception as e:
+                    print(f"Error fetching traffic tile {tile}: {e}")
+            with self._lock:
+                cached = self._tiles.get(tile)
+            if status is None:
+                counts["stale" if cached else "failed"] += 1
             else:
-                print(f"API error: {response.status_code} - {response.text}")
-                return self._simulate_traffic_data()
-                
-        except Exception as e:
-            print(f"Error fetching traffic data: {e}")
+                counts[status] += 1
+            if cached:
+                traffic_data.update(cached[2])
+        
+        counts["seconds"] = round(time.time() - start, 3)
+        self.last_fetch = counts
+        print(f"Fetched {counts['fetched']} of {counts['tiles']} traffic tiles "
+              f"({counts['not_modified']} unchanged, {counts['stale']} stale, "
+              f"{counts['failed']} failed) in {counts['seconds']:.2f}s")
+        if counts["failed"] == len(tiles):
             return self._simulate_traffic_data()
+        return traffic_data
+    
+    def _pool(self):
+        """Worker threads for tile requests, started on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="traffic-tile")
+            return self._executor
+    
+    def _fetch_tile(self, tile):
+        """
+        Fetch one tile, conditionally if it was fetched before
+        
+        Returns:
+            "fetched" or "not_modified"; raises if the tile could not be fetched
+        """
+        with self._lock:
+            cached = self._tiles.get(tile)
+        headers = {}
+        if cached and cached[0]:
+            headers["If-None-Match"] = cached[0]
+        if cached and cached[1]:
+            headers["If-Modified-Since"] = cached[1]
+        
+        response = self.session.get(
+            f"{self.base_url}flowSegmentData/absolute/10/json",
+            params={
+                "bbox": tile,
+                "key": self.api_key
+            },
+            headers=headers,
+            timeout=self.timeout
+        )
+        if response.status_code == 304 and cached:
+            return "not_modified"
+        if response.status_code != 200:
+            raise RuntimeError(f"API error: {response.status_code} - {response.text[:200]}")
+        
+        data = self._parse_tomtom_response(response.json())
+        with self._lock:
+            self._tiles[tile] = (response.headers.get("ETag"), response.headers.get("Last-Modified"), data)
+        return "fetched"
+    
+    def close(self):
+        """Stop the worker threads and close pooled connections"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
     
     def _parse_tomtom_response(self, data):
         """Parse TomTom API response into traffic multipliers by road segment"""
@@ -85,19 +239,8 @@ class TomTomTrafficAPI:
         traffic_data = {}
         
         # Time-based patterns
-        hour = datetime.now().hour
+        base_congestion = rush_hour_congestion(datetime.now().hour)
         
-        # Simulate rush hour patterns
-        base_congestion = 1.0
-        if 7 <= hour <= 9:  # Morning rush
-            base_congestion = 2.0
-        elif 16 <= hour <= 18:  # Evening rush
-            base_congestion = 2.2
-        elif 11 <= hour <= 13:  # Lunch time
-            base_congestion = 1.5
-        elif 22 <= hour <= 5:  # Late night
-            base_congestion = 0.8
-            
         # Add randomness - roads array would be populated from the map
         for i in range(1000):  # Simulate for a large number of roads
             road_id = f"r{i}"
@@ -105,4 +248,23 @@ class TomTomTrafficAPI:
             multiplier = base_congestion * random.uniform(0.7, 1.4)
             traffic_data[road_id] = max(0.8, min(multiplier, 5.0))
             
-        return traffic_data
\ No newline at end of file
+        return traffic_data
+
+
+def create_traffic_api(config, api_key=None):
+    """
+    Build the traffic feed client from the `traffic` config section
+    
+    Returns:
+        TomTomTrafficAPI
+    """
+    settings = config.get('traffic', {})
+    return TomTomTrafficAPI(
+        api_key,
+        base_url=settings.get('base_url', DEFAULT_BASE_URL),
+        tile_degrees=settings.get('tile_degrees', DEFAULT_TILE_DEGREES),
+        max_workers=settings.get('fetch_workers', DEFAULT_WORKERS),
+        timeout=settings.get('request_timeout', DEFAULT_TIMEOUT),
+        retries=settings.get('request_retries', DEFAULT_RETRIES),
+        deadline=settings.get('fetch_deadline', DEFAULT_DEADLINE)
+    )
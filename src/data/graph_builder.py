@@ -0,0 +1,312 @@
+import hashlib
+import sys
+import time
+
+import numpy as np
+
+
+class TrafficSnapshot:
+    """
+    One immutable set of per-edge traffic multipliers and travel times
+
+    CompiledGraph.set_traffic() builds the next snapshot off to the side
+    and swaps it in with a single reference assignment. A search reads
+    `compiled.traffic_snapshot` once and uses only that object, so it sees
+    one consistent set of weights for its whole run, without locks, however
+    many updates land meanwhile. The arrays are read-only; versions
+    increase by one per swap.
+    """
+
+    def __init__(self, traffic, weights, version=0):
+        traffic.setflags(write=False)
+        weights.setflags(write=False)
+        self.traffic = traffic
+        self.weights = weights
+        self.version = version
+        self.created = time.time()
+        self._fingerprint = None
+        self._weight_list = None
+        self._reverse_weight_list = None
+
+    @property
+    def fingerprint(self):
+        """Hash of the multipliers, equal across processes for equal traffic"""
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.blake2b(self.traffic.tobytes(), digest_size=8).hexdigest()
+        return self._fingerprint
+
+    def weight_list(self):
+        """Plain-list copy of the weights, for search loops"""
+        # Lazily built; two threads racing here just build equal lists
+        if self._weight_list is None:
+            self._weight_list = self.weights.tolist()
+        return self._weight_list
+
+    def reverse_weight_list(self, order):
+        """Plain-list copy of the weights in incoming-edge (reverse_order) order"""
+        if self._reverse_weight_list is None:
+            self._reverse_weight_list = self.weights[order].tolist()
+        return self._reverse_weight_list
+
+
+class CompiledGraph:
+    """
+    Compressed-sparse-row (CSR) view of a road network.
+
+    Nodes are renumbered to dense integer indices 0..n-1. The outgoing edges
+    of node i are stored at positions offsets[i]:offsets[i+1] of the edge
+    arrays, which keeps the whole network in a handful of flat NumPy arrays
+    instead of one Python object per intersection and road.
+    """
+
+    def __init__(self, node_ids, lats, lons, offsets, targets, lengths,
+                 speeds, edge_ids, traffic=None):
+        self.node_ids = list(node_ids)      # index -> original (OSM) node id
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.lengths = np.asarray(lengths, dtype=np.float64)  # in meters
+        self.speeds = np.asarray(speeds, dtype=np.float32)    # in km/h
+        self.edge_ids = list(edge_ids)      # edge index -> Road id
+
+        if traffic is None:
+            traffic = np.ones(len(self.targets), dtype=np.float64)
+        traffic = np.array(traffic, dtype=np.float64)
+        self.traffic_snapshot = TrafficSnapshot(traffic, self._compute_weights(traffic))
+        self._adjacency = None
+        self._reverse_order = None
+        self._reverse_adjacency = None
+        self._coordinates = None
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def traffic(self):
+        """Traffic multipliers of the current snapshot"""
+        return self.traffic_snapshot.traffic
+
+    @property
+    def weights(self):
+        """Travel times of the current snapshot (pin traffic_snapshot for a whole search)"""
+        return self.traffic_snapshot.weights
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def index_of(self, node_id):
+        """Dense index of an original node id"""
+        return self.node_index[node_id]
+
+    def sources(self):
+        """Source node index of every edge, in edge order"""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32),
+                         np.diff(self.offsets))
+
+    def source_of(self, edge):
+        """Source node index of a single edge"""
+        return int(np.searchsorted(self.offsets, edge, side='right')) - 1
+
+    def _compute_weights(self, traffic):
+        """Travel time in hours per edge, matching Road.travel_time()"""
+        return (self.lengths / 1000) / (self.speeds.astype(np.float64) / traffic)
+
+    def refresh_traffic(self, roads):
+        """
+        Re-read traffic multipliers from Road objects
+
+        Args:
+            roads: Mapping of road id -> Road (e.g. MapData.roads)
+        """
+        traffic = np.fromiter(
+            (roads[road_id].current_traffic for road_id in self.edge_ids),
+            dtype=np.float64,
+            count=self.num_edges
+        )
+        self.set_traffic(traffic)
+
+    def set_traffic(self, traffic):
+        """
+        Swap in a new traffic snapshot
+
+        Args:
+            traffic: Per-edge traffic multipliers (copied)
+
+        Returns:
+            The new TrafficSnapshot
+        """
+        traffic = np.array(traffic, dtype=np.float64)
+        snapshot = TrafficSnapshot(traffic, self._compute_weights(traffic),
+                                   version=self.traffic_snapshot.version + 1)
+        # Searches that already pinned the old snapshot keep using it
+        self.traffic_snapshot = snapshot
+        return snapshot
+
+    def patch_traffic(self, edges, values):
+        """
+        Swap in a snapshot differing from the current one on a few edges
+
+        Only the given edges are re-weighted, and the plain-list weights of
+        the current snapshot, if built, are carried over with just those
+        entries replaced, so a small update costs a copy rather than a
+        recomputation of every edge.
+
+        Args:
+            edges: Edge indices to change
+            values: Their new traffic multipliers
+
+        Returns:
+            The new TrafficSnapshot
+        """
+        edges = np.asarray(edges, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        previous = self.traffic_snapshot
+        traffic = previous.traffic.copy()
+        weights = previous.weights.copy()
+        traffic[edges] = values
+        weights[edges] = (self.lengths[edges] / 1000) / (self.speeds[edges].astype(np.float64) / values)
+        snapshot = TrafficSnapshot(traffic, weights, version=previous.version + 1)
+        weight_list = previous._weight_list
+        if weight_list is not None:
+            weight_list = list(weight_list)
+            for edge, weight in zip(edges.tolist(), weights[edges].tolist()):
+                weight_list[edge] = weight
+            snapshot._weight_list = weight_list
+        self.traffic_snapshot = snapshot
+        return snapshot
+
+    def adjacency(self, snapshot=None):
+        """
+        Plain-list copies of (offsets, targets, weights) for search loops.
+
+        Indexing Python lists is several times faster than indexing NumPy
+        arrays element by element, so the search kernels use these. The
+        weights come from `snapshot` (default: the current one) and are
+        built once per snapshot.
+        """
+        if snapshot is None:
+            snapshot = self.traffic_snapshot
+        if self._adjacency is None:
+            self._adjacency = (self.offsets.tolist(), self.targets.tolist())
+        offsets, targets = self._adjacency
+        return offsets, targets, snapshot.weight_list()
+
+    def reverse_order(self):
+        """Edge indices sorted by target node, i.e. the incoming-edge CSR order"""
+        if self._reverse_order is None:
+            self._reverse_order = np.argsort(self.targets, kind='stable').astype(np.int32)
+        return self._reverse_order
+
+    def reverse_adjacency(self, snapshot=None):
+        """
+        Plain-list (offsets, sources, weights) of incoming edges per node
+
+        Position p of the lists corresponds to edge reverse_order()[p].
+        """
+        if snapshot is None:
+            snapshot = self.traffic_snapshot
+        order = self.reverse_order()
+        if self._reverse_adjacency is None:
+            offsets = np.searchsorted(self.targets[order],
+                                      np.arange(self.num_nodes + 1))
+            self._reverse_adjacency = (offsets.tolist(), self.sources()[order].tolist())
+        offsets, sources = self._reverse_adjacency
+        return offsets, sources, snapshot.reverse_weight_list(order)
+
+    def coordinates(self):
+        """Plain-list copies of (lats, lons) for search heuristics"""
+        if self._coordinates is None:
+            self._coordinates = (self.lats.tolist(), self.lons.tolist())
+        return self._coordinates
+
+    def memory_usage(self):
+        """
+        Approximate size in bytes of the numeric arrays and of the
+        plain-list copies built so far for search loops
+
+        The lists hold one Python int or float object per entry, so once
+        built they outweigh the arrays several times over (see
+        list_memory_usage). Only the current snapshot's weight lists are
+        counted; older snapshots are freed once no search holds them.
+        """
+        arrays = (self.lats, self.lons, self.offsets, self.targets,
+                  self.lengths, self.speeds, self.traffic, self.weights)
+        return sum(array.nbytes for array in arrays) + self.list_memory_usage()
+
+    def list_memory_usage(self):
+        """Approximate size in bytes of the plain-list caches alone"""
+        snapshot = self.traffic_snapshot
+        lists = [snapshot._weight_list, snapshot._reverse_weight_list]
+        for cached in (self._adjacency, self._reverse_adjacency, self._coordinates):
+            if cached is not None:
+                lists.extend(cached)
+        return sum(_list_size(values) for values in lists if values is not None)
+
+
+def _list_size(values):
+    """Bytes of a list and its (distinct, as from tolist()) element objects"""
+    if not values:
+        return sys.getsizeof(values)
+    return sys.getsizeof(values) + len(values) * sys.getsizeof(values[-1])
+
+
+def build_compiled_graph(graph):
+    """
+    Compile a graph with `intersections` and `roads` (e.g. MapData) into CSR form
+
+    Args:
+        graph: Graph representation with nodes and edges
+
+    Returns:
+        CompiledGraph
+    """
+    node_ids = list(graph.intersections.keys())
+    node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    lats = np.fromiter((graph.intersections[n].lat for n in node_ids),
+                       dtype=np.float64, count=len(node_ids))
+    lons = np.fromiter((graph.intersections[n].lon for n in node_ids),
+                       dtype=np.float64, count=len(node_ids))
+
+    # Walk each intersection's connections so edge order within a node
+    # matches the order the object-based searches relax them in
+    offsets = np.zeros(len(node_ids) + 1, dtype=np.int32)
+    targets = []
+    lengths = []
+    speeds = []
+    traffic = []
+    edge_ids = []
+    for i, node_id in enumerate(node_ids):
+        for road in graph.intersections[node_id].connections:
+            targets.append(node_index[road.end.id])
+            lengths.append(road.length)
+            speeds.append(road.speed_limit)
+            traffic.append(road.current_traffic)
+            edge_ids.append(road.id)
+        offsets[i + 1] = len(targets)
+
+    return CompiledGraph(
+        node_ids=node_ids,
+        lats=lats,
+        lons=lons,
+        offsets=offsets,
+        targets=targets,
+        lengths=lengths,
+        speeds=speeds,
+        edge_ids=edge_ids,
+        traffic=traffic
+    )
+
+
+def get_compiled_graph(graph):
+    """Return the graph's compiled CSR form, building and caching it on first use"""
+    compiled = getattr(graph, 'compiled_graph', None)
+    if compiled is None:
+        compiled = build_compiled_graph(graph)
+        graph.compiled_graph = compiled
+    return compiled
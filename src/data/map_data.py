@@ -1,68 +1,82 @@
+import time
 import osmnx as ox
 import networkx as nx
 from ..models.intersection import Intersection
 from ..models.road import Road
+from .graph_builder import build_compiled_graph
+from ..utils.spatial_index import SpatialIndex
+from .node_names import NodeNames
+from .street_index import StreetIndex
+from .snapshot import DEFAULT_CACHE_DIR, GraphSnapshot, load_snapshot, snapshot_path
 
 class MapData:
-    def __init__(self, city="Tempe, AZ"):
+    def __init__(self, city="Tempe, AZ", network_type="drive", cache_dir=DEFAULT_CACHE_DIR):
         self.city = city
+        self.network_type = network_type
+        self.cache_dir = cache_dir  # Where graph snapshots are read and written
         self.graph = None
         self.intersections = {}  # id -> Intersection
         self.roads = {}          # id -> Road
+        self.snapshot = None     # GraphSnapshot the network was loaded from
+        self.compiled_graph = None  # CSR form of the network for fast searches
+        self.reverse_index = None  # Roads arriving at each intersection, built on first backward search
+        self.spatial_index = None  # Grid over intersections for nearest/radius lookups
+        self.node_names = None     # Street names per intersection, for descriptions
+        self.street_index = None   # Street names to intersections, for local geocoding
+        self.street_search = None  # Autocomplete over street names, built on first use
     
     def load_map(self):
-        """Load road network from OSM for the specified city"""
+        """
+        Load road network for the specified city
+        
+        Uses the binary snapshot in cache_dir when there is one, and only
+        downloads from OSM (then writes the snapshot) when there isn't.
+        """
+        start = time.time()
+        snapshot = load_snapshot(self.city, self.network_type, self.cache_dir)
+        if snapshot is not None:
+            snapshot.populate(self)
+            self._build_lookups()
+            print(f"Loaded {len(self.intersections)} intersections and {len(self.roads)} roads "
+                  f"from snapshot in {time.time() - start:.2f}s.")
+            return
+        
         try:
-            G = ox.graph_from_place(self.city, network_type='drive')
+            G = ox.graph_from_place(self.city, network_type=self.network_type)
             self.graph = G
-            
-            # Process nodes (intersections)
-            for node_id, data in G.nodes(data=True):
-                intersection = Intersection(
-                    id=node_id,
-                    lat=data['y'],
-                    lon=data['x']
-                )
-                self.intersections[node_id] = intersection
-            
-            # Process edges (roads)
-            for u, v, key, data in G.edges(data=True, keys=True):
-                road_id = f"{u}_{v}_{key}"
-                
-                # Get length or calculate it
-                if 'length' in data:
-                    length = data['length']
-                else:
-                    length = ox.distance.great_circle(
-                        G.nodes[u]['y'],
-                        G.nodes[u]['x'],
-                        G.nodes[v]['y'],
-                        G.nodes[v]['x']
-                    )
-                
-                # Get speed limit or use default
-                if 'speed_kph' in data:
-                    speed = data['speed_kph']
-                else:
-                    speed = 50  # Default 50 km/h
-                
-                road = Road(
-                    id=road_id,
-                    start_intersection=self.intersections[u],
-                    end_intersection=self.intersections[v],
-                    length=length,
-                    speed_limit=speed,
-                    name=data.get('name', None)
-                )
-                
-                self.roads[road_id] = road
-                self.intersections[u].add_connection(road)
+            snapshot = GraphSnapshot.from_networkx(G, self.city, self.network_type)
+            try:
+                snapshot.save(snapshot_path(self.city, self.network_type, self.cache_dir))
+            except OSError as e:
+                print(f"Could not write graph snapshot: {e}")
+            snapshot.populate(self)
                 
             print(f"Successfully loaded {len(self.intersections)} intersections and {len(self.roads)} roads.")
         except Exception as e:
             print(f"Error loading map data: {e}")
             # Create a simple test graph for demonstration
             self._create_test_graph()
+            self.compile_graph()
+        
+        self._build_lookups()
+    
+    def _build_lookups(self):
+        """Build the indexes request handlers query, once per map load"""
+        self.spatial_index = SpatialIndex.from_graph(self)
+        self.node_names = NodeNames.build(self)
+        self.street_index = StreetIndex.build(self.node_names)
+    
+    def describe(self, node_id):
+        """Human-readable description of an intersection, from its street names"""
+        if self.node_names is None:
+            self.node_names = NodeNames.build(self)
+        return self.node_names.describe(node_id)
+    
+    def compile_graph(self):
+        """Build the array-backed CSR graph used by the "csr" search engine"""
+        self.compiled_graph = build_compiled_graph(self)
+        self.reverse_index = None
+        return self.compiled_graph
     
     def _create_test_graph(self):
         """Create a simple test graph for demonstration"""
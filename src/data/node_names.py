@@ -0,0 +1,89 @@
+import numpy as np
+
+from .graph_builder import get_compiled_graph
+
+
+class NodeNames:
+    """
+    Street names of every intersection, for human-readable descriptions
+
+    Each distinct street name is stored once in `names`, sorted
+    alphabetically so that sorting name ids also sorts the names. The
+    streets leaving node i are name ids offsets[i]:offsets[i+1] of `refs`,
+    already sorted, so describing a node is two lookups and a format.
+    """
+
+    def __init__(self, node_ids, names, offsets, refs, lats, lons):
+        self.node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        self.names = list(names)
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.refs = np.asarray(refs, dtype=np.int32)
+        self.lats = lats
+        self.lons = lons
+
+    @classmethod
+    def build(cls, graph):
+        """
+        Collect the names of the roads leaving each intersection
+
+        Args:
+            graph: Graph with `intersections` whose connections are Roads
+
+        Returns:
+            NodeNames
+        """
+        compiled = get_compiled_graph(graph)
+        node_names = []
+        unique = set()
+        for node_id in compiled.node_ids:
+            names = set()
+            for road in graph.intersections[node_id].connections:
+                if road.name:
+                    # Handle if road.name is a list
+                    if isinstance(road.name, list):
+                        names.update(name for name in road.name if name)
+                    else:
+                        names.add(road.name)
+            node_names.append(names)
+            unique |= names
+
+        table = sorted(unique)
+        name_id = {name: i for i, name in enumerate(table)}
+        offsets = [0]
+        refs = []
+        for names in node_names:
+            refs.extend(sorted(name_id[name] for name in names))
+            offsets.append(len(refs))
+
+        return cls(compiled.node_ids, table, offsets, refs,
+                   compiled.lats.tolist(), compiled.lons.tolist())
+
+    def street_names(self, node_id):
+        """Sorted names of the streets leaving an intersection"""
+        i = self.node_index[node_id]
+        return [self.names[ref] for ref in self.refs[self.offsets[i]:self.offsets[i + 1]].tolist()]
+
+    def describe(self, node_id):
+        """
+        Describe an intersection by its streets
+
+        Returns:
+            "Intersection of A and B", "Intersection of A and B (+ n more)",
+            a single street name, or the coordinates of an unnamed one
+        """
+        i = self.node_index[node_id]
+        start = int(self.offsets[i])
+        count = int(self.offsets[i + 1]) - start
+
+        if count == 0:
+            return f"Unnamed intersection at {self.lats[i]:.6f}, {self.lons[i]:.6f}"
+        first = self.names[self.refs[start]]
+        if count == 1:
+            return first
+        second = self.names[self.refs[start + 1]]
+        if count == 2:
+            return f"Intersection of {first} and {second}"
+        return f"Intersection of {first} and {second} (+ {count - 2} more)"
+
+    def memory_usage(self):
+        return self.offsets.nbytes + self.refs.nbytes + sum(len(name) for name in self.names)
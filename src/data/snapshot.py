@@ -0,0 +1,384 @@
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import time
+
+import numpy as np
+import osmnx as ox
+
+from ..models.intersection import Intersection
+from ..models.road import Road
+from .graph_builder import CompiledGraph
+
+# Bump whenever the layout of the arrays or header changes; snapshots with
+# another version are ignored and rebuilt
+SNAPSHOT_VERSION = 1
+MAGIC = b"GSNAP\x00\x00\x00"
+DEFAULT_CACHE_DIR = "cache"
+# Array data starts on multiples of this, so every array can be viewed in place
+ALIGNMENT = 64
+
+
+class GraphSnapshot:
+    """
+    Road network stored as flat arrays in a single memory-mappable file
+
+    File layout: an 8 byte magic, a uint32 format version, a uint64 header
+    length, a JSON header (city, network type, creation time and the dtype,
+    shape and byte offset of every array), then the arrays themselves.
+    Loading maps the file and views each array in place, so nothing is
+    parsed or copied until it is used.
+
+    Edges are stored sorted by source node, in the order OSMnx returned them,
+    which is exactly the CSR order build_compiled_graph would produce. The
+    compiled graph is therefore built straight from these arrays.
+
+    Arrays:
+        node_ids, lats, lons: one entry per node
+        offsets: CSR offsets, outgoing edges of node i at offsets[i]:offsets[i+1]
+        targets, keys, lengths, speeds, name_index: one entry per edge
+            (keys are the OSM multi-edge keys, name_index -1 means unnamed)
+        names_offsets, names_blob: table of JSON-encoded street names
+        geometry_offsets, geometry: (lat, lon) points of each edge's shape,
+            empty for straight edges
+    """
+
+    def __init__(self, city, network_type, arrays, created=None):
+        self.city = city
+        self.network_type = network_type
+        self.created = created if created is not None else time.time()
+        self.arrays = arrays
+        self._names = None
+
+    @property
+    def num_nodes(self):
+        return len(self.arrays['node_ids'])
+
+    @property
+    def num_edges(self):
+        return len(self.arrays['targets'])
+
+    @classmethod
+    def from_networkx(cls, G, city, network_type):
+        """
+        Flatten an OSMnx MultiDiGraph
+
+        Args:
+            G: Graph returned by ox.graph_from_place
+            city: Place name the graph was downloaded for
+            network_type: OSMnx network type ("drive", "walk", ...)
+
+        Returns:
+            GraphSnapshot
+        """
+        node_ids = list(G.nodes)
+        node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        lats = np.array([G.nodes[n]['y'] for n in node_ids], dtype=np.float64)
+        lons = np.array([G.nodes[n]['x'] for n in node_ids], dtype=np.float64)
+
+        outgoing = [[] for _ in node_ids]
+        for u, v, key, data in G.edges(data=True, keys=True):
+            outgoing[node_index[u]].append((v, key, data))
+
+        offsets = np.zeros(len(node_ids) + 1, dtype=np.int32)
+        targets = []
+        keys = []
+        lengths = []
+        speeds = []
+        name_index = []
+        geometry_offsets = [0]
+        geometry = []
+        names = {}
+        for i, edges in enumerate(outgoing):
+            u = node_ids[i]
+            for v, key, data in edges:
+                targets.append(node_index[v])
+                keys.append(key)
+
+                # Get length or calculate it
+                if 'length' in data:
+                    lengths.append(data['length'])
+                else:
+                    lengths.append(ox.distance.great_circle(
+                        G.nodes[u]['y'], G.nodes[u]['x'],
+                        G.nodes[v]['y'], G.nodes[v]['x']
+                    ))
+                # Get speed limit or use default
+                speeds.append(data.get('speed_kph', 50))
+
+                name = data.get('name', None)
+                if name is None:
+                    name_index.append(-1)
+                else:
+                    # OSM names may be a list for merged ways; JSON keeps the type
+                    encoded = json.dumps(name)
+                    name_index.append(names.setdefault(encoded, len(names)))
+
+                if 'geometry' in data:
+                    geometry.extend((lat, lon) for lon, lat in data['geometry'].coords)
+                geometry_offsets.append(len(geometry))
+            offsets[i + 1] = len(targets)
+
+        names_blob = "".join(names).encode("utf-8")
+        names_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(name.encode("utf-8")) for name in names], out=names_offsets[1:])
+
+        arrays = {
+            'node_ids': np.array(node_ids, dtype=np.int64),
+            'lats': lats,
+            'lons': lons,
+            'offsets': offsets,
+            'targets': np.array(targets, dtype=np.int32),
+            'keys': np.array(keys, dtype=np.int32),
+            'lengths': np.array(lengths, dtype=np.float64),
+            'speeds': np.array(speeds, dtype=np.float32),
+            'name_index': np.array(name_index, dtype=np.int32),
+            'names_offsets': names_offsets,
+            'names_blob': np.frombuffer(names_blob, dtype=np.uint8),
+            'geometry_offsets': np.array(geometry_offsets, dtype=np.int64),
+            'geometry': np.array(geometry, dtype=np.float64).reshape(-1, 2)
+        }
+        return cls(city, network_type, arrays)
+
+    def save(self, path):
+        """
+        Write the snapshot to path
+
+        The file is written next to its destination and renamed over it,
+        so processes that have the old snapshot mapped keep a valid view.
+        """
+        layout = {}
+        offset = 0
+        for name, array in self.arrays.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            layout[name] = {
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'offset': offset
+            }
+            offset += array.nbytes
+
+        header = json.dumps({
+            'version': SNAPSHOT_VERSION,
+            'city': self.city,
+            'network_type': self.network_type,
+            'created': self.created,
+            'arrays': layout
+        }).encode("utf-8")
+        preamble = MAGIC + struct.pack("<IQ", SNAPSHOT_VERSION, len(header)) + header
+        data_start = -(-len(preamble) // ALIGNMENT) * ALIGNMENT
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(preamble)
+            for name, array in self.arrays.items():
+                file.seek(data_start + layout[name]['offset'])
+                file.write(np.ascontiguousarray(array).tobytes())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Map a snapshot file
+
+        Returns:
+            GraphSnapshot with read-only arrays backed by the file
+
+        Raises:
+            ValueError: If the file is not a snapshot of SNAPSHOT_VERSION
+        """
+        with open(path, 'rb') as file:
+            preamble = file.read(len(MAGIC) + 12)
+            if len(preamble) < len(MAGIC) + 12 or preamble[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a graph snapshot")
+            version, header_length = struct.unpack("<IQ", preamble[len(MAGIC):])
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Snapshot {path} has version {version}, expected {SNAPSHOT_VERSION}")
+            header = json.loads(file.read(header_length).decode("utf-8"))
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        data_start = -(-(len(preamble) + header_length) // ALIGNMENT) * ALIGNMENT
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            shape = tuple(spec['shape'])
+            count = int(np.prod(shape)) if shape else 1
+            if count == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                         offset=data_start + spec['offset']).reshape(shape)
+        return cls(header['city'], header['network_type'], arrays, created=header['created'])
+
+    def names(self):
+        """Decoded street name table"""
+        if self._names is None:
+            raw = self.arrays['names_blob'].tobytes()
+            offsets = self.arrays['names_offsets'].tolist()
+            self._names = [json.loads(raw[begin:end].decode("utf-8"))
+                           for begin, end in zip(offsets, offsets[1:])]
+        return self._names
+
+    def road_ids(self):
+        """Road id of every edge, "{u}_{v}_{key}" as MapData has always named them"""
+        node_ids = self.arrays['node_ids'].tolist()
+        offsets = self.arrays['offsets']
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(offsets)).tolist()
+        return [f"{node_ids[u]}_{node_ids[v]}_{key}" for u, v, key in
+                zip(sources, self.arrays['targets'].tolist(), self.arrays['keys'].tolist())]
+
+    def edge_geometry(self, edge):
+        """
+        Shape of an edge as a list of (lat, lon) points
+
+        Straight edges without stored geometry return their two endpoints.
+        """
+        start, end = self.arrays['geometry_offsets'][edge:edge + 2]
+        if end > start:
+            return [tuple(point) for point in self.arrays['geometry'][start:end].tolist()]
+        source = int(np.searchsorted(self.arrays['offsets'], edge, side='right')) - 1
+        target = int(self.arrays['targets'][edge])
+        lats, lons = self.arrays['lats'], self.arrays['lons']
+        return [(float(lats[source]), float(lons[source])),
+                (float(lats[target]), float(lons[target]))]
+
+    def populate(self, map_data):
+        """
+        Fill a MapData with Intersection/Road objects and its compiled graph
+
+        Args:
+            map_data: MapData to load into; existing contents are replaced
+        """
+        node_ids = self.arrays['node_ids'].tolist()
+        lats = self.arrays['lats'].tolist()
+        lons = self.arrays['lons'].tolist()
+        offsets = self.arrays['offsets'].tolist()
+        targets = self.arrays['targets'].tolist()
+        lengths = self.arrays['lengths'].tolist()
+        speeds = self.arrays['speeds'].tolist()
+        name_index = self.arrays['name_index'].tolist()
+        names = self.names()
+        road_ids = self.road_ids()
+
+        intersections = {}
+        nodes = []
+        for node_id, lat, lon in zip(node_ids, lats, lons):
+            intersection = Intersection(id=node_id, lat=lat, lon=lon)
+            intersections[node_id] = intersection
+            nodes.append(intersection)
+
+        roads = {}
+        for u, start in enumerate(nodes):
+            for edge in range(offsets[u], offsets[u + 1]):
+                name = name_index[edge]
+                road = Road(
+                    id=road_ids[edge],
+                    start_intersection=start,
+                    end_intersection=nodes[targets[edge]],
+                    length=lengths[edge],
+                    speed_limit=speeds[edge],
+                    name=names[name] if name >= 0 else None
+                )
+                roads[road.id] = road
+                start.connections.append(road)
+
+        map_data.intersections = intersections
+        map_data.roads = roads
+        map_data.snapshot = self
+        map_data.reverse_index = None
+        map_data.compiled_graph = CompiledGraph(
+            node_ids=node_ids,
+            lats=self.arrays['lats'],
+            lons=self.arrays['lons'],
+            offsets=self.arrays['offsets'],
+            targets=self.arrays['targets'],
+            lengths=self.arrays['lengths'],
+            speeds=self.arrays['speeds'],
+            edge_ids=road_ids
+        )
+
+
+def snapshot_path(city, network_type, cache_dir=DEFAULT_CACHE_DIR):
+    """File a city's snapshot is stored in, e.g. cache/tempe-az.drive.graph"""
+    slug = re.sub(r'[^a-z0-9]+', '-', city.lower()).strip('-')
+    return os.path.join(cache_dir, f"{slug}.{network_type}.graph")
+
+
+def load_snapshot(city, network_type, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load a city's snapshot if a valid one exists
+
+    Returns:
+        GraphSnapshot, or None if it is missing, outdated or for another place
+    """
+    path = snapshot_path(city, network_type, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = GraphSnapshot.load(path)
+    except (ValueError, OSError) as e:
+        print(f"Ignoring graph snapshot: {e}")
+        return None
+    if snapshot.city != city or snapshot.network_type != network_type:
+        return None
+    return snapshot
+
+
+def build_snapshot(city, network_type, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Download a city's road network with OSMnx and write its snapshot
+
+    Returns:
+        Tuple of (GraphSnapshot, path)
+    """
+    G = ox.graph_from_place(city, network_type=network_type)
+    snapshot = GraphSnapshot.from_networkx(G, city, network_type)
+    path = snapshot_path(city, network_type, cache_dir)
+    snapshot.save(path)
+    return snapshot, path
+
+
+def main(argv=None):
+    """Command line interface: build, refresh or inspect snapshots"""
+    parser = argparse.ArgumentParser(
+        prog="python -m src.data.snapshot",
+        description="Build and refresh road network snapshots"
+    )
+    parser.add_argument("command", choices=["build", "refresh", "info"],
+                        help="build: create if missing, refresh: always re-download, "
+                             "info: describe an existing snapshot")
+    parser.add_argument("--city", default="Tempe, AZ")
+    parser.add_argument("--network-type", default="drive")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    path = snapshot_path(args.city, args.network_type, args.cache_dir)
+    existing = load_snapshot(args.city, args.network_type, args.cache_dir)
+
+    if args.command == "info":
+        if existing is None:
+            print(f"No valid snapshot at {path}")
+            return 1
+        print(f"{path}: {existing.city} ({existing.network_type}), "
+              f"{existing.num_nodes} nodes, {existing.num_edges} edges, "
+              f"built {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(existing.created))}")
+        return 0
+
+    if args.command == "build" and existing is not None:
+        print(f"Snapshot {path} is up to date; use 'refresh' to re-download")
+        return 0
+
+    start = time.time()
+    snapshot, path = build_snapshot(args.city, args.network_type, args.cache_dir)
+    print(f"Wrote {path}: {snapshot.num_nodes} nodes, {snapshot.num_edges} edges "
+          f"in {time.time() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,242 @@
+from itertools import combinations
+
+import numpy as np
+
+from .node_names import NodeNames
+from ..utils.geocode_cache import normalize_address
+from ..utils.geospatial import haversine_distances
+
+# Leading and trailing words a query may leave out ("Mill" for "S Mill Ave")
+DIRECTIONS = {"n", "s", "e", "w", "ne", "nw", "se", "sw"}
+STREET_TYPES = {
+    "st", "ave", "dr", "rd", "blvd", "ln", "pkwy", "pl", "ct", "hwy", "fwy",
+    "cir", "ter", "way", "loop", "trl"
+}
+# Words that may follow the city in a query ("..., Tempe, AZ, USA")
+COUNTRY_WORDS = {"usa", "us", "united", "states", "of", "america"}
+# Matched nodes closer than this to their centre are one intersection
+CLUSTER_KM = 0.15
+
+
+def street_keys(name):
+    """
+    Lookup keys of a normalized street name, most specific first
+
+    "s mill ave" gives ["s mill ave", "mill ave", "s mill", "mill"]; a key
+    is never emptied down to nothing but a direction or street type.
+    """
+    words = name.split()
+    keys = [words]
+    if len(words) > 1 and words[0] in DIRECTIONS:
+        keys.append(words[1:])
+    for key in list(keys):
+        if len(key) > 1 and key[-1] in STREET_TYPES:
+            keys.append(key[:-1])
+    return [" ".join(key) for key in keys]
+
+
+class StreetIndex:
+    """
+    Inverted index from street names to the intersections on them
+
+    Names are normalized with normalize_address, so "Mill Avenue" and
+    "mill ave" are one street. `pairs` maps every pair of streets that
+    meet, as sorted street ids, to the nodes where they do, so an
+    intersection query is a normalization and a few dict lookups.
+
+    A query key can name several streets ("mill ave" is both "n mill ave"
+    and "s mill ave"); `keys` maps each key to the streets it names,
+    keeping only the most specific match (an exact name beats one found
+    by dropping the direction, which beats one found by dropping the
+    street type).
+    """
+
+    def __init__(self, streets, street_nodes, pairs, node_ids, lats, lons, labels=None):
+        self.streets = list(streets)
+        # Name to show for each street, as the map spells it
+        self.labels = list(labels) if labels is not None else list(self.streets)
+        self.street_nodes = street_nodes   # street id -> array of node indices
+        self.pairs = pairs                 # (street id, street id) -> array of node indices
+        self.node_ids = list(node_ids)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+
+        ranked = {}
+        for street, name in enumerate(self.streets):
+            for rank, key in enumerate(street_keys(name)):
+                best = ranked.get(key)
+                if best is None or rank < best[0]:
+                    ranked[key] = (rank, {street})
+                elif rank == best[0]:
+                    best[1].add(street)
+        self.keys = {key: sorted(streets) for key, (_, streets) in ranked.items()}
+        # Places by pair of streets and by tuple of street ids, filled on first use
+        self._pair_places = {}
+        self._street_places = {}
+
+    @classmethod
+    def build(cls, node_names):
+        """
+        Index the street names of every intersection
+
+        Args:
+            node_names: NodeNames of the map
+
+        Returns:
+            StreetIndex
+        """
+        normalized = [normalize_address(name) for name in node_names.names]
+        streets = sorted(set(name for name in normalized if name))
+        street_id = {name: i for i, name in enumerate(streets)}
+        canonical = [street_id.get(name, -1) for name in normalized]
+        labels = [None] * len(streets)
+        for name, street in zip(node_names.names, canonical):
+            if street >= 0 and labels[street] is None:
+                labels[street] = name
+
+        node_ids = [None] * len(node_names.node_index)
+        for node_id, i in node_names.node_index.items():
+            node_ids[i] = node_id
+
+        on_street = [[] for _ in streets]
+        pairs = {}
+        offsets = node_names.offsets.tolist()
+        refs = node_names.refs.tolist()
+        for i in range(len(node_ids)):
+            ids = sorted(set(canonical[ref] for ref in refs[offsets[i]:offsets[i + 1]]) - {-1})
+            for street in ids:
+                on_street[street].append(i)
+            for pair in combinations(ids, 2):
+                pairs.setdefault(pair, []).append(i)
+
+        street_nodes = [np.asarray(nodes, dtype=np.int32) for nodes in on_street]
+        pairs = {pair: np.asarray(nodes, dtype=np.int32) for pair, nodes in pairs.items()}
+        return cls(streets, street_nodes, pairs, node_ids, node_names.lats, node_names.lons, labels)
+
+    def __len__(self):
+        return len(self.streets)
+
+    def find_streets(self, name):
+        """Ids of the streets a name refers to, most specific match only"""
+        return self.keys.get(normalize_address(name), [])
+
+    def intersection_nodes(self, first, second):
+        """
+        Intersections where two named streets meet
+
+        Returns:
+            List of intersection IDs, empty if the streets are unknown or
+            never meet
+        """
+        found = self._meeting(self.find_streets(first), self.find_streets(second))
+        if not found:
+            return []
+        nodes = np.unique(np.concatenate([self.pairs[pair] for pair in found]))
+        return [self.node_ids[i] for i in nodes.tolist()]
+
+    def _meeting(self, firsts, seconds):
+        """Keys of `pairs` for the streets of two names that meet"""
+        found = []
+        for a in firsts:
+            for b in seconds:
+                pair = (a, b) if a < b else (b, a)
+                if pair in self.pairs:
+                    found.append(pair)
+        return found
+
+    def lookup(self, query, city=None):
+        """
+        Coordinates of an intersection ("Mill Ave & University Dr") or a
+        street ("Mill Ave") on the map, without touching the network
+
+        Anything after the first comma must be the map's city (every word
+        in `city`), a postcode or the country, otherwise the query may be
+        about another place and is not answered. Streets with a house
+        number are not answered either.
+
+        Returns:
+            (lat, lon), or None if the query is not a known street or
+            intersection
+        """
+        parts = query.replace("@", "&").split(",")
+        if len(parts) > 1:
+            allowed = set(normalize_address(city or "").split()) | COUNTRY_WORDS
+            for word in normalize_address(",".join(parts[1:])).split():
+                if word not in allowed and not word.isdigit():
+                    return None
+
+        words = normalize_address(parts[0]).split()
+        for separator in ("&", "at"):
+            if separator in words:
+                split = words.index(separator)
+                first, second = " ".join(words[:split]), " ".join(words[split + 1:])
+                if not first or not second or "&" in second.split():
+                    return None
+                found = self._meeting(self.keys.get(first, []), self.keys.get(second, []))
+                if len(found) == 1:
+                    return self.pair_place(found[0])[:2]
+                if not found:
+                    return None
+                return self._place(np.unique(np.concatenate([self.pairs[pair] for pair in found])))[:2]
+
+        if not words or words[0].isdigit():
+            return None
+        streets = self.keys.get(" ".join(words))
+        if streets is None:
+            return None
+        return self.street_place(streets)[:2]
+
+    def pair_place(self, pair):
+        """(lat, lon, node ID) of where a pair of streets (a key of `pairs`) meet"""
+        place = self._pair_places.get(pair)
+        if place is None:
+            place = self._place(self.pairs[pair])
+            self._pair_places[pair] = place
+        return place
+
+    def street_place(self, streets):
+        """(lat, lon, node ID) standing for one or more streets (ids)"""
+        streets = tuple(streets)
+        place = self._street_places.get(streets)
+        if place is None:
+            place = self._place(np.concatenate([self.street_nodes[street] for street in streets]))
+            self._street_places[streets] = place
+        return place
+
+    def _place(self, nodes):
+        """
+        One point and node for a non-empty set of nodes
+
+        The point is the centre of the nodes if they are one compact
+        intersection (a divided road meets another at several nodes),
+        otherwise the node nearest the centre; the node is always the one
+        nearest the centre.
+        """
+        if len(nodes) == 1:
+            i = int(nodes[0])
+            return (float(self.lats[i]), float(self.lons[i]), self.node_ids[i])
+        lats, lons = self.lats[nodes], self.lons[nodes]
+        lat, lon = float(lats.mean()), float(lons.mean())
+        distances = haversine_distances(lat, lon, lats, lons)
+        i = int(nodes[int(distances.argmin())])
+        if distances.max() <= CLUSTER_KM:
+            return (lat, lon, self.node_ids[i])
+        return (float(self.lats[i]), float(self.lons[i]), self.node_ids[i])
+
+    def memory_usage(self):
+        return (sum(nodes.nbytes for nodes in self.street_nodes)
+                + sum(nodes.nbytes for nodes in self.pairs.values())
+                + sum(len(name) for name in self.streets))
+
+
+def get_street_index(graph):
+    """Return the map's street index, building and caching it on first use"""
+    index = getattr(graph, 'street_index', None)
+    if index is None:
+        node_names = getattr(graph, 'node_names', None)
+        if node_names is None:
+            node_names = NodeNames.build(graph)
+            graph.node_names = node_names
+        index = StreetIndex.build(node_names)
+        graph.street_index = index
+    return index
@@ -0,0 +1,270 @@
+import heapq
+
+import numpy as np
+
+from .street_index import get_street_index
+from ..utils.geocode_cache import ABBREVIATIONS, address_words, normalize_address
+
+DEFAULT_LIMIT = 8
+MIN_FUZZY_LENGTH = 3    # Shorter words are matched exactly (whole) or as exact prefixes
+MAX_FUZZY_LENGTH = 10   # Longer words are matched fuzzily on their first letters
+MAX_SCANNED = 200       # Candidate streets examined for one side of a query
+MAX_FIRST_STREETS = 8   # Streets an intersection query's first half may mean
+
+
+def _deletions(text):
+    """Every string one character shorter than text"""
+    return {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+class StreetSearch:
+    """
+    Autocomplete over the street and intersection names of a StreetIndex
+
+    Every word of every street name is indexed by all its prefixes, and so
+    are the spellings normalize_address abbreviates ("avenue" for "ave"),
+    so the word being typed is one dict lookup. Typos are tolerated with
+    the symmetric-deletion scheme: prefixes of MIN_FUZZY_LENGTH letters or
+    more are also indexed under each string one letter shorter, and a
+    query word is looked up with its own deletions, which finds prefixes
+    one insertion, deletion, substitution or transposition away without
+    comparing against the vocabulary.
+
+    Streets are ranked by how many query words matched only fuzzily, then
+    by importance: their total length weighted by speed limit, so
+    arterials come before cul-de-sacs. Each word's streets are kept
+    sorted by importance and merged lazily, so a query never looks at more
+    than MAX_SCANNED streets; intersections are only searched among the
+    cross streets of the best matches for the first street.
+    """
+
+    def __init__(self, street_index, importance):
+        self.street_index = street_index
+        self.importance = np.asarray(importance, dtype=np.float64)
+        order = np.argsort(-self.importance, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        self.rank = rank.tolist()  # 0 for the most important street
+
+        word_ids = {}
+        street_words = []
+        for name in street_index.streets:
+            street_words.append(frozenset(word_ids.setdefault(word, len(word_ids))
+                                          for word in name.split()))
+        self.words = list(word_ids)
+        self.street_words = street_words
+
+        word_streets = [[] for _ in self.words]
+        for street in order.tolist():
+            for word in street_words[street]:
+                word_streets[word].append(street)
+        self.word_streets = word_streets
+
+        # Cross streets of each street, most important first
+        crossings = [[] for _ in street_index.streets]
+        for a, b in street_index.pairs:
+            crossings[a].append(b)
+            crossings[b].append(a)
+        self.crossings = [sorted(partners, key=self.rank.__getitem__) for partners in crossings]
+
+        spellings = {}
+        for spelling, word in ABBREVIATIONS.items():
+            spellings.setdefault(word, []).append(spelling)
+        self.whole = {}   # word or unabbreviated spelling -> word id
+        exact = {}        # prefix -> word ids
+        fuzzy = {}        # prefix with one letter deleted -> word ids
+        for word_id, word in enumerate(self.words):
+            for spelling in [word] + spellings.get(word, []):
+                self.whole[spelling] = word_id
+                for end in range(1, len(spelling) + 1):
+                    prefix = spelling[:end]
+                    exact.setdefault(prefix, set()).add(word_id)
+                    if MIN_FUZZY_LENGTH <= end <= MAX_FUZZY_LENGTH:
+                        for variant in _deletions(prefix):
+                            fuzzy.setdefault(variant, set()).add(word_id)
+        self.exact = {key: tuple(ids) for key, ids in exact.items()}
+        self.fuzzy = {key: tuple(ids) for key, ids in fuzzy.items()}
+
+    @classmethod
+    def build(cls, graph):
+        """
+        Index the street names of a map, weighting streets by their roads
+
+        Args:
+            graph: Graph with `roads` (MapData)
+
+        Returns:
+            StreetSearch
+        """
+        street_index = get_street_index(graph)
+        street_id = {name: i for i, name in enumerate(street_index.streets)}
+        importance = np.zeros(len(street_index.streets))
+        normalized = {}
+        for road in graph.roads.values():
+            names = road.name if isinstance(road.name, list) else [road.name]
+            for name in names:
+                if not name:
+                    continue
+                if name not in normalized:
+                    normalized[name] = street_id.get(normalize_address(name), -1)
+                street = normalized[name]
+                if street >= 0:
+                    importance[street] += road.length / 1000 * road.speed_limit
+        return cls(street_index, importance)
+
+    def __len__(self):
+        return len(self.words)
+
+    def _word_matches(self, token, whole):
+        """
+        Word ids a query word may stand for, as {word id: 0 exact, 1 fuzzy}
+
+        Short words that are already complete (followed by more text) must
+        match a whole word, otherwise "s" would match every word starting
+        with s.
+        """
+        if len(token) < MIN_FUZZY_LENGTH:
+            if whole:
+                word = self.whole.get(token)
+                return {} if word is None else {word: 0}
+            return dict.fromkeys(self.exact.get(token, ()), 0)
+
+        matches = dict.fromkeys(self.exact.get(token, ()), 0)
+        token = token[:MAX_FUZZY_LENGTH]
+        found = [self.fuzzy.get(token, ())]
+        for variant in _deletions(token):
+            found.append(self.exact.get(variant, ()))
+            found.append(self.fuzzy.get(variant, ()))
+        for ids in found:
+            for word in ids:
+                matches.setdefault(word, 1)
+        return matches
+
+    def _penalty(self, street, matches):
+        """Fuzzy words if every query word matches a word of the street, else None"""
+        words = self.street_words[street]
+        penalty = 0
+        for match in matches:
+            best = None
+            for word in words:
+                if word in match and (best is None or match[word] < best):
+                    best = match[word]
+            if best is None:
+                return None
+            penalty += best
+        return penalty
+
+    def _streets(self, matches, limit):
+        """
+        The best streets whose names contain a match for every query word
+
+        Args:
+            matches: _word_matches of each query word
+            limit: Number of streets wanted
+
+        Returns:
+            List of (fuzzy words, rank, street id), best first
+        """
+        if not matches or not all(matches):
+            return []
+        # Candidates come from the query word with the fewest matching streets
+        driver = min(range(len(matches)),
+                     key=lambda i: sum(len(self.word_streets[word]) for word in matches[i]))
+        others = matches[:driver] + matches[driver + 1:]
+
+        # Exact matches of the driver first, most important first; once
+        # `limit` streets matched every word exactly nothing later can beat them
+        found = {}
+        perfect = 0
+        for level in (0, 1):
+            streams = [self._stream(word) for word, penalty in matches[driver].items() if penalty == level]
+            for rank, street in heapq.merge(*streams):
+                if street in found:
+                    continue
+                rest = self._penalty(street, others)
+                if rest is None:
+                    continue
+                found[street] = (level + rest, rank, street)
+                perfect += level + rest == 0
+                if perfect >= limit or len(found) >= MAX_SCANNED:
+                    break
+            if perfect >= limit or len(found) >= MAX_SCANNED:
+                break
+        return sorted(found.values())[:limit]
+
+    def _stream(self, word):
+        """(rank, street id) of the streets with a word, most important first"""
+        rank = self.rank
+        for street in self.word_streets[word]:
+            yield rank[street], street
+
+    def complete(self, query, limit=DEFAULT_LIMIT):
+        """
+        Suggestions for a partly typed street ("mill a") or intersection
+        ("mill & univ", or "mill &" for its cross streets)
+
+        Returns:
+            Up to `limit` dicts with kind ("street" or "intersection"),
+            description, node_id, lat and lon, best first
+        """
+        index = self.street_index
+        text = query.replace("@", "&").split(",")[0]
+        words = address_words(text)
+        typing = bool(words) and not text[-1:].isspace()
+        matches = []
+        for position, word in enumerate(words):
+            token = ABBREVIATIONS.get(word, word)
+            if token in ("&", "at"):
+                matches.append(token)
+                continue
+            if typing and position == len(words) - 1:
+                # Still being typed: "south" may become "southern", and the
+                # unabbreviated spellings are indexed too
+                matches.append(self._word_matches(word, False))
+            else:
+                matches.append(self._word_matches(token, True))
+        separator = next((i for i, match in enumerate(matches) if isinstance(match, str)), None)
+
+        if separator is None:
+            results = []
+            for _, _, street in self._streets(matches, limit):
+                lat, lon, node_id = index.street_place((street,))
+                results.append(self._suggestion("street", index.labels[street], node_id, lat, lon))
+            return results
+
+        seconds = matches[separator + 1:]
+        if any(isinstance(match, str) for match in seconds):
+            return []
+        scored = []
+        for penalty_a, _, a in self._streets(matches[:separator], MAX_FIRST_STREETS):
+            for b in self.crossings[a]:
+                penalty_b = self._penalty(b, seconds)
+                if penalty_b is not None:
+                    scored.append((penalty_a + penalty_b, -(self.importance[a] + self.importance[b]), a, b))
+        scored.sort()
+
+        results = []
+        for _, _, a, b in scored[:limit]:
+            lat, lon, node_id = index.pair_place((a, b) if a < b else (b, a))
+            description = f"{index.labels[a]} & {index.labels[b]}"
+            results.append(self._suggestion("intersection", description, node_id, lat, lon))
+        return results
+
+    @staticmethod
+    def _suggestion(kind, description, node_id, lat, lon):
+        return {"kind": kind, "description": description, "node_id": node_id,
+                "lat": lat, "lon": lon}
+
+    def memory_usage(self):
+        """Rough bytes held by the prefix tables"""
+        return sum(8 * (len(ids) + 2) + len(key) for table in (self.exact, self.fuzzy)
+                   for key, ids in table.items())
+
+
+def get_street_search(graph):
+    """Return the map's autocomplete index, building and caching it on first use"""
+    search = getattr(graph, 'street_search', None)
+    if search is None or search.street_index is not get_street_index(graph):
+        search = StreetSearch.build(graph)
+        graph.street_search = search
+    return search
@@ -1,138 +1,230 @@
 # src/data/traffic_data.py
 from ..api.traffic_api import TomTomTrafficAPI
 from datetime import datetime
+import threading
+import time
+import numpy as np
+from .graph_builder import get_compiled_graph
+from .traffic_matcher import TrafficMatcher
+
+# Relative change of a road's multiplier below which an update leaves it alone
+DEFAULT_DELTA_THRESHOLD = 0.05
+
+
+class TrafficDelta:
+    """
+    The roads one traffic update changed
+
+    Published to TrafficData subscribers after the new snapshot is in
+    place, so caches and precomputed structures can repair themselves
+    instead of starting over. Edges are compiled edge indices; `before`
+    and `after` are their multipliers in the previous and new snapshot.
+    """
+
+    def __init__(self, compiled, edges, before, after, previous, snapshot):
+        self.compiled = compiled
+        self.edges = edges
+        self.before = before
+        self.after = after
+        self.previous = previous  # TrafficSnapshot replaced by the update
+        self.snapshot = snapshot  # TrafficSnapshot now in use
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    @property
+    def previous_version(self):
+        return self.previous.version
+
+    @property
+    def faster(self):
+        """True if any road got faster, which can shorten any route"""
+        return bool((self.after < self.before).any())
+
+    @property
+    def edge_ids(self):
+        """Road ids of the changed edges"""
+        edge_ids = self.compiled.edge_ids
+        return [edge_ids[edge] for edge in self.edges.tolist()]
+
+    def __len__(self):
+        return len(self.edges)
+
 
 class TrafficData:
-    def __init__(self, map_data, api_key=None):
+    def __init__(self, map_data, api_key=None, history=None, traffic_api=None,
+                 delta_threshold=DEFAULT_DELTA_THRESHOLD):
         self.map_data = map_data
-        self.traffic_api = TomTomTrafficAPI(api_key)
+        # Feed client; pass one from create_traffic_api to use config settings
+        self.traffic_api = traffic_api if traffic_api is not None else TomTomTrafficAPI(api_key)
         self.last_update = None
+        self.matcher = None  # TrafficMatcher for the current compiled graph
+        self.history = history  # TrafficHistory every update is appended to
+        self.delta_threshold = delta_threshold
+        self._apply_lock = threading.Lock()  # Keeps snapshots and history rows in order
+        self._subscribers = []
+        self.updates = 0
+        self.changed_edges = 0  # Edges changed by the last update
+        self.total_changed_edges = 0
+    
+    @property
+    def snapshot(self):
+        """TrafficSnapshot new searches run on"""
+        return get_compiled_graph(self.map_data).traffic_snapshot
+    
+    @property
+    def version(self):
+        """Bumped on every update; caches key results on it"""
+        return self.snapshot.version
+    
+    @property
+    def fingerprint(self):
+        """Hash of the current multipliers, equal across processes"""
+        return self.snapshot.fingerprint
+    
+    def subscribe(self, callback):
+        """
+        Call callback(TrafficDelta) after every update that changes a road
+        
+        Callbacks run in the updating thread, in update order; an exception
+        in one is printed and does not stop the others.
+        """
+        self._subscribers.append(callback)
     
     def update_traffic(self):
         """Update traffic conditions for all roads"""
         print("Fetching real-time traffic data...")
+        compiled = get_compiled_graph(self.map_data)
         
         # Calculate bounding box for the entire map
-        min_lat = min(i.lat for i in self.map_data.intersections.values())
-        max_lat = max(i.lat for i in self.map_data.intersections.values())
-        min_lon = min(i.lon for i in self.map_data.intersections.values())
-        max_lon = max(i.lon for i in self.map_data.intersections.values())
+        min_lat, max_lat = float(compiled.lats.min()), float(compiled.lats.max())
+        min_lon, max_lon = float(compiled.lons.min()), float(compiled.lons.max())
         
         # Get traffic data from API
         traffic_data = self.traffic_api.get_traffic_flow(
             (min_lat, min_lon, max_lat, max_lon)
         )
         
-        # Match traffic data to roads using more sophisticated method
-        self._match_roads_to_traffic(traffic_data)
+        # Match traffic data to roads and apply what changed in one step
+        multipliers = self._match_roads_to_traffic(traffic_data)
+        with self._apply_lock:
+            delta = self._apply_traffic(multipliers, self.delta_threshold)
+            self.last_update = datetime.now()
+            # Subscribers first: the graph already serves the new snapshot,
+            # and a failed history write must not leave caches stale
+            self._publish(delta)
+            self._record(delta.snapshot)
         
-        print(f"Updated traffic data")
-        self.last_update = datetime.now()
+        print(f"Updated traffic data: {len(delta)} of {len(multipliers)} roads changed")
+        return delta
     
-    def _match_roads_to_traffic(self, traffic_data):
-        """More sophisticated matching of roads to traffic data"""
-        try:
-            from rtree import index
-            
-            # Create spatial index
-            idx = index.Index()
-            point_data = {}
-            
-            # Add traffic data points to index
-            i = 0
-            for data_id, traffic in traffic_data.items():
-                if '_' in data_id:
-                    try:
-                        parts = data_id.split('_')
-                        if len(parts) >= 2:
-                            data_lat = float(parts[0])
-                            data_lon = float(parts[1])
-                            
-                            # Add to index
-                            idx.insert(i, (data_lon, data_lat, data_lon, data_lat))
-                            point_data[i] = (data_id, traffic)
-                            i += 1
-                    except:
-                        continue
-            
-            # Match roads to nearest traffic data points
-            updated_roads = 0
-            for road_id, road in self.map_data.roads.items():
-                # Get road midpoint
-                mid_lat = (road.start.lat + road.end.lat) / 2
-                mid_lon = (road.start.lon + road.end.lon) / 2
-                
-                # Find nearest traffic data points
-                nearest = list(idx.nearest((mid_lon, mid_lat, mid_lon, mid_lat), 1))
-                
-                if nearest:
-                    nearest_id = nearest[0]
-                    data_id, traffic = point_data[nearest_id]
-                    
-                    # Apply traffic multiplier to road
-                    road.current_traffic = traffic
-                    updated_roads += 1
-                    
-            print(f"Updated {updated_roads} roads using spatial index")
+    def restore_latest(self, max_age=None):
+        """
+        Apply the most recent multipliers from the history (warm restart)
+        
+        Args:
+            max_age: Ignore the history if its last row is older than this
+                many seconds
         
-        except ImportError:
-            # Fall back to simpler matching method if rtree is not available
-            print("R-tree package not available, using simple matching")
-            self._simple_match_roads_to_traffic(traffic_data)
+        Returns:
+            True if traffic was restored
+        """
+        if self.history is None:
+            return False
+        latest = self.history.latest()
+        if latest is None:
+            return False
+        timestamp, multipliers = latest
+        if max_age is not None and time.time() - timestamp > max_age:
+            return False
+        with self._apply_lock:
+            delta = self._apply_traffic(multipliers, 0)
+            self.last_update = datetime.fromtimestamp(timestamp)
+            self._publish(delta)
+        print(f"Restored traffic from {self.last_update:%Y-%m-%d %H:%M:%S}")
+        return True
     
-    def _simple_match_roads_to_traffic(self, traffic_data):
-        """Simpler matching method without external dependencies"""
-        # For each road, find the closest traffic data point
-        updated_roads = 0
-        for road_id, road in self.map_data.roads.items():
-            best_match = self._find_matching_traffic(road, traffic_data)
-            if best_match:
-                road.current_traffic = best_match
-                updated_roads += 1
-            else:
-                # Default multiplier if no match
-                road.current_traffic = 1.0
-                
-        print(f"Updated {updated_roads} roads using simple matching")
+    def _match_roads_to_traffic(self, traffic_data):
+        """
+        Match every road to its nearest traffic data point
+        
+        Returns:
+            Multiplier array in compiled edge order
+        """
+        compiled = get_compiled_graph(self.map_data)
+        if self.matcher is None or self.matcher.compiled is not compiled:
+            self.matcher = TrafficMatcher(compiled)
+        
+        multipliers, matched = self.matcher.match(traffic_data)
+        print(f"Updated {matched} roads using bulk matching")
+        return multipliers
     
-    def _find_matching_traffic(self, road, traffic_data):
-        """Find the best matching traffic data for a road segment"""
-        # For each traffic data point, calculate distance to our road
-        # and return the closest match
-        best_distance = float('inf')
-        best_traffic = None
+    def _apply_traffic(self, multipliers, threshold):
+        """
+        Swap in a snapshot with the roads whose multiplier moved, then mirror
+        them onto the Road objects
         
-        road_start_lat = road.start.lat
-        road_start_lon = road.start.lon
-        road_end_lat = road.end.lat
-        road_end_lon = road.end.lon
+        A road is changed when its new multiplier differs from the one in
+        use by more than `threshold` of it; comparing against the value in
+        use (not the last one fetched) means slow drifts are applied once
+        they add up. If nothing moved, the snapshot and its version stay,
+        so everything keyed on them stays valid.
         
-        for data_id, traffic in traffic_data.items():
-            # Parse coordinates from data_id (our simple format)
-            if '_' in data_id:
-                try:
-                    parts = data_id.split('_')
-                    if len(parts) >= 2:
-                        data_lat = float(parts[0])
-                        data_lon = float(parts[1])
-                        
-                        # Calculate distance to road (simple Euclidean distance)
-                        dist_to_start = ((data_lat - road_start_lat) ** 2 + 
-                                         (data_lon - road_start_lon) ** 2)
-                        dist_to_end = ((data_lat - road_end_lat) ** 2 + 
-                                       (data_lon - road_end_lon) ** 2)
-                        min_dist = min(dist_to_start, dist_to_end)
-                        
-                        if min_dist < best_distance:
-                            best_distance = min_dist
-                            best_traffic = traffic
-                except:
-                    continue
-                    
-        # Only return traffic data if the match is close enough
-        if best_distance < 0.001:  # Threshold for matching
-            return best_traffic
-        return None
+        Searches on compiled engines see the whole update at once. Road
+        objects are updated afterwards for display and the "objects"
+        engine, which reads live traffic and is not isolated from updates.
+        
+        Returns:
+            TrafficDelta
+        """
+        compiled = get_compiled_graph(self.map_data)
+        previous = compiled.traffic_snapshot
+        multipliers = np.asarray(multipliers, dtype=np.float64)
+        edges = np.flatnonzero(np.abs(multipliers - previous.traffic) > threshold * previous.traffic)
+        before = previous.traffic[edges]
+        after = multipliers[edges]
+        snapshot = compiled.patch_traffic(edges, after) if len(edges) else previous
+        
+        roads = self.map_data.roads
+        edge_ids = compiled.edge_ids
+        for edge, traffic in zip(edges.tolist(), after.tolist()):
+            roads[edge_ids[edge]].current_traffic = traffic
+        
+        self.updates += 1
+        self.changed_edges = len(edges)
+        self.total_changed_edges += len(edges)
+        return TrafficDelta(compiled, edges, before, after, previous, snapshot)
+    
+    def _record(self, snapshot):
+        """Append a snapshot's multipliers to the history; failures are only logged"""
+        if self.history is None:
+            return
+        try:
+            self.history.append(self.last_update.timestamp(), snapshot.traffic)
+        except (OSError, ValueError) as e:
+            print(f"Error recording traffic history: {e}")
+    
+    def _publish(self, delta):
+        """Hand a non-empty delta to every subscriber (apply lock held)"""
+        if not len(delta):
+            return
+        for callback in self._subscribers:
+            try:
+                callback(delta)
+            except Exception as e:
+                print(f"Error in traffic subscriber {getattr(callback, '__name__', callback)}: {e}")
+    
+    def stats(self):
+        """Update counters and the current traffic version"""
+        return {
+            "updates": self.updates,
+            "changed_edges": self.changed_edges,
+            "total_changed_edges": self.total_changed_edges,
+            "delta_threshold": self.delta_threshold,
+            "traffic_version": self.version,
+            "last_update": self.last_update.isoformat() if self.last_update else None
+        }
     
     def get_traffic_for_road(self, road_id):
         """Get current traffic condition for a specific road"""
@@ -0,0 +1,422 @@
+import glob
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+DEFAULT_DIRECTORY = "cache/traffic_history"
+# Rows per segment before it is sealed into road-major columns
+DEFAULT_SEGMENT_ROWS = 96
+DTYPE = np.float32
+
+
+def edge_fingerprint(edge_ids):
+    """Short hash of the edge order, naming the history of one road network"""
+    digest = hashlib.blake2b(digest_size=8)
+    for edge_id in edge_ids:
+        digest.update(str(edge_id).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class TrafficHistory:
+    """
+    Append-only, memory-mapped history of every road's traffic multiplier
+
+    Each update appends one row (a multiplier per compiled edge) with its
+    timestamp to the active segment, two raw files that are only ever
+    appended to. Once it holds segment_rows rows the segment is sealed:
+    rewritten road-major as segment_<n>_columns.npy (shape num_edges x rows)
+    next to segment_<n>_times.npy. Reading one road over a time range
+    therefore touches one contiguous run per segment, and reading the whole
+    network at one time one row of the active segment or one column per
+    road of a sealed one. Sealed segments are opened with mmap, so only the
+    parts read are loaded.
+
+    Histories of different road networks live in separate subdirectories
+    named by edge_fingerprint, so a rebuilt map never mixes with old data.
+
+    Several processes (e.g. gunicorn workers) may open the same history.
+    Every operation holds an flock on the directory's lock file, exclusive
+    for writes, and first re-reads what other processes changed on disk,
+    so rows are never interleaved or sealed twice.
+    """
+
+    def __init__(self, directory, edge_ids, segment_rows=DEFAULT_SEGMENT_ROWS):
+        self.num_edges = len(edge_ids)
+        self.directory = os.path.join(directory, edge_fingerprint(edge_ids))
+        self.segment_rows = segment_rows
+        self._lock = threading.RLock()
+        self._times_path = os.path.join(self.directory, "active_times.bin")
+        self._values_path = os.path.join(self.directory, "active_values.bin")
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_path = os.path.join(self.directory, "lock")
+        self._lock_file = None
+        self._lock_depth = 0
+
+        self._segments = []  # [(n, first, last)]
+        self._segment_files = {}  # times path -> (mtime, (n, first, last))
+        self._active_times = []
+        self._active_stat = None
+        with self._locked(exclusive=True):
+            pass
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        """Hold the thread lock and the directory flock, with state re-read from disk"""
+        with self._lock:
+            if self._lock_depth == 0:
+                if self._lock_file is None:
+                    self._lock_file = open(self._lock_path, 'a+b')
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self._sync(repair=exclusive)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _sync(self, repair=False):
+        """Pick up segments and active rows written by other processes (flock held)"""
+        files = {}
+        for path in glob.glob(os.path.join(self.directory, "segment_*_times.npy")):
+            match = re.search(r"segment_(\d+)_times\.npy$", path)
+            mtime = os.stat(path).st_mtime_ns
+            cached = self._segment_files.get(path)
+            if cached is None or cached[0] != mtime:
+                times = np.load(path)
+                cached = (mtime, (int(match.group(1)), float(times[0]), float(times[-1]))
+                          if match and len(times) else None)
+            files[path] = cached
+        self._segment_files = files
+        self._segments = sorted(entry for _, entry in files.values() if entry is not None)
+
+        if self._stat_active() != self._active_stat:
+            self._active_times = self._load_active(repair)
+            self._active_stat = self._stat_active()
+
+    def _stat_active(self):
+        """Identity, size and mtime of the active files, to notice other writers"""
+        return tuple((stat.st_ino, stat.st_size, stat.st_mtime_ns) if stat else None
+                     for stat in map(_stat, (self._times_path, self._values_path)))
+
+    def _load_active(self, repair=False):
+        """Timestamps of the active rows, repairing what a crash left behind if `repair`"""
+        times = np.fromfile(self._times_path, dtype=np.float64) if os.path.exists(self._times_path) else np.empty(0)
+        row_bytes = self.num_edges * DTYPE().itemsize
+        values_size = os.path.getsize(self._values_path) if os.path.exists(self._values_path) else 0
+        rows = min(len(times), values_size // row_bytes if row_bytes else 0)
+
+        # Rows already sealed (crash between sealing and truncating) are dropped
+        skip = 0
+        if self._segments:
+            skip = int(np.searchsorted(times[:rows], self._segments[-1][2], side='right'))
+        if not repair:
+            # Readers skip the damage; the next writer repairs it
+            return [] if skip else times[:rows].tolist()
+        if skip or rows != len(times) or rows * row_bytes != values_size:
+            values = np.fromfile(self._values_path, dtype=DTYPE,
+                                 count=rows * self.num_edges) if rows else np.empty(0, dtype=DTYPE)
+            self._rewrite_active(times[skip:rows], values[skip * self.num_edges:])
+            times = times[skip:rows]
+        return times[:rows].tolist()
+
+    def _rewrite_active(self, times, values):
+        for path, array in ((self._times_path, times), (self._values_path, values)):
+            temp_path = f"{path}.tmp"
+            np.asarray(array).tofile(temp_path)
+            os.replace(temp_path, path)
+
+    def close(self):
+        with self._lock:
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    @property
+    def num_rows(self):
+        with self._locked():
+            sealed = sum(len(np.load(self._segment_path(n, "times"), mmap_mode='r'))
+                         for n, _, _ in self._segments)
+            return sealed + len(self._active_times)
+
+    def time_range(self):
+        """(first, last) timestamp stored, or None if the history is empty"""
+        with self._locked():
+            first = self._segments[0][1] if self._segments else (
+                self._active_times[0] if self._active_times else None)
+            if first is None:
+                return None
+            return first, self._last_timestamp()
+
+    def _last_timestamp(self):
+        if self._active_times:
+            return self._active_times[-1]
+        if self._segments:
+            return self._segments[-1][2]
+        return None
+
+    def append(self, timestamp, multipliers):
+        """
+        Record the multipliers of every edge at a time
+
+        Args:
+            timestamp: Seconds since the epoch, later than the last one
+            multipliers: One value per compiled edge
+        """
+        values = np.ascontiguousarray(multipliers, dtype=DTYPE)
+        if values.shape != (self.num_edges,):
+            raise ValueError(f"Expected {self.num_edges} multipliers, got shape {values.shape}")
+        with self._locked(exclusive=True):
+            last = self._last_timestamp()
+            if last is not None and timestamp <= last:
+                raise ValueError("Traffic history timestamps must increase")
+            # Opened per row: a seal by another process replaces the files.
+            # Values first: a row only counts once its timestamp is written
+            with open(self._values_path, 'ab') as file:
+                file.write(values.tobytes())
+            with open(self._times_path, 'ab') as file:
+                file.write(np.float64(timestamp).tobytes())
+            self._active_times.append(float(timestamp))
+            if len(self._active_times) >= self.segment_rows:
+                self._seal()
+            # Our own write; don't reload it on the next sync
+            self._active_stat = self._stat_active()
+
+    def _segment_path(self, n, kind):
+        return os.path.join(self.directory, f"segment_{n:06d}_{kind}.npy")
+
+    def _write_segment(self, n, times, columns):
+        """Write a sealed segment atomically, times last so readers never see half of one"""
+        for kind, array in (("columns", columns), ("times", times)):
+            path = self._segment_path(n, kind)
+            temp_path = f"{path}.tmp.npy"
+            np.save(temp_path, array)
+            os.replace(temp_path, path)
+
+    def _active_values(self):
+        """Memory map of the active rows (lock held)"""
+        rows = len(self._active_times)
+        if not rows:
+            return np.empty((0, self.num_edges), dtype=DTYPE)
+        return np.memmap(self._values_path, dtype=DTYPE, mode='r', shape=(rows, self.num_edges))
+
+    def _seal(self):
+        """Turn the active rows into a road-major segment (lock held)"""
+        times = np.array(self._active_times)
+        columns = np.ascontiguousarray(self._active_values().T)
+        n = self._segments[-1][0] + 1 if self._segments else 0
+        self._write_segment(n, times, columns)
+        self._segments.append((n, float(times[0]), float(times[-1])))
+
+        self._rewrite_active(np.empty(0), np.empty(0, dtype=DTYPE))
+        self._active_times = []
+
+    def _blocks(self, start, end, edges):
+        """
+        (timestamps, values) per segment within [start, end), oldest first
+
+        values has one row per timestamp and one column per selected edge.
+        """
+        for n, first, last in self._segments:
+            if (end is not None and first >= end) or (start is not None and last < start):
+                continue
+            times = np.load(self._segment_path(n, "times"))
+            lo, hi = _window(times, start, end)
+            if lo == hi:
+                continue
+            columns = np.load(self._segment_path(n, "columns"), mmap_mode='r')
+            selected = columns[:, lo:hi] if edges is None else columns[edges, lo:hi]
+            yield times[lo:hi], np.asarray(selected).T
+
+        times = np.array(self._active_times)
+        lo, hi = _window(times, start, end)
+        if lo < hi:
+            rows = self._active_values()[lo:hi]
+            yield times[lo:hi], np.array(rows if edges is None else rows[:, edges])
+
+    def read(self, start=None, end=None, edges=None):
+        """
+        Multipliers recorded in [start, end)
+
+        Args:
+            start, end: Seconds since the epoch (default: unbounded)
+            edges: Compiled edge indices to read (default: all)
+
+        Returns:
+            Tuple of (timestamps, values) with values shaped
+            (len(timestamps), number of edges read)
+        """
+        if edges is not None:
+            edges = np.atleast_1d(np.asarray(edges, dtype=np.intp))
+        width = self.num_edges if edges is None else len(edges)
+        with self._locked():
+            blocks = list(self._blocks(start, end, edges))
+        if not blocks:
+            return np.empty(0), np.empty((0, width), dtype=DTYPE)
+        return (np.concatenate([times for times, _ in blocks]),
+                np.concatenate([values for _, values in blocks]))
+
+    def road(self, edge, start=None, end=None):
+        """Timestamps and multipliers of one compiled edge in [start, end)"""
+        times, values = self.read(start, end, edges=[edge])
+        return times, values[:, 0]
+
+    def latest(self):
+        """
+        The most recent row
+
+        Returns:
+            Tuple of (timestamp, multipliers), or None if nothing is stored
+        """
+        with self._locked():
+            if self._active_times:
+                return self._active_times[-1], np.array(self._active_values()[-1])
+            if self._segments:
+                n = self._segments[-1][0]
+                columns = np.load(self._segment_path(n, "columns"), mmap_mode='r')
+                return self._segments[-1][2], np.array(columns[:, -1])
+        return None
+
+    def downsample(self, interval, start=None, end=None, edges=None):
+        """
+        Mean multipliers per interval
+
+        Args:
+            interval: Bucket width in seconds
+            start, end, edges: As for read; buckets are aligned to start
+                (default: the first timestamp read)
+
+        Returns:
+            Tuple of (bucket start times, mean values) for non-empty buckets
+        """
+        times, values = self.read(start, end, edges)
+        if not len(times):
+            return times, values
+        origin = start if start is not None else times[0]
+        return _bucket_means(times, values, interval, origin, axis=0)
+
+    def time_of_day_means(self, bins, start=None, end=None):
+        """
+        Average multiplier of every edge per time-of-day bin (local time)
+
+        Segments are summed one at a time, so memory stays at one
+        (num_edges, bins) table however long the history is. Bins never
+        observed take the edge's overall mean, or 1.0 with no data at all.
+
+        Returns:
+            (num_edges, bins) float32 array
+        """
+        sums = np.zeros((self.num_edges, bins), dtype=DTYPE)
+        counts = np.zeros(bins, dtype=np.int64)
+        with self._locked():
+            for times, values in self._blocks(start, end, None):
+                seconds = np.array([_seconds_of_day(timestamp) for timestamp in times])
+                slots = (seconds * bins // 86400).astype(np.int64)
+                for slot in np.unique(slots):
+                    selected = slots == slot
+                    sums[:, slot] += values[selected].sum(axis=0)
+                    counts[slot] += int(selected.sum())
+
+        observed = counts > 0
+        if not observed.any():
+            return np.ones((self.num_edges, bins), dtype=DTYPE)
+        means = np.empty_like(sums)
+        means[:, observed] = sums[:, observed] / counts[observed]
+        overall = sums[:, observed].sum(axis=1) / counts[observed].sum()
+        means[:, ~observed] = overall[:, None]
+        return means
+
+    def compact(self, retention, downsample_after=None, interval=3600, now=None):
+        """
+        Apply retention to sealed segments
+
+        Args:
+            retention: Seconds of history to keep; older segments are deleted
+            downsample_after: Segments older than this many seconds are
+                rewritten as interval means (default: never)
+            interval: Resolution of downsampled segments, in seconds
+            now: Reference time (default: time.time())
+
+        Returns:
+            Dict with the number of segments removed and downsampled
+        """
+        now = time.time() if now is None else now
+        removed = downsampled = 0
+        with self._locked(exclusive=True):
+            kept = []
+            for n, first, last in self._segments:
+                if last < now - retention:
+                    for kind in ("times", "columns"):
+                        os.remove(self._segment_path(n, kind))
+                    removed += 1
+                    continue
+                if downsample_after is not None and last < now - downsample_after:
+                    times = np.load(self._segment_path(n, "times"))
+                    if len(times) > 1 and np.min(np.diff(times)) < interval:
+                        columns = np.load(self._segment_path(n, "columns"), mmap_mode='r')
+                        times, columns = _bucket_means(times, columns, interval,
+                                                       times[0] - times[0] % interval, axis=1)
+                        self._write_segment(n, times, columns.astype(DTYPE))
+                        first, last = float(times[0]), float(times[-1])
+                        downsampled += 1
+                kept.append((n, first, last))
+            self._segments = kept
+        return {"removed": removed, "downsampled": downsampled}
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _window(times, start, end):
+    lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+    hi = len(times) if end is None else int(np.searchsorted(times, end, side='left'))
+    return lo, max(lo, hi)
+
+
+def _bucket_means(times, values, interval, origin, axis):
+    """Mean of values along axis (the time axis) per interval-wide bucket"""
+    buckets = ((times - origin) // interval).astype(np.int64)
+    boundaries = np.flatnonzero(np.r_[True, np.diff(buckets) != 0])
+    sums = np.add.reduceat(np.asarray(values, dtype=np.float64), boundaries, axis=axis)
+    counts = np.diff(np.r_[boundaries, len(times)])
+    means = sums / counts[:, None] if axis == 0 else sums / counts
+    return origin + buckets[boundaries] * interval, means
+
+
+def _seconds_of_day(timestamp):
+    local = time.localtime(timestamp)
+    return local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec
+
+
+def create_traffic_history(config, compiled):
+    """
+    Open the traffic history from the `traffic.history` config section
+
+    Returns:
+        TrafficHistory for the compiled graph's edges, or None if disabled
+    """
+    settings = config.get('traffic', {}).get('history', {})
+    if not settings.get('enabled', True):
+        return None
+    return TrafficHistory(
+        settings.get('path', DEFAULT_DIRECTORY),
+        compiled.edge_ids,
+        segment_rows=settings.get('segment_rows', DEFAULT_SEGMENT_ROWS)
+    )
@@ -0,0 +1,162 @@
+import math
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Roads farther than this (in degrees) from every traffic point keep free flow
+MATCH_DISTANCE = math.sqrt(0.001)
+
+
+def parse_traffic_points(traffic_data):
+    """
+    Split {"lat_lon": multiplier} traffic data into arrays
+
+    Keys that are not "lat_lon" pairs are skipped.
+
+    Returns:
+        Tuple of (lats, lons, multipliers) NumPy arrays
+    """
+    lats = []
+    lons = []
+    values = []
+    for data_id, traffic in traffic_data.items():
+        parts = data_id.split('_')
+        if len(parts) < 2:
+            continue
+        try:
+            lat, lon = float(parts[0]), float(parts[1])
+        except ValueError:
+            continue
+        lats.append(lat)
+        lons.append(lon)
+        values.append(traffic)
+    return (np.array(lats, dtype=np.float64), np.array(lons, dtype=np.float64),
+            np.array(values, dtype=np.float64))
+
+
+class TrafficMatcher:
+    """
+    Bulk assignment of traffic sample points to roads
+
+    Road midpoints are computed once per compiled graph. Each refresh then
+    finds the nearest traffic point of every road in one KD-tree query
+    (scipy) or a vectorized grid search, instead of one Python-level
+    lookup per road.
+    """
+
+    def __init__(self, compiled, max_distance=MATCH_DISTANCE):
+        self.compiled = compiled
+        self.max_distance = max_distance
+        sources = compiled.sources()
+        self.mid_lats = (compiled.lats[sources] + compiled.lats[compiled.targets]) / 2
+        self.mid_lons = (compiled.lons[sources] + compiled.lons[compiled.targets]) / 2
+
+    def match(self, traffic_data):
+        """
+        Traffic multiplier for every road
+
+        Args:
+            traffic_data: Mapping of "lat_lon" point ids to multipliers, as
+                returned by TomTomTrafficAPI.get_traffic_flow
+
+        Returns:
+            Tuple of (multipliers, matched): a float64 array in compiled edge
+            order (1.0 for roads with no point within max_distance) and the
+            number of roads that were matched
+        """
+        lats, lons, values = parse_traffic_points(traffic_data)
+        multipliers = np.ones(len(self.mid_lats), dtype=np.float64)
+        if len(values) == 0 or len(multipliers) == 0:
+            return multipliers, 0
+
+        nearest, distances = self._nearest(lats, lons)
+        matched = distances <= self.max_distance
+        multipliers[matched] = values[nearest[matched]]
+        return multipliers, int(matched.sum())
+
+    def _nearest(self, lats, lons):
+        """Index of and distance to the closest point, for every road midpoint"""
+        if cKDTree is not None:
+            tree = cKDTree(np.column_stack([lats, lons]))
+            distances, nearest = tree.query(np.column_stack([self.mid_lats, self.mid_lons]))
+            return nearest, distances
+
+        return _grid_nearest(self.mid_lats, self.mid_lons, lats, lons, self.max_distance)
+
+
+def _grid_nearest(query_lats, query_lons, lats, lons, max_distance):
+    """
+    Nearest point within max_distance for every query, without scipy
+
+    Points are bucketed into a grid with a couple of points per cell. All
+    queries then scan rings of cells around themselves together: each
+    cell offset is one vectorized step over the queries still unresolved.
+    A query is resolved once its best distance is within the radius the
+    scanned rings fully cover, or once that radius reaches max_distance.
+
+    Returns:
+        Tuple of (nearest, distances); nearest is -1 and the distance inf
+        where no point lies within max_distance
+    """
+    count = len(query_lats)
+    nearest = np.full(count, -1, dtype=np.int64)
+    squared = np.full(count, np.inf)  # squared distance to the best point so far
+
+    lat_min, lon_min = float(lats.min()), float(lons.min())
+    area = (float(lats.max()) - lat_min) * (float(lons.max()) - lon_min)
+    # A couple of points per cell, but never so small that reaching
+    # max_distance takes more than a handful of rings
+    cell = min(max(math.sqrt(area / len(lats) * 2), max_distance / 8), max_distance)
+    columns = int((float(lons.max()) - lon_min) / cell) + 1
+    rows = int((float(lats.max()) - lat_min) / cell) + 1
+
+    point_cells = ((lats - lat_min) / cell).astype(np.int64) * columns + ((lons - lon_min) / cell).astype(np.int64)
+    order = np.argsort(point_cells, kind='stable')
+    cell_start = np.searchsorted(point_cells[order], np.arange(rows * columns + 1))
+
+    query_rows = np.floor((query_lats - lat_min) / cell).astype(np.int64)
+    query_columns = np.floor((query_lons - lon_min) / cell).astype(np.int64)
+    pending = np.arange(count)
+
+    radius = 0
+    while len(pending):
+        ring = [(dr, dc) for dr in range(-radius, radius + 1) for dc in range(-radius, radius + 1)
+                if max(abs(dr), abs(dc)) == radius]
+        for dr, dc in ring:
+            r = query_rows[pending] + dr
+            c = query_columns[pending] + dc
+            inside = (r >= 0) & (r < rows) & (c >= 0) & (c < columns)
+            queries = pending[inside]
+            cells = r[inside] * columns + c[inside]
+            starts = cell_start[cells]
+            sizes = cell_start[cells + 1] - starts
+            if not sizes.any():
+                continue
+            # One (query, point) pair per point in each query's cell
+            pair_queries = np.repeat(queries, sizes)
+            pair_points = order[np.arange(len(pair_queries)) +
+                                np.repeat(starts - (np.cumsum(sizes) - sizes), sizes)]
+            dlat = query_lats[pair_queries] - lats[pair_points]
+            dlon = query_lons[pair_queries] - lons[pair_points]
+            pair_squared = dlat * dlat + dlon * dlon
+            best = squared.copy()
+            np.minimum.at(best, pair_queries, pair_squared)
+            winners = (pair_squared < squared[pair_queries]) & (pair_squared == best[pair_queries])
+            nearest[pair_queries[winners]] = pair_points[winners]
+            squared = best
+
+        covered = radius * cell
+        if covered >= max_distance:
+            break
+        pending = pending[squared[pending] > covered * covered]
+        radius += 1
+
+    distances = np.sqrt(squared)
+    beyond = distances > max_distance
+    nearest[beyond] = -1
+    distances[beyond] = np.inf
+    return nearest, distances
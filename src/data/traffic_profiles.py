@@ -0,0 +1,182 @@
+import threading
+import time
+
+import numpy as np
+
+from ..api.traffic_api import rush_hour_congestion
+from .graph_builder import get_compiled_graph
+
+BINS_PER_DAY = 96               # quarter-hour bins
+BIN_HOURS = 24 / BINS_PER_DAY
+# Multipliers are stored as uint8 steps of 1/SCALE: 0.025 resolution up to 6.375
+SCALE = 40
+# History must span this many seconds before profiles are built from it
+DEFAULT_MIN_HISTORY = 86400
+
+_profiles_lock = threading.Lock()
+
+
+class TrafficProfiles:
+    """
+    Daily traffic multiplier curves for every edge of a CompiledGraph
+
+    Each curve has BINS_PER_DAY values, taken at the start of each bin and
+    interpolated linearly in between (wrapping around midnight). Curves
+    are quantized to uint8 and stored once however many edges share them,
+    so memory is num_edges * 4 bytes for the profile ids plus 97 bytes per
+    distinct curve.
+
+    source says where the curves came from: "history" for observed means,
+    "current" for the flat fallback of a TrafficSnapshot (whose version is
+    then kept as version), or None for curves given directly.
+    """
+
+    def __init__(self, table, profile_ids, source=None, version=None):
+        # (num_profiles, BINS_PER_DAY + 1) uint8; the last column repeats
+        # the first so interpolation never wraps
+        table = np.asarray(table, dtype=np.uint8)
+        if table.shape[1] == BINS_PER_DAY:
+            table = np.concatenate([table, table[:, :1]], axis=1)
+        self.table = np.ascontiguousarray(table)
+        self.profile_ids = np.asarray(profile_ids, dtype=np.int32)
+        self.source = source
+        self.version = version
+        self.created = time.time()
+        self._search_data = None
+
+    @classmethod
+    def build(cls, multipliers, source=None):
+        """
+        Quantize and deduplicate per-edge curves
+
+        Args:
+            multipliers: (num_edges, BINS_PER_DAY) array-like of multipliers
+            source: See the class docstring
+        """
+        multipliers = np.asarray(multipliers)
+        quantized = np.empty(multipliers.shape, dtype=np.uint8)
+        # Column by column, so no full-size float temporaries are made
+        for b in range(multipliers.shape[1]):
+            quantized[:, b] = np.clip(np.rint(multipliers[:, b] * SCALE), 1, 255)
+        # Compare whole rows as opaque bytes, much faster than unique(axis=0)
+        rows = quantized.view(np.dtype((np.void, quantized.shape[1]))).ravel()
+        _, first, profile_ids = np.unique(rows, return_index=True, return_inverse=True)
+        return cls(quantized[first], profile_ids.ravel(), source)
+
+    @classmethod
+    def from_history(cls, history, start=None, end=None):
+        """Average time-of-day curves of a TrafficHistory (see traffic_history.py)"""
+        return cls.build(history.time_of_day_means(BINS_PER_DAY, start, end), "history")
+
+    @classmethod
+    def flat(cls, snapshot):
+        """Every edge keeps its multiplier in a TrafficSnapshot all day"""
+        quantized = np.clip(np.rint(np.asarray(snapshot.traffic, dtype=np.float64) * SCALE), 1, 255)
+        values, profile_ids = np.unique(quantized.astype(np.uint8), return_inverse=True)
+        return cls(np.repeat(values[:, None], BINS_PER_DAY, axis=1), profile_ids.ravel(),
+                   "current", snapshot.version)
+
+    @classmethod
+    def uniform(cls, num_edges, curve):
+        """Every edge follows the same curve of BINS_PER_DAY multipliers"""
+        table = np.clip(np.rint(np.asarray(curve, dtype=np.float64) * SCALE), 1, 255)
+        return cls(table.reshape(1, -1), np.zeros(num_edges, dtype=np.int32))
+
+    @property
+    def num_profiles(self):
+        return len(self.table)
+
+    def multipliers_at(self, hour):
+        """Multiplier of every edge at an hour of the day, as a float array"""
+        position = (hour % 24) / BIN_HOURS
+        b = int(position)
+        fraction = position - b
+        curves = self.table[:, b] + (self.table[:, b + 1].astype(np.float64) - self.table[:, b]) * fraction
+        return curves[self.profile_ids] / SCALE
+
+    def min_multipliers(self):
+        """Smallest multiplier each edge reaches during the day"""
+        return self.table.min(axis=1)[self.profile_ids] / SCALE
+
+    def search_data(self):
+        """
+        Plain-Python copies for search loops: (profile_ids, flat table)
+
+        The flat table is bytes, so indexing it yields small ints without
+        a float object per bin. Curve p, bin b is at p * (BINS_PER_DAY + 1) + b.
+        """
+        if self._search_data is None:
+            self._search_data = (self.profile_ids.tolist(), self.table.tobytes())
+        return self._search_data
+
+    def memory_usage(self):
+        """Bytes held by the stored arrays"""
+        return self.table.nbytes + self.profile_ids.nbytes
+
+
+def rush_hour_profile():
+    """The daily curve of rush_hour_congestion at BINS_PER_DAY resolution"""
+    return [rush_hour_congestion(int(b * BIN_HOURS)) for b in range(BINS_PER_DAY)]
+
+
+def get_traffic_profiles(graph):
+    """
+    Return the graph's traffic profiles, attaching the fallback on first use
+
+    Until profiles built from observed traffic are attached (as
+    compiled.traffic_profiles, see refresh_traffic_profiles_async), every
+    road keeps its current multiplier all day (TrafficProfiles.flat), and
+    the fallback follows the current snapshot as traffic is updated.
+    """
+    compiled = get_compiled_graph(graph)
+    snapshot = compiled.traffic_snapshot
+    with _profiles_lock:
+        profiles = getattr(compiled, 'traffic_profiles', None)
+        if profiles is None or (profiles.source == "current" and profiles.version != snapshot.version):
+            profiles = TrafficProfiles.flat(snapshot)
+            compiled.traffic_profiles = profiles
+    return profiles
+
+
+def refresh_traffic_profiles_async(graph, history, min_history=DEFAULT_MIN_HISTORY):
+    """
+    Rebuild the profiles from a TrafficHistory in a background thread
+
+    Departure-time queries keep using the previous profiles until the new
+    ones are swapped in. Until the history spans min_history seconds it
+    is left alone and roads keep the flat fallback of get_traffic_profiles.
+    Like refresh_hierarchy_async, each graph has at most one refresh
+    thread, and requests arriving while it builds trigger one more build.
+
+    Returns:
+        The refresh Thread (already running if one was)
+    """
+    compiled = get_compiled_graph(graph)
+    with _profiles_lock:
+        compiled.traffic_profiles_dirty = True
+        thread = getattr(compiled, 'traffic_profiles_refresher', None)
+        if thread is None:
+            thread = threading.Thread(target=_refresh_profiles,
+                                      args=(compiled, history, min_history), daemon=True)
+            compiled.traffic_profiles_refresher = thread
+            thread.start()
+    return thread
+
+
+def _refresh_profiles(compiled, history, min_history):
+    """Body of the refresh thread: rebuild until no request is pending"""
+    while True:
+        with _profiles_lock:
+            if not compiled.traffic_profiles_dirty:
+                compiled.traffic_profiles_refresher = None
+                return
+            compiled.traffic_profiles_dirty = False
+        try:
+            time_range = history.time_range()
+            if time_range is None or time_range[1] - time_range[0] < min_history:
+                continue
+            profiles = TrafficProfiles.from_history(history)
+            with _profiles_lock:
+                compiled.traffic_profiles = profiles
+        except Exception as e:
+            print(f"Error refreshing traffic profiles: {e}")
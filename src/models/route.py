@@ -0,0 +1,171 @@
+import math
+
+
+class Route:
+    """
+    A path found by a search engine, with the roads it uses
+
+    The route drives from nodes[i] to nodes[i+1] along road edge_ids[i].
+    cumulative_times[i] (hours) and cumulative_distances[i] (meters) are
+    measured from the start to nodes[i], so both have one entry per node.
+
+    traffic_version is the version of the TrafficSnapshot the search ran
+    on, or None for searches over Road objects, which read live traffic.
+
+    For compatibility with the (path, total_time) tuples the engines used
+    to return, a Route unpacks and indexes like that pair:
+
+        path, total_time = dijkstra(graph, start, end)
+    """
+
+    def __init__(self, nodes=None, edge_ids=(), edge_times=(), edge_lengths=(), total_time=None,
+                 traffic_version=None):
+        self.nodes = list(nodes) if nodes is not None else None
+        self.edge_ids = list(edge_ids)
+        self.traffic_version = traffic_version
+        self.cumulative_times = [0.0]
+        self.cumulative_distances = [0.0]
+        for time, length in zip(edge_times, edge_lengths):
+            self.cumulative_times.append(self.cumulative_times[-1] + time)
+            self.cumulative_distances.append(self.cumulative_distances[-1] + length)
+
+        if self.nodes is None:
+            self.total_time = math.inf
+        elif total_time is None:
+            self.total_time = self.cumulative_times[-1]
+        else:
+            # Keep the engine's own sum, which may differ in the last bits
+            self.total_time = total_time
+
+    @classmethod
+    def unreachable(cls):
+        """The result of a search that found no path"""
+        return cls(None)
+
+    @classmethod
+    def from_roads(cls, start, roads, total_time=None):
+        """
+        Route along Road objects
+
+        Args:
+            start: Starting intersection ID
+            roads: Roads in driving order
+            total_time: Travel time computed by the search, if any
+        """
+        return cls(
+            nodes=[start] + [road.end.id for road in roads],
+            edge_ids=[road.id for road in roads],
+            edge_times=[road.travel_time() for road in roads],
+            edge_lengths=[road.length for road in roads],
+            total_time=total_time
+        )
+
+    @classmethod
+    def from_edges(cls, compiled, source, edges, total_time=None, snapshot=None):
+        """
+        Route along CompiledGraph edges
+
+        Args:
+            compiled: CompiledGraph the edge indices refer to
+            source: Dense index of the start node
+            edges: Edge indices in driving order
+            total_time: Travel time computed by the search, if any
+            snapshot: TrafficSnapshot the search used (default: current)
+        """
+        if snapshot is None:
+            snapshot = compiled.traffic_snapshot
+        weights = snapshot.weights
+        node_ids = compiled.node_ids
+        targets = compiled.targets
+        return cls(
+            nodes=[node_ids[source]] + [node_ids[targets[edge]] for edge in edges],
+            edge_ids=[compiled.edge_ids[edge] for edge in edges],
+            edge_times=[float(weights[edge]) for edge in edges],
+            edge_lengths=[float(compiled.lengths[edge]) for edge in edges],
+            total_time=total_time,
+            traffic_version=snapshot.version
+        )
+
+    @property
+    def path(self):
+        """Intersection IDs from start to end, or None if unreachable"""
+        return self.nodes
+
+    @property
+    def found(self):
+        return self.nodes is not None
+
+    @property
+    def total_distance(self):
+        """Length of the route in meters"""
+        return self.cumulative_distances[-1]
+
+    def __iter__(self):
+        yield self.nodes
+        yield self.total_time
+
+    def __getitem__(self, index):
+        return (self.nodes, self.total_time)[index]
+
+    def __len__(self):
+        return 2
+
+    def __eq__(self, other):
+        if isinstance(other, Route):
+            return (self.nodes == other.nodes and self.edge_ids == other.edge_ids
+                    and self.total_time == other.total_time)
+        if isinstance(other, tuple):
+            return tuple(self) == other
+        return NotImplemented
+
+    def __repr__(self):
+        if not self.found:
+            return "Route(unreachable)"
+        return f"Route({len(self.edge_ids)} roads, {self.total_time:.4f} h, {self.total_distance:.0f} m)"
+
+    def directions(self, map_data):
+        """
+        Turn-by-turn directions in one pass over the roads used
+
+        Args:
+            map_data: MapData (or any graph with `roads` and describe())
+
+        Returns:
+            List of dicts with direction, road_name, next_intersection,
+            distance, traffic_status, current_node and next_node
+        """
+        directions = []
+        if not self.found:
+            return directions
+
+        prev_road_name = None
+        for i, road_id in enumerate(self.edge_ids):
+            road = map_data.roads[road_id]
+            road_name = road.name if road.name else "unnamed road"
+            if isinstance(road_name, list):
+                road_name = road_name[0] if road_name else "unnamed road"
+
+            traffic_level = road.current_traffic
+            if traffic_level > 1.8:
+                traffic_status = "heavy traffic"
+            elif traffic_level > 1.2:
+                traffic_status = "moderate traffic"
+            else:
+                traffic_status = "light traffic"
+
+            if i == 0:
+                direction = "Start on"
+            else:
+                direction = "Continue on" if prev_road_name == road_name else "Turn onto"
+
+            directions.append({
+                "direction": direction,
+                "road_name": road_name,
+                "next_intersection": map_data.describe(self.nodes[i + 1]),
+                "distance": road.length,
+                "traffic_status": traffic_status,
+                "current_node": self.nodes[i],
+                "next_node": self.nodes[i + 1]
+            })
+            prev_road_name = road_name
+        return directions
@@ -18,14 +18,55 @@ def load_config(config_path="config/config.yaml"):
             },
             "traffic": {
                 "api_key": "",
-                "update_interval": 300
+                "update_interval": 300,
+                "tile_degrees": 0.1,
+                "fetch_workers": 4,
+                "request_timeout": 10,
+                "request_retries": 2,
+                "fetch_deadline": 30,
+                "delta_threshold": 0.05,
+                "history": {
+                    "enabled": True,
+                    "path": "cache/traffic_history",
+                    "segment_rows": 96,
+                    "retention_days": 90,
+                    "downsample_after_days": 14,
+                    "restore_max_age": 3600
+                }
             },
             "routing": {
                 "default_algorithm": "a_star",
-                "default_travel_mode": "car"
+                "heuristic": "haversine",
+                "landmarks": 16,
+                "landmark_strategy": "avoid",
+                "engine": "csr",
+                "customizable": True,
+                "default_travel_mode": "car",
+                "max_matrix_elements": 10000,
+                "max_isochrone_minutes": 60,
+                "max_batch_pairs": 10000,
+                "batch_processes": 0,
+                "max_alternatives": 3
+            },
+            "route_cache": {
+                "enabled": True,
+                "max_entries": 1024,
+                "ttl": 300,
+                "backend": "memory",
+                "path": "cache/routes.sqlite"
+            },
+            "geocoding": {
+                "cache_enabled": True,
+                "cache_path": "cache/geocode.sqlite",
+                "ttl": 2592000,
+                "negative_ttl": 86400,
+                "max_entries": 100000,
+                "max_suggestions": 20
             },
             "visualization": {
                 "default_map_zoom": 14,
-                "show_traffic_colors": True
+                "show_traffic_colors": True,
+                "base_layer_dir": "static/maps",
+                "max_cache_mb": 50
             }
         }
\ No newline at end of file
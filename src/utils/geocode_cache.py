@@ -0,0 +1,261 @@
+# src/utils/geocode_cache.py
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = "cache/geocode.sqlite"
+DEFAULT_TTL = 30 * 86400          # seconds a found address stays cached
+DEFAULT_NEGATIVE_TTL = 86400      # seconds an address that was not found stays cached
+DEFAULT_MAX_ENTRIES = 100000
+
+# Returned by GeocodeCache.get when there is no usable entry, as opposed to
+# None for an address cached as not found
+MISSING = object()
+
+# Spellings folded together so equivalent addresses share one cache entry
+ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "av": "ave", "drive": "dr", "road": "rd",
+    "boulevard": "blvd", "lane": "ln", "parkway": "pkwy", "place": "pl",
+    "court": "ct", "highway": "hwy", "freeway": "fwy", "circle": "cir",
+    "terrace": "ter", "north": "n", "south": "s", "east": "e", "west": "w",
+    "and": "&"
+}
+
+
+def address_words(address):
+    """Lowercase words of an address, with punctuation dropped and "&" kept as a word"""
+    return re.sub(r"[^\w&]+", " ", address.lower().replace("&", " & ")).split()
+
+
+def normalize_address(address):
+    """
+    Canonical form of an address for cache keys
+
+    Lowercases, turns punctuation into spaces, abbreviates street types and
+    directions and collapses whitespace, so "Mill Avenue & University Drive,
+    Tempe" and "mill ave and university dr tempe" give the same key.
+    """
+    return " ".join(ABBREVIATIONS.get(word, word) for word in address_words(address))
+
+
+class GeocodeCache:
+    """
+    Geocoding results on disk, shared by every worker and kept across restarts
+
+    Backed by SQLite with write-ahead logging, like SQLiteRouteBackend.
+    Entries are keyed by normalize_address and expire after ttl seconds, or
+    negative_ttl for addresses the geocoder could not find (cached so they
+    are not looked up again on every request). Once more than max_entries
+    are stored, the least recently used are evicted; the size is checked
+    every PURGE_EVERY puts, so it can briefly run over by that many.
+
+    Use ":memory:" as the path for a cache private to this process.
+    """
+
+    PURGE_EVERY = 64  # puts between expiry and size checks
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            "key TEXT PRIMARY KEY, lat REAL, lon REAL, expires REAL, last_used REAL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS geocodes_last_used ON geocodes (last_used)"
+        )
+        self._connection.commit()
+        self._puts = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, address):
+        """
+        Look up an address
+
+        Returns:
+            (lat, lon) if cached as found, None if cached as not found,
+            or MISSING if there is no unexpired entry
+        """
+        key = normalize_address(address)
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT lat, lon FROM geocodes WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return MISSING
+                self._connection.execute(
+                    "UPDATE geocodes SET last_used = ? WHERE key = ?", (now, key)
+                )
+                self._connection.commit()
+                if row[0] is None:
+                    self.negative_hits += 1
+                    return None
+                self.hits += 1
+                return (row[0], row[1])
+        except sqlite3.Error as e:
+            print(f"Geocode cache error: {e}")
+            return MISSING
+
+    def put(self, address, coordinates, ttl=None):
+        """
+        Cache a result
+
+        Args:
+            address: Address as given to the geocoder
+            coordinates: (lat, lon), or None if the address was not found
+            ttl: Seconds to keep it (default: ttl or negative_ttl)
+        """
+        if ttl is None:
+            ttl = self.ttl if coordinates is not None else self.negative_ttl
+        lat, lon = coordinates if coordinates is not None else (None, None)
+        now = time.time()
+        try:
+            with self._lock:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO geocodes (key, lat, lon, expires, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (normalize_address(address), lat, lon, now + ttl, now)
+                )
+                self._puts += 1
+                if self._puts % self.PURGE_EVERY == 0:
+                    self._purge(now)
+                self._connection.commit()
+        except sqlite3.Error as e:
+            print(f"Geocode cache error: {e}")
+
+    def _purge(self, now):
+        """Drop expired rows, then the least recently used beyond max_entries (lock held)"""
+        self._connection.execute("DELETE FROM geocodes WHERE expires <= ?", (now,))
+        excess = self._connection.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._connection.execute(
+                "DELETE FROM geocodes WHERE key IN "
+                "(SELECT key FROM geocodes ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+    def purge(self):
+        """Apply expiry and the size limit now"""
+        with self._lock:
+            self._purge(time.time())
+            self._connection.commit()
+
+    def stats(self):
+        """Hit/miss counters of this process and the shared size"""
+        with self._lock:
+            size, negative = self._connection.execute(
+                "SELECT COUNT(*), COUNT(*) - COUNT(lat) FROM geocodes WHERE expires > ?",
+                (time.time(),)
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "size": size,
+            "negative_entries": negative,
+            "max_entries": self.max_entries
+        }
+
+
+def create_geocode_cache(config):
+    """
+    Build the geocoding cache from the `geocoding` config section
+
+    Returns:
+        GeocodeCache, persistent unless the section disables it
+    """
+    settings = config.get('geocoding', {})
+    if not settings.get('cache_enabled', True):
+        return GeocodeCache(":memory:")
+    return GeocodeCache(
+        path=settings.get('cache_path', DEFAULT_PATH),
+        ttl=settings.get('ttl', DEFAULT_TTL),
+        negative_ttl=settings.get('negative_ttl', DEFAULT_NEGATIVE_TTL),
+        max_entries=settings.get('max_entries', DEFAULT_MAX_ENTRIES)
+    )
+
+
+def main(argv=None):
+    """Command line interface: warm, preload or inspect the geocoding cache"""
+    from .geocoding import GeocodingService
+
+    parser = argparse.ArgumentParser(
+        prog="python -m src.utils.geocode_cache",
+        description="Fill and inspect the persistent geocoding cache"
+    )
+    parser.add_argument("command", choices=["warm", "preload", "stats", "purge"],
+                        help="warm: geocode every address in FILE (one per line) that is "
+                             "not cached yet, preload: store known coordinates from a CSV "
+                             "of address,lat,lon, stats: describe the cache, "
+                             "purge: drop expired and excess entries")
+    parser.add_argument("file", nargs="?")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--city", default="Tempe, AZ")
+    parser.add_argument("--delay", type=float, default=1.0,
+                        help="Seconds between geocoder requests (Nominatim allows one per second)")
+    args = parser.parse_args(argv)
+
+    cache = GeocodeCache(args.path)
+    if args.command in ("warm", "preload") and not args.file:
+        parser.error(f"{args.command} needs a file")
+
+    if args.command == "stats":
+        print(cache.stats())
+        return 0
+    if args.command == "purge":
+        cache.purge()
+        print(cache.stats())
+        return 0
+
+    if args.command == "preload":
+        count = 0
+        with open(args.file, newline='') as file:
+            for row in csv.reader(file):
+                if len(row) < 3 or row[0].startswith('#'):
+                    continue
+                try:
+                    coordinates = (float(row[1]), float(row[2]))
+                except ValueError:
+                    continue  # Header or malformed row
+                # Keyed like the lookups, which add the city
+                cache.put(GeocodingService.full_address(row[0], args.city), coordinates)
+                count += 1
+        print(f"Preloaded {count} addresses into {args.path}")
+        return 0
+
+    geocoding = GeocodingService(cache=cache)
+    with open(args.file) as file:
+        addresses = [line.strip() for line in file if line.strip() and not line.startswith('#')]
+    fetched = found = 0
+    for address in addresses:
+        if cache.get(geocoding.full_address(address, args.city)) is not MISSING:
+            continue
+        if fetched:
+            time.sleep(args.delay)
+        fetched += 1
+        if geocoding.address_to_coordinates(address, city=args.city) is not None:
+            found += 1
+    print(f"Warmed {args.path}: {len(addresses) - fetched} already cached, "
+          f"{fetched} looked up, {found} found")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,12 +3,27 @@ from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import time
 
+from .geocode_cache import MISSING, GeocodeCache
+from .spatial_index import get_spatial_index
+
 class GeocodingService:
     """Convert between addresses and coordinates"""
     
-    def __init__(self, user_agent="traffic_routing_app"):
+    def __init__(self, user_agent="traffic_routing_app", cache=None, street_index=None):
         self.geolocator = Nominatim(user_agent=user_agent)
-        self.cache = {}  # Simple cache to avoid repeated queries
+        # Results (and misses) by normalized address; pass a persistent
+        # GeocodeCache to share them between workers and restarts
+        self.cache = cache if cache is not None else GeocodeCache(":memory:")
+        # StreetIndex of the loaded map: streets and intersections on it are
+        # answered locally, only other addresses go to Nominatim
+        self.street_index = street_index
+    
+    @staticmethod
+    def full_address(address, city="Tempe, AZ"):
+        """The address with city context added if it does not name the city"""
+        if city.lower() not in address.lower():
+            return f"{address}, {city}"
+        return address
     
     def address_to_coordinates(self, address, city="Tempe, AZ"):
         """
@@ -21,15 +36,18 @@ class GeocodingService:
         Returns:
             Tuple of (latitude, longitude) or None if not found
         """
+        if self.street_index is not None:
+            local = self.street_index.lookup(address, city)
+            if local is not None:
+                return local
+            
         # Add city context if not specified
-        if city.lower() not in address.lower():
-            full_address = f"{address}, {city}"
-        else:
-            full_address = address
+        full_address = self.full_address(address, city)
             
-        # Check cache
-        if full_address in self.cache:
-            return self.cache[full_address]
+        # Check cache; addresses cached as not found return None
+        cached = self.cache.get(full_address)
+        if cached is not MISSING:
+            return cached
             
         try:
             # Geocode the address
@@ -37,21 +55,22 @@ class GeocodingService:
             
             if location:
                 result = (location.latitude, location.longitude)
-                self.cache[full_address] = result
+                self.cache.put(full_address, result)
                 return result
             else:
                 print(f"Could not find coordinates for '{full_address}'")
+                self.cache.put(full_address, None)
                 return None
                 
         except (GeocoderTimedOut, GeocoderServiceError) as e:
             print(f"Geocoding error: {e}")
-            # Retry once with backoff
+            # Retry once with backoff; errors are not cached
             time.sleep(2)
             try:
                 location = self.geolocator.geocode(full_address, timeout=10)
                 if location:
                     result = (location.latitude, location.longitude)
-                    self.cache[full_address] = result
+                    self.cache.put(full_address, result)
                     return result
             except:
                 pass
@@ -70,15 +89,5 @@ class GeocodingService:
         Returns:
             Intersection ID of the nearest intersection
         """
-        nearest_id = None
-        min_distance = float('inf')
-        
-        for node_id, intersection in map_data.intersections.items():
-            distance = ((intersection.lat - lat) ** 2 + 
-                        (intersection.lon - lon) ** 2)
-            
-            if distance < min_distance:
-                min_distance = distance
-                nearest_id = node_id
-                
-        return nearest_id
\ No newline at end of file
+        nearest = get_spatial_index(map_data).nearest(lat, lon, 1)
+        return nearest[0][0] if nearest else None
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     """
     Calculate the great-circle distance between two points
@@ -37,4 +39,17 @@ def get_center_point(locations):
     lon_sum = sum(lon for _, lon in locations)
     count = len(locations)
     
-    return (lat_sum / count, lon_sum / count)
\ No newline at end of file
+    return (lat_sum / count, lon_sum / count)
+
+def haversine_distances(lat, lon, lats, lons):
+    """
+    Vectorized haversine_distance from one point to arrays of points
+    
+    Returns:
+        NumPy array of distances in kilometers
+    """
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats = np.radians(lats)
+    lons = np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0))) * 6371
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from ..data.graph_builder import get_compiled_graph
+
+DEFAULT_DIRECTORY = "static/maps"
+DEFAULT_MAX_MB = 50
+
+# (name, upper bound on the multiplier, color, line weight, opacity), the
+# same classes create_map_visualization has always drawn
+TRAFFIC_LEVELS = (
+    ("light", 1.2, "green", 2, 0.7),
+    ("moderate", 1.8, "orange", 2, 0.7),
+    ("heavy", float('inf'), "red", 3, 0.9),
+)
+
+
+def traffic_levels(traffic):
+    """Index into TRAFFIC_LEVELS of each multiplier"""
+    bounds = [upper for _, upper, _, _, _ in TRAFFIC_LEVELS[:-1]]
+    return np.searchsorted(bounds, traffic, side='right')
+
+
+def traffic_geojson(map_data):
+    """
+    Every road colored by its current traffic, as a GeoJSON FeatureCollection
+
+    Roads are grouped into one MultiLineString per traffic level, so the
+    layer has three features however large the city is.
+
+    Args:
+        map_data: MapData (or any graph get_compiled_graph accepts)
+
+    Returns:
+        GeoJSON dict
+    """
+    compiled = get_compiled_graph(map_data)
+    sources = compiled.sources()
+    # GeoJSON positions are [lon, lat]
+    segments = np.stack([
+        np.column_stack([compiled.lons[sources], compiled.lats[sources]]),
+        np.column_stack([compiled.lons[compiled.targets], compiled.lats[compiled.targets]])
+    ], axis=1).round(6)
+
+    features = []
+    lower = -np.inf
+    for name, upper, color, weight, opacity in TRAFFIC_LEVELS:
+        selected = (compiled.traffic >= lower) & (compiled.traffic < upper)
+        lower = upper
+        if not selected.any():
+            continue
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "MultiLineString", "coordinates": segments[selected].tolist()},
+            "properties": {
+                "traffic": name,
+                "color": color,
+                "weight": weight,
+                "opacity": opacity,
+                "roads": int(selected.sum())
+            }
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+class BaseLayerCache:
+    """
+    Pre-rendered traffic base layer, regenerated only when traffic changes
+
+    The layer is written once per traffic state as
+    <directory>/traffic_<key>.geojson, where the key is the traffic
+    fingerprint (so worker processes with the same traffic share a file).
+    Routes are drawn on top of it by the client from the small per-request
+    route payload. Files of older traffic states are deleted, oldest first,
+    once the directory grows past max_bytes.
+
+    Subscribed to TrafficData, an update that moves no road into another
+    traffic level keeps the current file (see apply_delta), since the
+    layer only shows levels.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, url_prefix=None,
+                 max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        if url_prefix is None:
+            # Served by Flask's static route when directory is under static/
+            url_prefix = "/" + directory.replace(os.sep, "/").strip("/")
+        self.url_prefix = url_prefix.rstrip('/')
+        self.max_bytes = max_bytes
+        self._current = None  # (key, filename)
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.evictions = 0
+        self.reuses = 0
+
+    @staticmethod
+    def _key(traffic):
+        if traffic is None:
+            return "free-flow"
+        return traffic.fingerprint or f"v{traffic.version}"
+
+    def url(self, map_data, traffic=None):
+        """
+        URL of the base layer for the current traffic, rendering it if needed
+
+        Args:
+            map_data: MapData
+            traffic: TrafficData, or None for free-flow colors
+        """
+        return f"{self.url_prefix}/{self.filename(map_data, traffic)}"
+
+    def attach(self, response, map_data, traffic=None):
+        """Copy of a route response with the current base_layer_url added"""
+        return dict(response, base_layer_url=self.url(map_data, traffic))
+
+    def filename(self, map_data, traffic=None):
+        """File name (inside directory) of the base layer for the current traffic"""
+        key = self._key(traffic)
+        with self._lock:
+            if self._current is not None and self._current[0] == key:
+                return self._current[1]
+
+            filename = f"traffic_{key}.geojson"
+            path = os.path.join(self.directory, filename)
+            if not os.path.exists(path):
+                os.makedirs(self.directory, exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w') as file:
+                    json.dump(traffic_geojson(map_data), file, separators=(',', ':'))
+                os.replace(temp_path, path)
+                self.renders += 1
+            else:
+                # Reused from an earlier run or another worker; mark as recent
+                os.utime(path)
+            self._current = (key, filename)
+            self._evict(keep=filename)
+            return filename
+
+    def apply_delta(self, delta):
+        """
+        Keep the current layer for new traffic that colors every road the same
+
+        Args:
+            delta: TrafficDelta; its snapshot becomes an alias of the
+                current file if the file was rendered for the previous one
+                and no changed road crossed a level boundary
+        """
+        if (traffic_levels(delta.before) != traffic_levels(delta.after)).any():
+            return
+        with self._lock:
+            if self._current is not None and self._current[0] == self._key(delta.previous):
+                self._current = (self._key(delta.snapshot), self._current[1])
+                self.reuses += 1
+
+    def _evict(self, keep):
+        """Delete the oldest generated files until the directory fits max_bytes (lock held)"""
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.startswith("traffic_"):
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+            total += stat.st_size
+
+        for _, size, path, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+
+def create_base_layer_cache(config):
+    """Build the base layer cache from the `visualization` config section"""
+    settings = config.get('visualization', {})
+    return BaseLayerCache(
+        directory=settings.get('base_layer_dir', DEFAULT_DIRECTORY),
+        max_bytes=int(settings.get('max_cache_mb', DEFAULT_MAX_MB) * 1024 * 1024)
+    )
@@ -0,0 +1,186 @@
+import math
+
+import numpy as np
+
+from .geospatial import haversine_distances
+
+EARTH_RADIUS_KM = 6371
+
+
+class SpatialIndex:
+    """
+    Uniform grid over intersections for nearest-neighbour and radius queries
+
+    Coordinates are projected to kilometres (equirectangular around the
+    map's mean latitude, which is accurate to well under 1% across a city)
+    and bucketed into square cells. Points are stored sorted by cell, row
+    by row, so the points of a horizontal run of cells are one contiguous
+    slice and a rectangular block is one slice per row.
+
+    Distances returned by nearest() and within() are haversine distances
+    in kilometres, like src.utils.geospatial.haversine_distance.
+    """
+
+    def __init__(self, node_ids, lats, lons, cell_size=None):
+        self.node_ids = list(node_ids)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        n = len(self.node_ids)
+
+        self.lat0 = float(self.lats.mean()) if n else 0.0
+        self.km_per_degree_lat = EARTH_RADIUS_KM * math.pi / 180
+        self.km_per_degree_lon = self.km_per_degree_lat * math.cos(math.radians(self.lat0))
+        x, y = self._project(self.lats, self.lons)
+        self.x_min = float(x.min()) if n else 0.0
+        self.y_min = float(y.min()) if n else 0.0
+        width = float(x.max()) - self.x_min if n else 0.0
+        height = float(y.max()) - self.y_min if n else 0.0
+
+        if cell_size is None:
+            # About four points per cell on average
+            cell_size = math.sqrt(max(width * height, 1e-6) / max(n, 1) * 4)
+        self.cell_size = max(cell_size, 1e-3)
+        self.columns = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+
+        column = ((x - self.x_min) / self.cell_size).astype(np.int64)
+        row = ((y - self.y_min) / self.cell_size).astype(np.int64)
+        cell = row * self.columns + column
+        self.order = np.argsort(cell, kind='stable')
+        # Points of cell c are order[cell_start[c]:cell_start[c + 1]]
+        self.cell_start = np.searchsorted(cell[self.order],
+                                          np.arange(self.rows * self.columns + 1))
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @classmethod
+    def from_graph(cls, graph, cell_size=None):
+        """Index every intersection of a graph (e.g. MapData)"""
+        compiled = getattr(graph, 'compiled_graph', None)
+        if compiled is not None:
+            return cls(compiled.node_ids, compiled.lats, compiled.lons, cell_size)
+        node_ids = list(graph.intersections)
+        return cls(
+            node_ids,
+            [graph.intersections[n].lat for n in node_ids],
+            [graph.intersections[n].lon for n in node_ids],
+            cell_size
+        )
+
+    def _project(self, lats, lons):
+        return lons * self.km_per_degree_lon, lats * self.km_per_degree_lat
+
+    def _cell_of(self, lat, lon):
+        x, y = self._project(lat, lon)
+        return (math.floor((x - self.x_min) / self.cell_size),
+                math.floor((y - self.y_min) / self.cell_size))
+
+    def _block(self, column_min, column_max, row_min, row_max):
+        """Indices of all points in a rectangle of cells (bounds inclusive)"""
+        column_min = max(column_min, 0)
+        column_max = min(column_max, self.columns - 1)
+        row_min = max(row_min, 0)
+        row_max = min(row_max, self.rows - 1)
+        if column_min > column_max or row_min > row_max:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(row_min, row_max + 1) * self.columns
+        starts = self.cell_start[rows + column_min]
+        ends = self.cell_start[rows + column_max + 1]
+        return np.concatenate([self.order[s:e] for s, e in zip(starts.tolist(), ends.tolist())])
+
+    def _covers_grid(self, column, row, radius):
+        return (column - radius <= 0 and row - radius <= 0 and
+                column + radius >= self.columns - 1 and row + radius >= self.rows - 1)
+
+    def _results(self, candidates, distances, limit=None):
+        by_distance = np.argsort(distances, kind='stable')
+        if limit is not None:
+            by_distance = by_distance[:limit]
+        node_ids = self.node_ids
+        return [(node_ids[i], d) for i, d in
+                zip(candidates[by_distance].tolist(), distances[by_distance].tolist())]
+
+    def nearest(self, lat, lon, k=1):
+        """
+        The k intersections closest to a point
+
+        Args:
+            lat: Latitude
+            lon: Longitude
+            k: Number of intersections to return
+
+        Returns:
+            List of (node_id, distance_km) tuples, closest first
+        """
+        if not self.node_ids or k <= 0:
+            return []
+        column, row = self._cell_of(lat, lon)
+        # Start at the ring that first touches the grid
+        radius = max(0, -column, -row, column - self.columns + 1, row - self.rows + 1)
+        while True:
+            candidates = self._block(column - radius, column + radius, row - radius, row + radius)
+            covers_grid = self._covers_grid(column, row, radius)
+            if len(candidates) >= k or covers_grid:
+                distances = haversine_distances(lat, lon, self.lats[candidates], self.lons[candidates])
+                if covers_grid:
+                    break
+                kth = np.partition(distances, k - 1)[k - 1]
+                # Every point outside the block is at least radius cells away;
+                # the margin absorbs the projection error
+                if kth <= radius * self.cell_size * 0.99:
+                    break
+            radius += 1
+        return self._results(candidates, distances, limit=k)
+
+    def within(self, lat, lon, radius_km, limit=None):
+        """
+        Intersections within a haversine radius of a point
+
+        Args:
+            lat: Latitude
+            lon: Longitude
+            radius_km: Search radius in kilometres
+            limit: Optional maximum number of results
+
+        Returns:
+            List of (node_id, distance_km) tuples, closest first
+        """
+        if not self.node_ids:
+            return []
+        column, row = self._cell_of(lat, lon)
+        cells = math.ceil(radius_km * 1.01 / self.cell_size)
+        candidates = self._block(column - cells, column + cells, row - cells, row + cells)
+        distances = haversine_distances(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = distances <= radius_km
+        return self._results(candidates[inside], distances[inside], limit)
+
+    def within_degrees(self, lat, lon, radius, limit=None):
+        """
+        Intersections within a radius measured in raw degrees
+
+        Same flat sqrt(dlat^2 + dlon^2) distance the explore-area views have
+        always used, so their `radius` parameter keeps its meaning.
+
+        Returns:
+            List of (node_id, distance_degrees) tuples, closest first
+        """
+        if not self.node_ids:
+            return []
+        column, row = self._cell_of(lat, lon)
+        column_cells = math.ceil(radius * self.km_per_degree_lon / self.cell_size)
+        row_cells = math.ceil(radius * self.km_per_degree_lat / self.cell_size)
+        candidates = self._block(column - column_cells, column + column_cells,
+                                 row - row_cells, row + row_cells)
+        distances = np.hypot(self.lats[candidates] - lat, self.lons[candidates] - lon)
+        inside = distances < radius
+        return self._results(candidates[inside], distances[inside], limit)
+
+
+def get_spatial_index(graph):
+    """Return the graph's spatial index, building and caching it on first use"""
+    index = getattr(graph, 'spatial_index', None)
+    if index is None or len(index) != len(graph.intersections):
+        index = SpatialIndex.from_graph(graph)
+        graph.spatial_index = index
+    return index
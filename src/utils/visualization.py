@@ -7,6 +7,8 @@ except ImportError:
 
 import matplotlib.pyplot as plt
 
+from .map_layers import traffic_geojson
+
 def create_map_visualization(map_data, path=None, traffic_data=None, 
                            output_file="route_map.html"):
     """
@@ -23,34 +25,17 @@ def create_map_visualization(map_data, path=None, traffic_data=None,
     # Create map
     m = folium.Map(location=[center_lat, center_lon], zoom_start=14)
     
-    # Add all roads with traffic colors if available
-    for road_id, road in map_data.roads.items():
-        start = road.start
-        end = road.end
-        
-        color = 'gray'
-        weight = 2
-        opacity = 0.7
-        
-        # Color based on traffic if available
-        traffic_level = road.current_traffic
-        if traffic_level < 1.2:
-            color = 'green'  # Light traffic
-        elif traffic_level < 1.8:
-            color = 'orange'  # Moderate traffic
-        else:
-            color = 'red'  # Heavy traffic
-            weight = 3
-            opacity = 0.9
-            
-        # Draw road line
-        folium.PolyLine(
-            locations=[(start.lat, start.lon), (end.lat, end.lon)],
-            color=color,
-            weight=weight,
-            opacity=opacity,
-            tooltip=f"{road.name or 'Unnamed'}: {traffic_level:.1f}x"
-        ).add_to(m)
+    # Add all roads with traffic colors, as one GeoJSON layer rather
+    # than a PolyLine per road
+    folium.GeoJson(
+        traffic_geojson(map_data),
+        name="Traffic",
+        style_function=lambda feature: {
+            "color": feature["properties"]["color"],
+            "weight": feature["properties"]["weight"],
+            "opacity": feature["properties"]["opacity"]
+        }
+    ).add_to(m)
     
     # Add route if provided
     if path:
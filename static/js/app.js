@@ -4,8 +4,13 @@ document.addEventListener('DOMContentLoaded', function() {
     let map;
     let mapCenter = [33.4255, -111.9400]; // Default center (Tempe, AZ)
     let startMarker, endMarker, routeLine;
+    let trafficLayer = null;
+    let trafficLayerUrl = null;
+    let showTraffic = false;
     let selectedStartNode = null;
     let selectedEndNode = null;
+    let autocompleteTimers = {};
+    let autocompleteRequests = { start: 0, end: 0 };
     
     // Initialize map
     initMap();
@@ -106,6 +111,15 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
         
+        // Suggest streets and intersections while typing
+        document.getElementById('start-location').addEventListener('input', function() {
+            scheduleAutocomplete(this.value, 'start');
+        });
+        
+        document.getElementById('end-location').addEventListener('input', function() {
+            scheduleAutocomplete(this.value, 'end');
+        });
+        
         // Clear selected locations
         document.querySelector('#selected-start .location-clear').addEventListener('click', function() {
             clearSelectedLocation('start');
@@ -134,8 +148,74 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('view-traffic-map').addEventListener('click', viewTrafficMap);
     }
     
+    // Ask for suggestions once typing pauses briefly
+    function scheduleAutocomplete(query, type) {
+        clearTimeout(autocompleteTimers[type]);
+        autocompleteTimers[type] = setTimeout(() => autocomplete(query, type), 80);
+    }
+    
+    // Suggest matching streets and intersections from the loaded map
+    function autocomplete(query, type) {
+        // Responses to earlier keystrokes that arrive late are ignored
+        const request = ++autocompleteRequests[type];
+        if (!query.trim()) {
+            showSuggestions([], type);
+            return;
+        }
+        
+        fetch(`/api/autocomplete?q=${encodeURIComponent(query)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (request !== autocompleteRequests[type]) {
+                return;
+            }
+            showSuggestions(data.suggestions || [], type);
+        })
+        .catch(error => {
+            console.error('Error fetching suggestions:', error);
+        });
+    }
+    
+    // Show suggestions; picking one selects its node without geocoding
+    function showSuggestions(suggestions, type) {
+        const resultsContainer = document.getElementById(`${type}-results`);
+        resultsContainer.innerHTML = '';
+        
+        if (suggestions.length === 0) {
+            resultsContainer.style.display = 'none';
+            return;
+        }
+        
+        suggestions.forEach(suggestion => {
+            const resultItem = document.createElement('div');
+            resultItem.className = 'search-result-item';
+            
+            const description = document.createElement('div');
+            description.className = 'result-description';
+            description.textContent = suggestion.description;
+            const kind = document.createElement('div');
+            kind.className = 'result-distance';
+            kind.textContent = suggestion.kind === 'intersection' ? 'Intersection' : 'Street';
+            resultItem.appendChild(description);
+            resultItem.appendChild(kind);
+            
+            resultItem.addEventListener('click', function() {
+                selectNode(suggestion, type);
+                resultsContainer.style.display = 'none';
+                map.panTo([suggestion.lat, suggestion.lon]);
+            });
+            
+            resultsContainer.appendChild(resultItem);
+        });
+        
+        resultsContainer.style.display = 'block';
+    }
+    
     // Search for a location
     function searchLocation(location, type) {
+        // A full search replaces any pending suggestions
+        clearTimeout(autocompleteTimers[type]);
+        autocompleteRequests[type]++;
         fetch('/api/geocode', {
             method: 'POST',
             headers: {
@@ -362,6 +442,11 @@ document.addEventListener('DOMContentLoaded', function() {
         map.fitBounds(routeLine.getBounds(), {
             padding: [50, 50]
         });
+        
+        // The route was computed for this traffic; keep the layer in step
+        if (showTraffic && routeData.base_layer_url) {
+            loadTrafficLayer(routeData.base_layer_url);
+        }
     }
     
     // Show route info
@@ -577,6 +662,10 @@ document.addEventListener('DOMContentLoaded', function() {
             // Show success message
             alert('Traffic data updated successfully!');
             
+            if (showTraffic) {
+                refreshTrafficLayer();
+            }
+            
             // If we have a route displayed, refresh it
             if (selectedStartNode && selectedEndNode) {
                 findRoute();
@@ -590,10 +679,62 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // View traffic map
+    // Toggle the traffic-colored road layer
     function viewTrafficMap() {
-        // Create and open traffic map in a new tab/window
-        window.open('/static/traffic_map.html', '_blank');
+        showTraffic = !showTraffic;
+        if (!showTraffic) {
+            if (trafficLayer) {
+                map.removeLayer(trafficLayer);
+            }
+            return;
+        }
+        if (trafficLayer) {
+            trafficLayer.addTo(map);
+        }
+        refreshTrafficLayer();
+    }
+    
+    // Ask the server which base layer matches the current traffic
+    function refreshTrafficLayer() {
+        fetch('/api/map/base-layer')
+            .then(response => response.json())
+            .then(data => loadTrafficLayer(data.url))
+            .catch(error => {
+                console.error('Error loading traffic layer:', error);
+            });
+    }
+    
+    // Load a pre-rendered base layer; files are fixed per traffic state,
+    // so an unchanged URL needs no request at all
+    function loadTrafficLayer(url) {
+        if (url === trafficLayerUrl) {
+            return;
+        }
+        fetch(url)
+            .then(response => response.json())
+            .then(data => {
+                if (trafficLayer) {
+                    map.removeLayer(trafficLayer);
+                }
+                trafficLayer = L.geoJSON(data, {
+                    interactive: false,
+                    style: feature => ({
+                        color: feature.properties.color,
+                        weight: feature.properties.weight,
+                        opacity: feature.properties.opacity
+                    })
+                });
+                trafficLayerUrl = url;
+                if (showTraffic) {
+                    trafficLayer.addTo(map);
+                    if (routeLine) {
+                        routeLine.bringToFront();
+                    }
+                }
+            })
+            .catch(error => {
+                console.error('Error loading traffic layer:', error);
+            });
     }
     
     // Format date and time
@@ -0,0 +1,34 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data.map_data import MapData
+
+
+class FakeTraffic:
+    """Just the version/fingerprint TrafficData exposes"""
+
+    def __init__(self, version=1, fingerprint="a1"):
+        self.version = version
+        self.fingerprint = fingerprint
+
+
+def build_test_map():
+    """3x3 demo grid from MapData, without touching the network"""
+    map_data = MapData()
+    map_data._create_test_graph()
+    map_data.compile_graph()
+    return map_data
+
+
+@pytest.fixture
+def make_test_map():
+    """Builds a fresh demo grid per call, for tests that need more than one"""
+    return build_test_map
+
+
+@pytest.fixture
+def fake_traffic():
+    """The FakeTraffic class, to build traffic states with given versions"""
+    return FakeTraffic
@@ -0,0 +1,428 @@
+"""
+Routing and map loading benchmarks on generated networks of 1k to 1M nodes
+
+    pytest tests/test_benchmarks.py
+    BENCHMARK_SIZES=1k,10k,100k,1m pytest tests/test_benchmarks.py
+
+Each benchmark records queries (or queue operations) per second, settled
+nodes per query and the peak memory a batch allocates in
+benchmark.extra_info, and compares them with the stored baseline: it
+fails if throughput dropped, or settled nodes or memory grew, by more
+than BENCHMARK_THRESHOLD. Run with BENCHMARK_SAVE=1 to record the
+baseline on the machine that will compare against it.
+"""
+import pytest
+import json
+import math
+import sys
+import os
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+# Timing needs the pytest-benchmark plugin (pip install pytest-benchmark)
+pytest.importorskip("pytest_benchmark")
+
+from src.algorithms.a_star import a_star
+from src.algorithms.dijkstra import dijkstra
+from src.algorithms.priority_queue import PriorityQueue
+from src.data.graph_builder import CompiledGraph
+from src.data.map_data import MapData
+from src.data.snapshot import GraphSnapshot, snapshot_path
+from src.models.intersection import Intersection
+from src.models.road import Road
+
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+SELECTED_SIZES = os.environ.get("BENCHMARK_SIZES", "1k,10k").lower().split(",")
+QUERIES = {"1k": 50, "10k": 20, "100k": 5, "1m": 2}    # Route queries per timed batch
+ROUNDS = {"1k": 5, "10k": 3, "100k": 1, "1m": 1}
+OBJECTS_MAX_NODES = 100000  # Larger networks are only searched on the csr engine
+
+BASELINE_PATH = os.environ.get(
+    "BENCHMARK_BASELINE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+)
+THRESHOLD = float(os.environ.get("BENCHMARK_THRESHOLD", "0.2"))
+SAVE_BASELINE = os.environ.get("BENCHMARK_SAVE") == "1"
+HIGHER_IS_BETTER = {"queries_per_sec", "operations_per_sec"}
+
+ORIGIN = (33.40, -111.95)  # Generated networks sit where the demo city does
+STREET_NAMES = 500         # Distinct names given to the roads of snapshot benchmarks
+METERS_PER_DEGREE = 111320.0
+SPACING = 100.0            # Meters between neighboring intersections
+
+
+def size_params():
+    """Every size, those not in BENCHMARK_SIZES marked as skipped"""
+    return [
+        pytest.param(size, id=size, marks=pytest.mark.skipif(
+            size not in SELECTED_SIZES, reason=f"set BENCHMARK_SIZES to include {size}"))
+        for size in SIZES
+    ]
+
+
+def to_degrees(x, y):
+    """Latitudes and longitudes of points x meters east and y meters north of ORIGIN"""
+    lats = ORIGIN[0] + y / METERS_PER_DEGREE
+    lons = ORIGIN[1] + x / (METERS_PER_DEGREE * math.cos(math.radians(ORIGIN[0])))
+    return lats, lons
+
+
+def grid_edges(side):
+    """(a, b) node pairs of the horizontal and vertical neighbors of a side x side grid"""
+    node = np.arange(side * side).reshape(side, side)
+    a = np.concatenate([node[:, :-1].ravel(), node[:-1].ravel()])
+    b = np.concatenate([node[:, 1:].ravel(), node[1:].ravel()])
+    return a, b
+
+
+def both_ways(a, b, *columns):
+    """Edges a -> b and b -> a, with per-edge columns repeated for both"""
+    return (np.concatenate([a, b]), np.concatenate([b, a])) + tuple(
+        np.concatenate([column, column]) for column in columns)
+
+
+def close_pairs(x, y, radius):
+    """
+    Pairs (i, j) of points closer than radius, each pair once
+
+    Points are binned into radius-sized cells, so only pairs in the same or
+    adjacent cells are compared; each cell looks at itself and at four of
+    its eight neighbors, the other four looking back at it.
+    """
+    cx = (x // radius).astype(np.int64)
+    cy = (y // radius).astype(np.int64)
+    width = int(cx.max()) + 2  # A spare column keeps cx - 1 from wrapping onto a used cell
+    cell = cy * width + cx
+    order = np.argsort(cell, kind='stable')
+    sorted_cells = cell[order]
+
+    first, second = [], []
+    for dx, dy in ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)):
+        neighbor = cell + dy * width + dx
+        lo = np.searchsorted(sorted_cells, neighbor, side='left')
+        counts = np.searchsorted(sorted_cells, neighbor, side='right') - lo
+        i = np.repeat(np.arange(len(x)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(lo, counts) + within]
+        keep = (i < j) if (dx, dy) == (0, 0) else np.ones(len(i), dtype=bool)
+        keep &= np.hypot(x[i] - x[j], y[i] - y[j]) < radius
+        first.append(i[keep])
+        second.append(j[keep])
+    return np.concatenate(first), np.concatenate(second)
+
+
+def grid_network(n, rng):
+    """Square grid of two-way streets SPACING apart"""
+    side = int(round(math.sqrt(n)))
+    y, x = np.divmod(np.arange(side * side), side)
+    a, b = grid_edges(side)
+    speeds = rng.choice([30.0, 40.0, 50.0], size=len(a))
+    sources, targets, speeds = both_ways(a, b, speeds)
+    return x * SPACING, y * SPACING, sources, targets, speeds, np.ones(len(sources))
+
+
+def random_geometric_network(n, rng):
+    """
+    Uniformly scattered intersections joined by straight two-way roads to
+    every other intersection within a radius giving about eight roads each
+    """
+    extent = math.sqrt(n) * SPACING
+    x = rng.uniform(0, extent, n)
+    y = rng.uniform(0, extent, n)
+    radius = math.sqrt(8 / math.pi) * SPACING
+    a, b = close_pairs(x, y, radius)
+    speeds = np.full(len(a), 50.0)
+    sources, targets, speeds = both_ways(a, b, speeds)
+    return x, y, sources, targets, speeds, np.ones(len(sources))
+
+
+def road_like_network(n, rng):
+    """
+    Jittered grid resembling a city: 50 km/h two-way arterials every tenth
+    street, 30-40 km/h local streets of which a tenth are missing (dead
+    ends) and a quarter one-way, all somewhat longer than straight
+    """
+    side = int(round(math.sqrt(n)))
+    y, x = np.divmod(np.arange(side * side), side)
+    x = x * SPACING + rng.uniform(-0.25, 0.25, side * side) * SPACING
+    y = y * SPACING + rng.uniform(-0.25, 0.25, side * side) * SPACING
+    a, b = grid_edges(side)
+    row_a, col_a = np.divmod(a, side)
+    row_b, col_b = np.divmod(b, side)
+    # An edge is on an arterial if both ends are on the same tenth row or column
+    arterial = ((row_a == row_b) & (row_a % 10 == 0)) | ((col_a == col_b) & (col_a % 10 == 0))
+    kept = arterial | (rng.random(len(a)) >= 0.1)
+    a, b, arterial = a[kept], b[kept], arterial[kept]
+    speeds = np.where(arterial, 50.0, rng.choice([30.0, 40.0], size=len(a)))
+    detours = rng.uniform(1.0, 1.3, len(a))
+
+    one_way = ~arterial & (rng.random(len(a)) < 0.25)
+    flip = rng.random(len(a)) < 0.5
+    a, b = np.where(flip, b, a), np.where(flip, a, b)
+    sources, targets, speeds_two, detours_two = both_ways(a[~one_way], b[~one_way],
+                                                          speeds[~one_way], detours[~one_way])
+    return (x, y,
+            np.concatenate([sources, a[one_way]]),
+            np.concatenate([targets, b[one_way]]),
+            np.concatenate([speeds_two, speeds[one_way]]),
+            np.concatenate([detours_two, detours[one_way]]))
+
+
+NETWORKS = {
+    "grid": grid_network,
+    "random_geometric": random_geometric_network,
+    "road_like": road_like_network
+}
+
+
+class SyntheticMap:
+    """
+    A generated road network, compiled straight from arrays
+
+    Searches on the csr engine use compiled_graph like they would a
+    MapData's. Intersection and Road objects for the objects engine are
+    only built when asked for, since they take far more memory.
+    """
+
+    def __init__(self, kind, size, seed=0):
+        rng = np.random.default_rng(seed)
+        x, y, sources, targets, speeds, detours = NETWORKS[kind](SIZES[size], rng)
+        lats, lons = to_degrees(x, y)
+        lengths = np.hypot(x[sources] - x[targets], y[sources] - y[targets]) * detours
+        lengths = np.maximum(lengths, 1.0)
+
+        num_nodes = len(x)
+        order = np.argsort(sources, kind='stable')
+        offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=offsets[1:])
+        self.kind = kind
+        self.size = size
+        self.compiled_graph = CompiledGraph(
+            range(num_nodes), lats, lons, offsets, targets[order],
+            lengths[order], speeds[order], range(len(order))
+        )
+        pairs = rng.integers(num_nodes, size=(QUERIES[size], 2))
+        self.queries = [(int(start), int(end)) for start, end in pairs]
+        self._objects = None
+
+    def objects(self):
+        """Graph with `intersections` and `roads` for the objects engine, edge order kept"""
+        if self._objects is None:
+            compiled = self.compiled_graph
+            graph = ObjectGraph()
+            for i, (lat, lon) in enumerate(zip(compiled.lats.tolist(), compiled.lons.tolist())):
+                graph.intersections[i] = Intersection(i, lat, lon)
+            edges = zip(compiled.sources().tolist(), compiled.targets.tolist(),
+                        compiled.lengths.tolist(), compiled.speeds.tolist())
+            for edge, (source, target, length, speed) in enumerate(edges):
+                road = Road(edge, graph.intersections[source], graph.intersections[target],
+                            length, speed)
+                graph.roads[edge] = road
+                graph.intersections[source].add_connection(road)
+            graph.compiled_graph = compiled
+            self._objects = graph
+        return self._objects
+
+
+class ObjectGraph:
+    def __init__(self):
+        self.intersections = {}
+        self.roads = {}
+
+
+def city_snapshot(network, city):
+    """GraphSnapshot of a SyntheticMap, its roads named after STREET_NAMES streets"""
+    compiled = network.compiled_graph
+    num_edges = compiled.num_edges
+    names = [json.dumps(f"Street {i}") for i in range(STREET_NAMES)]
+    names_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in names], out=names_offsets[1:])
+    arrays = {
+        'node_ids': np.asarray(compiled.node_ids, dtype=np.int64),
+        'lats': compiled.lats,
+        'lons': compiled.lons,
+        'offsets': compiled.offsets,
+        'targets': compiled.targets,
+        'keys': np.zeros(num_edges, dtype=np.int32),
+        'lengths': compiled.lengths,
+        'speeds': compiled.speeds.astype(np.float32),
+        'name_index': (compiled.sources() % STREET_NAMES).astype(np.int32),
+        'names_offsets': names_offsets,
+        'names_blob': np.frombuffer("".join(names).encode("utf-8"), dtype=np.uint8),
+        'geometry_offsets': np.zeros(num_edges + 1, dtype=np.int64),
+        'geometry': np.zeros((0, 2), dtype=np.float64)
+    }
+    return GraphSnapshot(city, "drive", arrays)
+
+
+class Baseline:
+    """Benchmark results stored as JSON, and the comparison against them"""
+
+    def __init__(self, path, threshold):
+        self.path = path
+        self.threshold = threshold
+        self.stored = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.stored = json.load(file)
+        self.recorded = {}
+
+    def check(self, name, metrics):
+        """
+        Record metrics, then fail if any regressed beyond the threshold
+
+        Metrics in HIGHER_IS_BETTER may not fall below (1 - threshold)
+        times their baseline, the others may not rise above (1 +
+        threshold) times theirs. Names without a baseline always pass.
+        """
+        self.recorded[name] = metrics
+        expected = self.stored.get(name)
+        if SAVE_BASELINE or expected is None:
+            return
+        regressions = []
+        for metric, value in metrics.items():
+            base = expected.get(metric)
+            if base is None:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                worse = value < base * (1 - self.threshold)
+            else:
+                worse = value > base * (1 + self.threshold)
+            if worse:
+                regressions.append(f"{metric} {base:g} -> {value:g}")
+        assert not regressions, f"{name} regressed beyond {self.threshold:.0%}: " + ", ".join(regressions)
+
+    def save(self):
+        """Merge this run's results into the stored file"""
+        merged = dict(self.stored, **self.recorded)
+        with open(self.path, 'w') as file:
+            json.dump(merged, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+
+@pytest.fixture(scope="session")
+def baseline():
+    results = Baseline(BASELINE_PATH, THRESHOLD)
+    yield results
+    if SAVE_BASELINE and results.recorded:
+        results.save()
+
+
+@pytest.fixture(scope="module", params=[(kind, size) for kind in NETWORKS for size in SIZES],
+                ids=lambda param: f"{param[0]}-{param[1]}")
+def network(request):
+    kind, size = request.param
+    if size not in SELECTED_SIZES:
+        pytest.skip(f"set BENCHMARK_SIZES to include {size}")
+    return SyntheticMap(kind, size)
+
+
+def peak_memory(function):
+    """Peak bytes allocated while function runs"""
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    function()
+    peak = tracemalloc.get_traced_memory()[1] - start
+    if not tracing:
+        tracemalloc.stop()
+    return peak
+
+
+SEARCHES = {
+    "dijkstra-objects": lambda graph, start, end, stats: dijkstra(graph, start, end, stats=stats),
+    "dijkstra-csr": lambda graph, start, end, stats: dijkstra(graph, start, end, engine="csr", stats=stats),
+    "a_star-objects": lambda graph, start, end, stats: a_star(graph, start, end, stats=stats),
+    "a_star-csr": lambda graph, start, end, stats: a_star(graph, start, end, engine="csr", stats=stats),
+}
+
+
+@pytest.mark.parametrize("name", list(SEARCHES))
+def test_search(benchmark, network, baseline, name):
+    objects = name.endswith("-objects")
+    if objects and SIZES[network.size] > OBJECTS_MAX_NODES:
+        pytest.skip(f"the objects engine is only benchmarked up to {OBJECTS_MAX_NODES} nodes")
+    graph = network.objects() if objects else network
+    search = SEARCHES[name]
+    settled = []
+
+    def run_queries():
+        settled.clear()
+        for start, end in network.queries:
+            stats = {}
+            search(graph, start, end, stats)
+            settled.append(stats['settled'])
+
+    # The first batch also builds the lazily cached search lists
+    benchmark.pedantic(run_queries, rounds=ROUNDS[network.size], iterations=1, warmup_rounds=1)
+    if benchmark.disabled:
+        return
+    metrics = {
+        "queries_per_sec": len(network.queries) / benchmark.stats.stats.mean,
+        "settled_per_query": sum(settled) / len(settled),
+        "peak_kb": peak_memory(run_queries) / 1024
+    }
+    benchmark.extra_info.update(metrics)
+    baseline.check(f"{name}-{network.kind}-{network.size}", metrics)
+
+
+@pytest.mark.parametrize("size", size_params())
+def test_priority_queue(benchmark, baseline, size):
+    """Adds with random priorities, a fifth of them re-adding a queued item, then pops"""
+    count = SIZES[size]
+    rng = np.random.default_rng(0)
+    items = rng.integers(count, size=count + count // 4).tolist()
+    priorities = rng.random(len(items)).tolist()
+    operations = len(items)
+
+    def run():
+        nonlocal operations
+        queue = PriorityQueue()
+        for item, priority in zip(items, priorities):
+            queue.add(item, priority)
+        pops = 0
+        while not queue.empty():
+            queue.pop()
+            pops += 1
+        operations = len(items) + pops
+
+    benchmark.pedantic(run, rounds=ROUNDS[size], iterations=1, warmup_rounds=1)
+    if benchmark.disabled:
+        return
+    metrics = {
+        "operations_per_sec": operations / benchmark.stats.stats.mean,
+        "peak_kb": peak_memory(run) / 1024
+    }
+    benchmark.extra_info.update(metrics)
+    baseline.check(f"priority_queue-{size}", metrics)
+
+
+@pytest.mark.parametrize("size", size_params())
+def test_snapshot_load(benchmark, baseline, tmp_path, size):
+    """
+    MapData.load_map from a snapshot of a road-like network: mapping the
+    file, building the Intersection/Road objects and compiled graph, and
+    the lookup indexes. Tempe's drive network is about the 10k size.
+    """
+    city = f"Benchmark City {size}"
+    cache_dir = str(tmp_path)
+    city_snapshot(SyntheticMap("road_like", size), city).save(snapshot_path(city, "drive", cache_dir))
+
+    def run():
+        map_data = MapData(city, "drive", cache_dir=cache_dir)
+        map_data.load_map()
+        assert map_data.snapshot is not None
+
+    benchmark.pedantic(run, rounds=ROUNDS[size], iterations=1, warmup_rounds=1)
+    if benchmark.disabled:
+        return
+    metrics = {
+        "load_sec": benchmark.stats.stats.mean,
+        "peak_kb": peak_memory(run) / 1024
+    }
+    benchmark.extra_info.update(metrics)
+    baseline.check(f"snapshot_load-{size}", metrics)
@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import geocode_cache
+from src.utils.geocode_cache import MISSING, GeocodeCache, main, normalize_address
+from src.utils.geocoding import GeocodingService
+
+
+class FakeLocation:
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+class FakeGeolocator:
+    """Stands in for Nominatim and counts the lookups that reach it"""
+
+    def __init__(self, known):
+        self.known = known
+        self.queries = []
+
+    def geocode(self, address, timeout=None):
+        self.queries.append(address)
+        coordinates = self.known.get(address.split(",")[0])
+        return FakeLocation(*coordinates) if coordinates else None
+
+
+def test_equivalent_addresses_share_a_key():
+    assert normalize_address("Mill Avenue & University Drive, Tempe, AZ") == \
+        normalize_address("  mill ave and university dr tempe az")
+    assert normalize_address("100 E. 5th Street") == "100 e 5th st"
+
+
+def test_found_and_missing_addresses_are_cached(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite"))
+    service = GeocodingService(cache=cache)
+    service.geolocator = FakeGeolocator({"Mill Ave": (33.42, -111.94)})
+
+    assert service.address_to_coordinates("Mill Ave") == (33.42, -111.94)
+    assert service.address_to_coordinates("mill avenue") == (33.42, -111.94)
+    assert service.address_to_coordinates("Nowhere Rd") is None
+    assert service.address_to_coordinates("nowhere road") is None
+    assert len(service.geolocator.queries) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["negative_hits"], stats["size"], stats["negative_entries"]) == (1, 1, 2, 1)
+
+    # Kept on disk for the next process
+    reopened = GeocodeCache(str(tmp_path / "geocode.sqlite"))
+    assert reopened.get("Mill Ave, Tempe, AZ") == (33.42, -111.94)
+    assert reopened.get("Nowhere Rd, Tempe, AZ") is None
+
+
+def test_entries_expire(monkeypatch):
+    cache = GeocodeCache(":memory:", ttl=100, negative_ttl=10)
+    now = 1000.0
+    monkeypatch.setattr(geocode_cache.time, "time", lambda: now)
+    cache.put("Mill Ave", (33.42, -111.94))
+    cache.put("Nowhere Rd", None)
+
+    now = 1050.0
+    assert cache.get("Mill Ave") == (33.42, -111.94)
+    assert cache.get("Nowhere Rd") is MISSING
+    now = 1100.0
+    assert cache.get("Mill Ave") is MISSING
+
+
+def test_least_recently_used_are_evicted(monkeypatch):
+    monkeypatch.setattr(GeocodeCache, "PURGE_EVERY", 1)
+    cache = GeocodeCache(":memory:", max_entries=3)
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(geocode_cache.time, "time", lambda: float(next(clock)))
+    for number in range(3):
+        cache.put(f"{number} Mill Ave", (33.0 + number, -111.9))
+    cache.get("0 Mill Ave")
+    cache.put("3 Mill Ave", (36.0, -111.9))
+
+    assert cache.stats()["size"] == 3
+    assert cache.get("1 Mill Ave") is MISSING
+    assert cache.get("0 Mill Ave") == (33.0, -111.9)
+
+
+def test_preload_and_warm_from_the_command_line(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "geocode.sqlite")
+    known = tmp_path / "known.csv"
+    # Addresses with commas are quoted in the CSV
+    known.write_text('address,lat,lon\n"Mill Ave & University Dr, Tempe, AZ",33.42,-111.94\n'
+                     'Tempe Town Lake,33.43,-111.93\n')
+    assert main(["preload", str(known), "--path", path]) == 0
+    preloaded = GeocodingService(cache=GeocodeCache(path))
+    preloaded.geolocator = FakeGeolocator({})
+    assert preloaded.address_to_coordinates("Tempe Town Lake") == (33.43, -111.93)
+    assert preloaded.geolocator.queries == []
+
+    geolocator = FakeGeolocator({"Rural Rd": (33.41, -111.93)})
+    monkeypatch.setattr("src.utils.geocoding.Nominatim", lambda user_agent: geolocator)
+    addresses = tmp_path / "addresses.txt"
+    addresses.write_text("mill avenue and university drive\nRural Rd\nNowhere Rd\n")
+    assert main(["warm", str(addresses), "--path", path, "--delay", "0"]) == 0
+    assert geolocator.queries == ["Rural Rd, Tempe, AZ", "Nowhere Rd, Tempe, AZ"]
+    assert "1 already cached, 2 looked up, 1 found" in capsys.readouterr().out
+
+    cache = GeocodeCache(path)
+    assert cache.get("Rural Rd, Tempe, AZ") == (33.41, -111.93)
+    assert cache.stats()["negative_entries"] == 1
@@ -0,0 +1,250 @@
+import pytest
+import struct
+import sys
+import os
+import networkx as nx
+import numpy as np
+from shapely.geometry import LineString
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data.map_data import MapData
+from src.data.graph_builder import build_compiled_graph, get_compiled_graph
+from src.data.snapshot import (
+    MAGIC, SNAPSHOT_VERSION, GraphSnapshot, load_snapshot, snapshot_path
+)
+from src.data.street_index import get_street_index
+from src.data.street_search import get_street_search
+from src.utils.geocoding import GeocodingService
+from src.algorithms.dijkstra import dijkstra
+from src.algorithms.a_star import a_star
+
+
+def test_compiled_graph_layout(make_test_map):
+    """CSR arrays mirror the intersections and their connections"""
+    map_data = make_test_map()
+    compiled = build_compiled_graph(map_data)
+
+    assert compiled.num_nodes == len(map_data.intersections)
+    assert compiled.num_edges == len(map_data.roads)
+    assert compiled.offsets[-1] == compiled.num_edges
+
+    for node_id, intersection in map_data.intersections.items():
+        i = compiled.index_of(node_id)
+        edges = range(compiled.offsets[i], compiled.offsets[i + 1])
+        neighbors = [compiled.node_ids[compiled.targets[e]] for e in edges]
+        assert neighbors == [road.end.id for road in intersection.connections]
+
+
+def test_compiled_weights_follow_traffic(make_test_map):
+    """Refreshing traffic recomputes travel times like Road.travel_time()"""
+    map_data = make_test_map()
+    compiled = get_compiled_graph(map_data)
+
+    map_data.roads["h_0_0_0_1"].current_traffic = 4.0
+    compiled.refresh_traffic(map_data.roads)
+
+    for e, road_id in enumerate(compiled.edge_ids):
+        assert compiled.weights[e] == pytest.approx(map_data.roads[road_id].travel_time())
+
+
+def test_set_traffic_swaps_immutable_snapshots(make_test_map):
+    """Each update is a new read-only snapshot; old ones stay intact"""
+    map_data = make_test_map()
+    compiled = get_compiled_graph(map_data)
+    old = compiled.traffic_snapshot
+    old_weights = old.weights.copy()
+
+    traffic = np.full(compiled.num_edges, 2.0)
+    new = compiled.set_traffic(traffic)
+    traffic[:] = 5.0  # The caller's array is copied, not shared
+
+    assert compiled.traffic_snapshot is new
+    assert new.version == old.version + 1
+    assert np.all(new.traffic == 2.0)
+    assert np.array_equal(old.weights, old_weights)
+    assert compiled.adjacency(old)[2] == old_weights.tolist()
+    with pytest.raises(ValueError):
+        new.weights[0] = 0.0
+
+
+def test_csr_engine_matches_objects(make_test_map):
+    """Both engines return the same route on the same graph"""
+    map_data = make_test_map()
+    map_data.roads["h_0_0_0_1"].current_traffic = 10.0
+    map_data.compile_graph()
+
+    for search in (dijkstra, a_star):
+        expected = search(map_data, "0_0", "2_2")
+        path, time = search(map_data, "0_0", "2_2", engine="csr")
+        assert path == expected[0]
+        assert time == pytest.approx(expected[1])
+
+    # The congested first block is avoided
+    path, time = dijkstra(map_data, "0_0", "0_2", engine="csr")
+    assert path[:2] == ["0_0", "1_0"]
+
+
+def make_osm_graph():
+    """Small OSMnx-style MultiDiGraph: names, a parallel edge and a curved road"""
+    G = nx.MultiDiGraph()
+    for node_id, (y, x) in {101: (33.40, -111.90), 102: (33.40, -111.89),
+                            103: (33.41, -111.89)}.items():
+        G.add_node(node_id, y=y, x=x)
+    G.add_edge(101, 102, key=0, length=930.0, speed_kph=60, name="Mill Avenue")
+    G.add_edge(101, 102, key=1, length=1200.0, name=["Mill Avenue", "Rural Road"])
+    G.add_edge(102, 103, key=0, length=1150.0, speed_kph=40,
+               geometry=LineString([(-111.89, 33.40), (-111.888, 33.405), (-111.89, 33.41)]))
+    G.add_edge(103, 101, key=0)
+    return G
+
+
+def test_memory_usage_counts_search_lists(make_test_map):
+    compiled = get_compiled_graph(make_test_map())
+    arrays = compiled.memory_usage()
+    assert compiled.list_memory_usage() == 0
+
+    compiled.adjacency()
+    # Every edge's weight is now also a Python float object in a list
+    assert compiled.list_memory_usage() >= compiled.num_edges * 24
+    assert compiled.memory_usage() == arrays + compiled.list_memory_usage()
+
+
+def test_snapshot_round_trip(tmp_path):
+    """A saved snapshot loads into the same network OSMnx would have built"""
+    snapshot = GraphSnapshot.from_networkx(make_osm_graph(), "Tempe, AZ", "drive")
+    path = snapshot_path("Tempe, AZ", "drive", tmp_path)
+    snapshot.save(path)
+
+    map_data = MapData(cache_dir=tmp_path)
+    map_data.load_map()
+
+    assert isinstance(map_data.snapshot.arrays['targets'], np.ndarray)
+    assert set(map_data.intersections) == {101, 102, 103}
+    assert list(map_data.roads) == ["101_102_0", "101_102_1", "102_103_0", "103_101_0"]
+    assert map_data.roads["101_102_0"].name == "Mill Avenue"
+    assert map_data.roads["101_102_1"].name == ["Mill Avenue", "Rural Road"]
+    assert map_data.roads["101_102_1"].speed_limit == 50
+    assert map_data.roads["103_101_0"].length > 0
+
+    geometry = map_data.snapshot.edge_geometry(2)
+    assert geometry[1] == (33.405, -111.888)
+    assert map_data.snapshot.edge_geometry(0) == [(33.40, -111.90), (33.40, -111.89)]
+
+    # The compiled graph built from the arrays matches one built from objects
+    compiled = map_data.compiled_graph
+    rebuilt = build_compiled_graph(map_data)
+    assert compiled.node_ids == rebuilt.node_ids
+    assert compiled.edge_ids == rebuilt.edge_ids
+    assert np.array_equal(compiled.weights, rebuilt.weights)
+
+
+def test_snapshot_version_mismatch_is_ignored(tmp_path):
+    path = snapshot_path("Tempe, AZ", "drive", tmp_path)
+    GraphSnapshot.from_networkx(make_osm_graph(), "Tempe, AZ", "drive").save(path)
+    with open(path, 'r+b') as file:
+        file.seek(len(MAGIC))
+        file.write(struct.pack("<I", SNAPSHOT_VERSION + 1))
+
+    assert load_snapshot("Tempe, AZ", "drive", tmp_path) is None
+    assert load_snapshot("Tempe, AZ", "walk", tmp_path) is None
+
+
+def describe_by_scan(map_data, node_id):
+    """The description the entry points used to build on every call"""
+    intersection = map_data.intersections[node_id]
+    road_names = set()
+    for road in intersection.connections:
+        if road.name:
+            if isinstance(road.name, list):
+                road_names.update(name for name in road.name if name)
+            else:
+                road_names.add(road.name)
+    if not road_names:
+        return f"Unnamed intersection at {intersection.lat:.6f}, {intersection.lon:.6f}"
+    road_list = sorted(road_names)
+    if len(road_list) == 1:
+        return road_list[0]
+    if len(road_list) == 2:
+        return f"Intersection of {road_list[0]} and {road_list[1]}"
+    return f"Intersection of {road_list[0]} and {road_list[1]} (+ {len(road_list)-2} more)"
+
+
+def test_precomputed_descriptions_match_scan(make_test_map):
+    map_data = make_test_map()
+    # Exercise list names, unnamed roads and single-name nodes too
+    map_data.roads["h_0_0_0_1"].name = ["Mill Avenue", "", "Rural Road"]
+    map_data.roads["v_0_0_1_0"].name = None
+    for road in map_data.intersections["2_2"].connections:
+        road.name = None
+
+    for node_id in map_data.intersections:
+        assert map_data.describe(node_id) == describe_by_scan(map_data, node_id)
+    assert map_data.node_names.street_names("0_0") == ["Mill Avenue", "Rural Road"]
+    assert map_data.describe("2_2").startswith("Unnamed intersection at 33.420000")
+
+
+def make_named_map(make_test_map):
+    """Demo grid with real street names: rows east-west, columns north-south"""
+    map_data = make_test_map()
+    rows = ["E University Drive", "Apache Boulevard", "Broadway Road"]
+    columns = ["S Mill Avenue", "Rural Road", "McClintock Drive"]
+    for road in map_data.roads.values():
+        kind, i, j = road.id.split("_")[:3]  # "h_0_1_0_2" starts at 0_1
+        road.name = rows[int(i)] if kind == "h" else columns[int(j)]
+    return map_data
+
+
+class OfflineGeolocator:
+    """Fails the test if a query reaches the network"""
+
+    def geocode(self, address, timeout=None):
+        raise AssertionError(f"'{address}' was sent to the geocoder")
+
+
+def test_street_index_answers_intersections_locally(make_test_map):
+    map_data = make_named_map(make_test_map)
+    index = get_street_index(map_data)
+    corner = (33.4, -111.9)
+
+    assert index.intersection_nodes("Mill Ave", "University Dr") == ["0_0"]
+    assert index.intersection_nodes("Mill Ave", "Rural Rd") == []
+    assert index.lookup("mill avenue and e university drive, Tempe, AZ", "Tempe, AZ") == corner
+    assert index.lookup("Rural Rd @ Apache Blvd") == pytest.approx((33.41, -111.89))
+    assert index.lookup("Broadway & McClintock, AZ 85281, USA", "Tempe, AZ") == pytest.approx((33.42, -111.88))
+    # A street is its node nearest the middle
+    assert index.lookup("Mill Ave") == pytest.approx((33.41, -111.9))
+
+    assert index.lookup("Mill Ave & University Dr, Phoenix, AZ", "Tempe, AZ") is None
+    assert index.lookup("Mill Ave & Rural Rd") is None
+    assert index.lookup("100 Mill Ave") is None
+    assert index.lookup("Ash Ave & University Dr") is None
+
+    service = GeocodingService(street_index=index)
+    service.geolocator = OfflineGeolocator()
+    assert service.address_to_coordinates("Mill Ave & University Dr") == corner
+    with pytest.raises(AssertionError):
+        service.address_to_coordinates("Ash Ave & University Dr")
+
+
+def test_autocomplete_ranks_streets_and_finds_intersections(make_test_map):
+    map_data = make_named_map(make_test_map)
+    # McClintock is the faster road, so it outranks University Drive
+    for road in map_data.roads.values():
+        road.speed_limit = 70 if road.name == "McClintock Drive" else 40
+    search = get_street_search(map_data)
+
+    def descriptions(query):
+        return [suggestion["description"] for suggestion in search.complete(query)]
+
+    assert descriptions("d") == ["McClintock Drive", "E University Drive"]
+    assert descriptions("univ") == ["E University Drive"]
+    assert descriptions("unievrsity") == ["E University Drive"]  # transposed letters
+    assert descriptions("south mil") == ["S Mill Avenue"]
+    assert descriptions("mill avenue") == ["S Mill Avenue"]
+    assert descriptions("qwerty") == []
+
+    suggestion = search.complete("mill & broadw")[0]
+    assert suggestion == {"kind": "intersection", "description": "S Mill Avenue & Broadway Road",
+                          "node_id": "2_0", "lat": pytest.approx(33.42), "lon": pytest.approx(-111.9)}
+    assert len(descriptions("rural &")) == 3
+    assert descriptions("mill & rural") == []
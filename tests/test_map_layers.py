@@ -0,0 +1,77 @@
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.data.graph_builder import get_compiled_graph
+from src.data.traffic_data import TrafficData
+from src.utils.map_layers import BaseLayerCache, traffic_geojson
+
+
+def test_geojson_groups_roads_by_traffic_level(make_test_map):
+    map_data = make_test_map()
+    compiled = get_compiled_graph(map_data)
+    traffic = np.ones(compiled.num_edges)
+    traffic[0] = 1.5
+    traffic[1:3] = 2.5
+    compiled.set_traffic(traffic)
+
+    layer = traffic_geojson(map_data)
+    counts = {f["properties"]["traffic"]: f["properties"]["roads"] for f in layer["features"]}
+    assert counts == {"light": compiled.num_edges - 3, "moderate": 1, "heavy": 2}
+    heavy = next(f for f in layer["features"] if f["properties"]["traffic"] == "heavy")
+    road = map_data.roads[compiled.edge_ids[1]]
+    assert heavy["geometry"]["coordinates"][0] == [[road.start.lon, road.start.lat],
+                                                   [road.end.lon, road.end.lat]]
+
+
+def test_base_layer_renders_once_per_traffic_state(tmp_path, make_test_map, fake_traffic):
+    map_data = make_test_map()
+    layers = BaseLayerCache(directory=str(tmp_path / "maps"))
+    traffic = fake_traffic()
+
+    url = layers.url(map_data, traffic)
+    assert url == f"{layers.url_prefix}/traffic_a1.geojson"
+    assert layers.url(map_data, traffic) == url
+    assert layers.renders == 1
+    with open(tmp_path / "maps" / "traffic_a1.geojson") as file:
+        assert json.load(file)["type"] == "FeatureCollection"
+
+    traffic.version, traffic.fingerprint = 2, "b2"
+    assert layers.url(map_data, traffic).endswith("traffic_b2.geojson")
+    assert layers.renders == 2
+
+
+def test_old_base_layers_are_evicted_under_size_cap(tmp_path, make_test_map, fake_traffic):
+    map_data = make_test_map()
+    layers = BaseLayerCache(directory=str(tmp_path), max_bytes=1)
+    for i in range(3):
+        layers.url(map_data, fake_traffic(version=i, fingerprint=f"f{i}"))
+
+    # Over the cap, only the current layer survives
+    assert sorted(os.listdir(tmp_path)) == ["traffic_f2.geojson"]
+    assert layers.evictions == 2
+
+
+def test_base_layer_is_kept_while_no_road_changes_level(tmp_path, monkeypatch, make_test_map):
+    map_data = make_test_map()
+    compiled = get_compiled_graph(map_data)
+    traffic_data = TrafficData(map_data, delta_threshold=0)
+    layers = BaseLayerCache(directory=str(tmp_path))
+    traffic_data.subscribe(layers.apply_delta)
+    multipliers = np.ones(compiled.num_edges)
+    monkeypatch.setattr(traffic_data, "_match_roads_to_traffic", lambda data: multipliers.copy())
+    monkeypatch.setattr(traffic_data.traffic_api, "get_traffic_flow", lambda bbox: {})
+
+    first = layers.url(map_data, traffic_data)
+    multipliers[0] = 1.1  # Still light
+    traffic_data.update_traffic()
+    assert layers.url(map_data, traffic_data) == first
+    assert (layers.renders, layers.reuses) == (1, 1)
+
+    multipliers[0] = 1.5  # Now moderate
+    traffic_data.update_traffic()
+    assert layers.url(map_data, traffic_data) != first
+    assert layers.renders == 2
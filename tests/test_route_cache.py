@@ -0,0 +1,143 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.algorithms.dijkstra import dijkstra
+from src.api.route_cache import RouteCache, SQLiteRouteBackend
+from src.data.graph_builder import get_compiled_graph
+from src.data.traffic_data import TrafficData
+from src.utils.map_layers import BaseLayerCache
+
+
+def test_hits_until_traffic_version_changes(fake_traffic):
+    cache = RouteCache()
+    traffic = fake_traffic()
+    assert cache.get("1", "2", "a_star", traffic) is None
+    cache.put("1", "2", "a_star", traffic, {"path": ["1", "2"]})
+    assert cache.get("1", "2", "a_star", traffic) == {"path": ["1", "2"]}
+    assert cache.get("1", "2", "dijkstra", traffic) is None
+
+    traffic.version += 1
+    assert cache.get("1", "2", "a_star", traffic) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 3, 1)
+
+
+def test_results_for_superseded_traffic_are_not_stored(tmp_path, fake_traffic):
+    cache = RouteCache(backend=SQLiteRouteBackend(str(tmp_path / "routes.sqlite")))
+    traffic = fake_traffic()
+    computed_on = traffic.version
+    # An update lands while the route is being computed
+    traffic.version += 1
+    traffic.fingerprint = "b2"
+
+    assert not cache.put("1", "2", "a_star", traffic, {"path": ["1", "2"]},
+                         traffic_version=computed_on)
+    assert cache.get("1", "2", "a_star", traffic) is None
+    assert cache.put("1", "2", "a_star", traffic, {"path": ["1", "2"]},
+                     traffic_version=traffic.version)
+    assert cache.get("1", "2", "a_star", traffic) == {"path": ["1", "2"]}
+
+
+def test_other_results_share_the_cache_under_their_own_keys(fake_traffic):
+    cache = RouteCache()
+    traffic = fake_traffic()
+    cache.store(("isochrone", "1", 5.0), traffic, {"nodes": ["1"]})
+    assert cache.lookup(("isochrone", "1", 5.0), traffic) == {"nodes": ["1"]}
+    assert cache.lookup(("isochrone", "1", 10.0), traffic) is None
+
+    traffic.version += 1
+    assert cache.lookup(("isochrone", "1", 5.0), traffic) is None
+
+
+class FakeDelta:
+    """Just what RouteCache.apply_delta reads from a TrafficDelta"""
+
+    def __init__(self, previous_version, edge_ids, faster=False):
+        self.previous_version = previous_version
+        self.version = previous_version + 1
+        self.edge_ids = edge_ids
+        self.faster = faster
+
+
+def test_slowdowns_keep_routes_off_the_changed_roads(fake_traffic):
+    cache = RouteCache()
+    traffic = fake_traffic()
+    cache.put("1", "3", "a_star", traffic, "via 2", edge_ids=["1-2", "2-3"])
+    cache.put("1", "5", "a_star", traffic, "via 4", edge_ids=["1-4", "4-5"])
+    cache.store(("isochrone", "1", 5.0), traffic, {"nodes": ["1"]})
+
+    cache.apply_delta(FakeDelta(1, ["4-5"]))
+    traffic.version = 2
+    assert cache.get("1", "3", "a_star", traffic) == "via 2"
+    assert cache.get("1", "5", "a_star", traffic) is None
+    assert cache.lookup(("isochrone", "1", 5.0), traffic) is None
+    assert cache.stats()["repaired_drops"] == 2
+
+    # A faster road may shorten any route
+    cache.apply_delta(FakeDelta(2, ["9-8"], faster=True))
+    traffic.version = 3
+    assert cache.get("1", "3", "a_star", traffic) is None
+
+    # A delta that does not follow the cached version drops everything
+    cache.put("1", "3", "a_star", traffic, "via 2", edge_ids=["1-2", "2-3"])
+    cache.apply_delta(FakeDelta(5, ["9-8"]))
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction_and_ttl(monkeypatch, fake_traffic):
+    clock = [1000.0]
+    monkeypatch.setattr("src.api.route_cache.time.monotonic", lambda: clock[0])
+    cache = RouteCache(max_entries=2, ttl=10)
+    traffic = fake_traffic()
+    for end in ("a", "b"):
+        cache.put("s", end, "a_star", traffic, end)
+    cache.get("s", "a", "a_star", traffic)  # "b" is now least recently used
+    cache.put("s", "c", "a_star", traffic, "c")
+    assert cache.get("s", "b", "a_star", traffic) is None
+    assert cache.get("s", "a", "a_star", traffic) == "a"
+    assert cache.stats()["evictions"] == 1
+
+    clock[0] += 11
+    assert cache.get("s", "a", "a_star", traffic) is None
+
+
+def test_shared_backend_serves_other_workers(tmp_path, fake_traffic):
+    path = str(tmp_path / "routes.sqlite")
+    first = RouteCache(backend=SQLiteRouteBackend(path))
+    second = RouteCache(backend=SQLiteRouteBackend(path))
+
+    # Workers count versions independently; the fingerprint is what matches
+    first.put(1, 2, "ch", fake_traffic(version=3, fingerprint="f"), {"time_minutes": 0.25})
+    assert second.get(1, 2, "ch", fake_traffic(version=7, fingerprint="f")) == {"time_minutes": 0.25}
+    assert second.stats()["shared_hits"] == 1
+    assert second.get(1, 2, "ch", fake_traffic(version=8, fingerprint="g")) is None
+
+
+def test_repaired_routes_get_the_current_base_layer(tmp_path, monkeypatch, make_test_map):
+    map_data = make_test_map()
+    compiled = get_compiled_graph(map_data)
+    traffic_data = TrafficData(map_data)
+    cache = RouteCache()
+    layers = BaseLayerCache(directory=str(tmp_path), max_bytes=1)
+    traffic_data.subscribe(cache.apply_delta)
+    traffic_data.subscribe(layers.apply_delta)
+    multipliers = np.ones(compiled.num_edges)
+    monkeypatch.setattr(traffic_data, "_match_roads_to_traffic", lambda data: multipliers.copy())
+    monkeypatch.setattr(traffic_data.traffic_api, "get_traffic_flow", lambda bbox: {})
+
+    route = dijkstra(map_data, "0_0", "0_2", engine="csr")
+    cache.put("0_0", "0_2", "dijkstra", traffic_data, {"path": route.path}, edge_ids=route.edge_ids)
+    first = layers.attach({}, map_data, traffic_data)["base_layer_url"]
+
+    # Another road turns heavy: the route survives, the layer is re-rendered
+    other = next(edge for edge, road_id in enumerate(compiled.edge_ids) if road_id not in route.edge_ids)
+    multipliers[other] = 2.5
+    traffic_data.update_traffic()
+    cached = cache.get("0_0", "0_2", "dijkstra", traffic_data)
+    assert cached == {"path": route.path}
+    url = layers.attach(cached, map_data, traffic_data)["base_layer_url"]
+    assert url != first and url == layers.url(map_data, traffic_data)
+    assert os.listdir(tmp_path) == [url.rsplit("/", 1)[1]]
@@ -0,0 +1,681 @@
+import pytest
+import random
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.intersection import Intersection
+from src.models.road import Road
+from src.algorithms.dijkstra import dijkstra
+from src.algorithms.contraction_hierarchies import (
+    ContractionHierarchy, HierarchyNotReady, contraction_hierarchies,
+    get_contraction_hierarchy, refresh_hierarchy_async
+)
+from src.algorithms.customizable_ch import customize, get_cch_topology
+from src.algorithms.a_star import a_star
+from src.algorithms.landmarks import (
+    LandmarkTables, LandmarksNotReady, get_landmark_tables, refresh_landmarks_async
+)
+from src.algorithms.bidirectional import (
+    bidirectional_a_star, bidirectional_dijkstra, reverse_adjacency_index
+)
+import numpy as np
+
+from src.algorithms.alternatives import alternative_routes
+from src.algorithms.isochrone import isochrone
+from src.algorithms.time_dependent import departure_hours, td_a_star, td_dijkstra
+from src.algorithms.matrix import travel_time_matrix
+from src.data.graph_builder import get_compiled_graph
+from src.data.traffic_profiles import TrafficProfiles, get_traffic_profiles, rush_hour_profile
+from src.api.routing_api import find_path
+from src.api.batch_routing import BatchRouter, route_batch
+
+
+class GridGraph:
+    """Random-weight grid with some one-way streets, for comparing engines"""
+
+    def __init__(self, size=12, seed=7):
+        rng = random.Random(seed)
+        self.intersections = {}
+        self.roads = {}
+
+        for i in range(size):
+            for j in range(size):
+                node_id = i * size + j
+                self.intersections[node_id] = Intersection(
+                    id=node_id,
+                    lat=33.4 + i * 0.002,
+                    lon=-111.9 + j * 0.002
+                )
+
+        for i in range(size):
+            for j in range(size):
+                for di, dj in ((0, 1), (1, 0), (0, -1), (-1, 0)):
+                    if not (0 <= i + di < size and 0 <= j + dj < size):
+                        continue
+                    # Drop ~15% of directions to create one-way streets
+                    if rng.random() < 0.15:
+                        continue
+                    start_id = i * size + j
+                    end_id = (i + di) * size + (j + dj)
+                    road = Road(
+                        id=f"{start_id}_{end_id}_0",
+                        start_intersection=self.intersections[start_id],
+                        end_intersection=self.intersections[end_id],
+                        length=rng.uniform(150, 250),
+                        speed_limit=rng.choice([40, 50, 60]),
+                        name=f"Street {j}" if di else f"Avenue {i}"
+                    )
+                    road.current_traffic = rng.uniform(0.8, 2.5)
+                    self.roads[road.id] = road
+                    self.intersections[start_id].add_connection(road)
+
+
+def sample_pairs(graph, count=60, seed=3):
+    rng = random.Random(seed)
+    nodes = list(graph.intersections)
+    return [(rng.choice(nodes), rng.choice(nodes)) for _ in range(count)]
+
+
+def path_time(graph, path):
+    """Travel time along a node path, taking the fastest road per hop"""
+    return sum(
+        min(road.travel_time() for road in graph.intersections[a].connections
+            if road.end.id == b)
+        for a, b in zip(path, path[1:])
+    )
+
+
+def test_contraction_hierarchies_match_dijkstra():
+    """CH queries return optimal, valid paths"""
+    graph = GridGraph()
+    for start, end in sample_pairs(graph):
+        expected_path, expected_time = dijkstra(graph, start, end)
+        path, time = contraction_hierarchies(graph, start, end)
+        if expected_path is None:
+            assert path is None
+            continue
+        assert time == pytest.approx(expected_time)
+        assert path[0] == start and path[-1] == end
+        assert path_time(graph, path) == pytest.approx(time)
+
+
+def test_contraction_hierarchy_settles_few_nodes():
+    """The upward search settles far fewer nodes than the graph has"""
+    graph = GridGraph(size=20)
+    stats = {}
+    contraction_hierarchies(graph, 0, 399, stats=stats)
+    assert 0 < stats['settled'] < len(graph.intersections) / 2
+
+
+def test_contraction_hierarchy_save_load(tmp_path):
+    """A serialized hierarchy answers queries like the original"""
+    graph = GridGraph()
+    hierarchy = get_contraction_hierarchy(graph)
+    path = tmp_path / "hierarchy.npz"
+    hierarchy.save(path)
+
+    loaded = ContractionHierarchy.load(path)
+    assert loaded.matches(get_compiled_graph(graph))
+    for start, end in sample_pairs(graph, count=10):
+        assert loaded.query(start, end) == hierarchy.query(start, end)
+
+
+def test_contraction_hierarchy_rebuilds_after_traffic_change():
+    """A stale hierarchy is not used once the weights change"""
+    graph = GridGraph()
+    get_contraction_hierarchy(graph)
+
+    for road in graph.roads.values():
+        road.current_traffic = 1.0
+    get_compiled_graph(graph).refresh_traffic(graph.roads)
+
+    for start, end in sample_pairs(graph, count=10):
+        expected = dijkstra(graph, start, end)
+        assert find_path(graph, start, end, algorithm="ch")[1] == pytest.approx(expected[1])
+
+
+def test_ch_falls_back_instead_of_contracting_in_requests(monkeypatch):
+    """Without on-demand contraction a stale hierarchy is refused, not rebuilt"""
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    get_contraction_hierarchy(graph)
+    compiled.contract_on_demand = False
+    for road in graph.roads.values():
+        road.current_traffic = 1.0
+    compiled.refresh_traffic(graph.roads)
+
+    def no_build(*args, **kwargs):
+        raise AssertionError("contracted on the request path")
+
+    monkeypatch.setattr(ContractionHierarchy, 'build', staticmethod(no_build))
+    with pytest.raises(HierarchyNotReady):
+        get_contraction_hierarchy(graph)
+    for start, end in sample_pairs(graph, count=10):
+        expected = dijkstra(graph, start, end)
+        assert find_path(graph, start, end, algorithm="ch")[1] == pytest.approx(expected[1])
+    sources = [start for start, _ in sample_pairs(graph, count=4)]
+    assert travel_time_matrix(graph, sources, method="ch").method == "dijkstra"
+
+    # A customizable topology is still re-weighted on demand
+    monkeypatch.undo()
+    get_cch_topology(graph)
+    assert get_contraction_hierarchy(graph).matches(compiled.traffic_snapshot)
+
+
+def test_concurrent_queries_share_one_hierarchy_build(monkeypatch):
+    """Requests arriving together after a traffic change contract the graph once"""
+    graph = GridGraph()
+    get_contraction_hierarchy(graph)
+    for road in graph.roads.values():
+        road.current_traffic = 1.0
+    get_compiled_graph(graph).refresh_traffic(graph.roads)
+
+    build = ContractionHierarchy.build
+    builds = []
+
+    def counting_build(*args, **kwargs):
+        builds.append(1)
+        time.sleep(0.05)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(ContractionHierarchy, 'build', staticmethod(counting_build))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_contraction_hierarchy(graph)))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert all(hierarchy is results[0] for hierarchy in results)
+
+
+def test_hierarchy_refreshes_coalesce_into_one_build(monkeypatch):
+    """Updates arriving during a slow rebuild lead to one more build, for the latest traffic"""
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    build = ContractionHierarchy.build
+    builds = []
+    started = threading.Event()
+
+    def slow_build(*args, **kwargs):
+        builds.append(1)
+        started.set()
+        time.sleep(0.1)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(ContractionHierarchy, 'build', staticmethod(slow_build))
+    thread = refresh_hierarchy_async(graph)
+    started.wait()
+    for factor in (1.5, 2.0, 2.5, 3.0):
+        compiled.set_traffic(compiled.traffic * factor)
+        assert refresh_hierarchy_async(graph) is thread
+    thread.join()
+
+    assert len(builds) == 2
+    assert compiled.contraction_hierarchy.matches(compiled.traffic_snapshot)
+    # Nothing to do once the hierarchy matches
+    refresh_hierarchy_async(graph).join()
+    assert len(builds) == 2
+
+
+def test_customizable_hierarchy_follows_traffic():
+    """Re-customizing the CCH after a traffic change keeps queries optimal"""
+    graph = GridGraph()
+    topology = get_cch_topology(graph)
+
+    rng = random.Random(11)
+    for iteration in range(2):
+        hierarchy = customize(graph)
+        for start, end in sample_pairs(graph, count=30, seed=iteration):
+            expected_path, expected_time = dijkstra(graph, start, end)
+            path, time = hierarchy.query(start, end)
+            assert time == pytest.approx(expected_time)
+            if path is not None:
+                assert path_time(graph, path) == pytest.approx(time)
+
+        for road in graph.roads.values():
+            road.current_traffic = rng.uniform(0.8, 4.0)
+        get_compiled_graph(graph).refresh_traffic(graph.roads)
+
+    # The topology is reused rather than rebuilt
+    assert get_cch_topology(graph) is topology
+
+
+def test_alt_bounds_are_computed_per_node():
+    """The lazy bounds equal the best landmark bound, scaled for newer traffic"""
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    tables = LandmarkTables.build(compiled, count=4)
+    target = compiled.num_nodes - 1
+    with np.errstate(invalid='ignore'):
+        dense = np.fmax(np.nanmax(tables.forward[:, [target]] - tables.forward, axis=0),
+                        np.nanmax(tables.backward - tables.backward[:, [target]], axis=0))
+    dense = np.where(np.isnan(dense), 0, dense).astype(np.float64)
+    expected = np.maximum(dense - tables.slack, 0)
+
+    estimate = tables.heuristic(target, compiled.weights)
+    assert [estimate(node) for node in range(compiled.num_nodes)] == pytest.approx(expected.tolist())
+
+    slower = compiled.weights * 2
+    scale = tables.scale_for(compiled.weights / 2)
+    assert scale == pytest.approx(0.5)
+    estimate = tables.heuristic(target, compiled.weights / 2)
+    assert estimate(0) == pytest.approx(expected[0] * scale)
+    # Slower traffic keeps the bounds as they are
+    assert tables.scale_for(slower) == 1.0
+
+
+def test_alt_refused_until_landmarks_are_built():
+    """Requests don't build landmark tables once that is disabled"""
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    compiled.landmarks_on_demand = False
+    start, end = sample_pairs(graph, count=1)[0]
+    with pytest.raises(LandmarksNotReady):
+        find_path(graph, start, end, algorithm="alt")
+
+    get_landmark_tables(graph, count=4, build=True)
+    assert find_path(graph, start, end, algorithm="alt")[1] == pytest.approx(dijkstra(graph, start, end)[1])
+
+
+@pytest.mark.parametrize("strategy", ["farthest", "avoid"])
+def test_alt_heuristic_is_optimal_and_focused(strategy):
+    """ALT keeps routes optimal and settles fewer nodes than Dijkstra"""
+    graph = GridGraph(size=20)
+    compiled = get_compiled_graph(graph)
+    compiled.landmark_tables = LandmarkTables.build(compiled, count=8, strategy=strategy)
+
+    alt_settled = dijkstra_settled = 0
+    for start, end in sample_pairs(graph, count=40):
+        stats = {}
+        expected_path, expected_time = dijkstra(graph, start, end, engine="csr", stats=stats)
+        dijkstra_settled += stats['settled']
+        path, time = a_star(graph, start, end, heuristic="alt", stats=stats)
+        alt_settled += stats['settled']
+        assert time == pytest.approx(expected_time)
+
+    assert alt_settled < dijkstra_settled / 2
+
+
+def test_alt_tables_stay_admissible_until_refreshed():
+    """Stale tables are scaled down, then refreshed in the background"""
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    tables = LandmarkTables.build(compiled, count=4)
+    compiled.landmark_tables = tables
+
+    # Much lighter traffic makes the old distances overestimate
+    for road in graph.roads.values():
+        road.current_traffic = 0.5
+    compiled.refresh_traffic(graph.roads)
+
+    for start, end in sample_pairs(graph, count=20):
+        assert a_star(graph, start, end, heuristic="alt")[1] == pytest.approx(dijkstra(graph, start, end)[1])
+
+    refresh_landmarks_async(graph).join()
+    assert compiled.landmark_tables is not tables
+    assert compiled.landmark_tables.weights is compiled.weights
+
+
+@pytest.mark.parametrize("engine", ["objects", "csr"])
+def test_bidirectional_dijkstra_matches_dijkstra(engine):
+    """Both searches meet on an optimal, valid path"""
+    graph = GridGraph()
+    for start, end in sample_pairs(graph):
+        expected_path, expected_time = dijkstra(graph, start, end)
+        path, time = bidirectional_dijkstra(graph, start, end, engine=engine)
+        if expected_path is None:
+            assert path is None
+            continue
+        assert time == pytest.approx(expected_time)
+        assert path[0] == start and path[-1] == end
+        assert path_time(graph, path) == pytest.approx(time)
+
+
+@pytest.mark.parametrize("engine,heuristic", [
+    ("objects", "haversine"), ("csr", "haversine"), ("csr", "alt")
+])
+def test_bidirectional_a_star_is_optimal(engine, heuristic):
+    """The symmetric stopping rule keeps bidirectional A* optimal"""
+    graph = GridGraph(size=20)
+    compiled = get_compiled_graph(graph)
+    compiled.landmark_tables = LandmarkTables.build(compiled, count=8)
+
+    bidirectional_settled = dijkstra_settled = 0
+    for start, end in sample_pairs(graph, count=40):
+        stats = {}
+        expected_path, expected_time = dijkstra(graph, start, end, engine="csr", stats=stats)
+        dijkstra_settled += stats['settled']
+        path, time = bidirectional_a_star(graph, start, end, engine=engine,
+                                          heuristic=heuristic, stats=stats)
+        bidirectional_settled += stats['settled']
+        assert time == pytest.approx(expected_time)
+        if path is not None:
+            assert path_time(graph, path) == pytest.approx(time)
+
+    assert bidirectional_settled < dijkstra_settled
+
+
+def test_reverse_index_lists_incoming_roads():
+    graph = GridGraph()
+    index = reverse_adjacency_index(graph)
+    assert sum(len(roads) for roads in index.values()) == len(graph.roads)
+    assert all(road.end.id == node_id for node_id, roads in index.items() for road in roads)
+
+
+ENGINES = [
+    ("dijkstra", "objects"), ("dijkstra", "csr"), ("a_star", "objects"), ("a_star", "csr"),
+    ("alt", "csr"), ("ch", "csr"), ("bidirectional_dijkstra", "objects"),
+    ("bidirectional_dijkstra", "csr"), ("bidirectional_a_star", "objects"),
+    ("bidirectional_a_star", "csr")
+]
+
+
+@pytest.mark.parametrize("algorithm,engine", ENGINES)
+def test_routes_record_the_roads_used(algorithm, engine):
+    """Every engine returns the road ids along its path with running totals"""
+    graph = GridGraph()
+    for start, end in sample_pairs(graph, count=20):
+        route = find_path(graph, start, end, algorithm=algorithm, engine=engine)
+        if not route.found:
+            assert route.edge_ids == [] and route[1] == float('inf')
+            continue
+        assert len(route.edge_ids) == len(route.path) - 1
+        roads = [graph.roads[road_id] for road_id in route.edge_ids]
+        for road, a, b in zip(roads, route.path, route.path[1:]):
+            assert road.start.id == a and road.end.id == b
+        assert route.cumulative_times[-1] == pytest.approx(route.total_time)
+        assert route.total_distance == pytest.approx(sum(road.length for road in roads))
+
+
+@pytest.mark.parametrize("algorithm,engine", ENGINES)
+def test_route_takes_the_faster_parallel_road(algorithm, engine):
+    """With two roads between the same nodes, the route names the one it timed"""
+    graph = GridGraph()
+    for road in graph.roads.values():
+        road.current_traffic = 1.0
+    slow = graph.roads["0_1_0"]
+    fast = Road(
+        id="0_1_1",
+        start_intersection=slow.start,
+        end_intersection=slow.end,
+        length=slow.length,
+        speed_limit=slow.speed_limit * 3,
+        name="Express Lane"
+    )
+    graph.roads[fast.id] = fast
+    slow.start.add_connection(fast)
+
+    route = find_path(graph, 0, 1, algorithm=algorithm, engine=engine)
+    assert route.edge_ids == ["0_1_1"]
+    assert route.total_time == pytest.approx(fast.travel_time())
+
+
+def test_route_directions_follow_edge_ids():
+    graph = GridGraph()
+    graph.describe = lambda node_id: f"Node {node_id}"
+    route = dijkstra(graph, 0, 143)
+    directions = route.directions(graph)
+
+    assert [step['current_node'] for step in directions] == route.path[:-1]
+    assert [step['next_node'] for step in directions] == route.path[1:]
+    assert directions[0]['direction'] == "Start on"
+    assert sum(step['distance'] for step in directions) == pytest.approx(route.total_distance)
+
+
+def test_searches_pin_one_traffic_snapshot():
+    """Routes stay consistent with one snapshot while traffic keeps changing"""
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    edge_index = {road_id: e for e, road_id in enumerate(compiled.edge_ids)}
+    rng = random.Random(5)
+    variants = [np.array([rng.uniform(0.5, 6.0) for _ in range(compiled.num_edges)])
+                for _ in range(4)]
+    snapshots = {compiled.traffic_snapshot.version: compiled.traffic_snapshot}
+    done = threading.Event()
+
+    def update():
+        i = 0
+        while not done.is_set():
+            snapshot = compiled.set_traffic(variants[i % len(variants)])
+            snapshots[snapshot.version] = snapshot
+            i += 1
+
+    updater = threading.Thread(target=update)
+    updater.start()
+    try:
+        for start, end in sample_pairs(graph, count=40):
+            for algorithm in ("dijkstra", "a_star", "bidirectional_dijkstra"):
+                route = find_path(graph, start, end, algorithm=algorithm, engine="csr")
+                if not route.found:
+                    continue
+                weights = snapshots[route.traffic_version].weights
+                edges = [edge_index[road_id] for road_id in route.edge_ids]
+                assert route.total_time == pytest.approx(float(weights[edges].sum()))
+    finally:
+        done.set()
+        updater.join()
+    assert len(snapshots) > 1
+
+
+@pytest.mark.parametrize("method", ["ch", "dijkstra"])
+def test_travel_time_matrix_matches_single_routes(method):
+    graph = GridGraph()
+    rng = random.Random(9)
+    nodes = list(graph.intersections)
+    sources = rng.sample(nodes, 12)
+    targets = rng.sample(nodes, 9) + [sources[0]]
+
+    matrix = travel_time_matrix(graph, sources, targets, method=method, include_paths=True)
+    assert matrix.durations.shape == (12, 10)
+    for i, start in enumerate(sources):
+        for j, end in enumerate(targets):
+            expected_path, expected_time = dijkstra(graph, start, end, engine="csr")
+            assert matrix.durations[i, j] == pytest.approx(expected_time)
+            path = matrix.paths[i][j]
+            if expected_path is None:
+                assert path is None
+            else:
+                assert path[0] == start and path[-1] == end
+                assert path_time(graph, path) == pytest.approx(expected_time)
+    assert matrix.durations[0, -1] == 0
+
+
+def test_travel_time_matrix_auto_uses_existing_hierarchy():
+    graph = GridGraph()
+    assert travel_time_matrix(graph, [0, 1]).method == "dijkstra"
+    get_contraction_hierarchy(graph)
+    matrix = travel_time_matrix(graph, [0, 1])
+    assert matrix.method == "ch" and matrix.paths is None
+    assert matrix.minutes()[0][0] == 0
+
+
+def test_isochrone_contains_exactly_the_reachable_nodes():
+    graph = GridGraph()
+    origin = 66
+    budget = 0.02  # hours
+    area = isochrone(graph, origin, budget)
+
+    expected = {}
+    for node_id in graph.intersections:
+        _, time = dijkstra(graph, origin, node_id, engine="csr")
+        if time <= budget:
+            expected[node_id] = time
+    assert set(area.nodes) == set(expected)
+    assert area.nodes[0] == origin and area.times == sorted(area.times)
+    for node_id, time in zip(area.nodes, area.times):
+        assert time == pytest.approx(expected[node_id])
+
+    ring = area.to_geojson()["coordinates"][0]
+    assert len(ring) >= 4 and ring[0] == ring[-1]
+    lons = [point[0] for point in ring]
+    lats = [point[1] for point in ring]
+    for node_id in area.nodes:
+        node = graph.intersections[node_id]
+        assert min(lons) - 1e-9 <= node.lon <= max(lons) + 1e-9
+        assert min(lats) - 1e-9 <= node.lat <= max(lats) + 1e-9
+    assert area.traffic_version == get_compiled_graph(graph).traffic_snapshot.version
+
+
+@pytest.mark.parametrize("algorithm", ["dijkstra", "ch", "alt"])
+def test_batch_routing_matches_single_routes_in_order(algorithm):
+    graph = GridGraph()
+    pairs = sample_pairs(graph, count=80) + [(0, "missing")]
+    results = route_batch(graph, pairs, algorithm=algorithm, processes=2, chunk_size=16)
+
+    assert [(result["start"], result["end"]) for result in results] == pairs
+    assert results[-1]["error"] == "Invalid node IDs"
+    for (start, end), result in zip(pairs[:-1], results):
+        expected_path, expected_time = dijkstra(graph, start, end, engine="csr")
+        if expected_path is None:
+            assert result["error"] == "No route found"
+        else:
+            assert result["path"][0] == start and result["path"][-1] == end
+            assert result["duration_minutes"] == pytest.approx(expected_time * 60, abs=0.01)
+
+
+def test_batch_router_follows_traffic_updates_without_restarting_workers():
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    router = BatchRouter(graph, processes=2, min_pool_pairs=1)
+    try:
+        before = router.route([(0, 143)], algorithm="dijkstra")[0]
+        router.route([(0, 143)], algorithm="dijkstra")
+
+        compiled.set_traffic(compiled.traffic * 3)
+        after = router.route([(0, 143)], algorithm="dijkstra")[0]
+        assert router.pool_starts == 1
+        assert after["traffic_version"] == before["traffic_version"] + 1
+        assert after["duration_minutes"] == pytest.approx(before["duration_minutes"] * 3, abs=0.05)
+        # The graph's arrays plus the current traffic and weights; the
+        # previous state's files are gone
+        assert len(os.listdir(router._directory)) == 8
+    finally:
+        router.close()
+
+
+def test_batch_router_keeps_running_batches_on_their_state():
+    """A traffic update mid-batch publishes a new state without cutting the old batch off"""
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    router = BatchRouter(graph, processes=2, min_pool_pairs=1, chunk_size=8)
+    pairs = sample_pairs(graph, count=400)
+    try:
+        router.route(pairs[:1], algorithm="dijkstra")
+        results = {}
+        running = threading.Thread(
+            target=lambda: results.update(old=router.route(pairs, algorithm="dijkstra")))
+        running.start()
+        compiled.set_traffic(compiled.traffic * 3)
+        results["new"] = router.route(pairs[:20], algorithm="dijkstra")
+        running.join()
+
+        assert router.pool_starts == 1
+        assert len(results["old"]) == len(pairs)
+        assert not any("error" in result and result["error"] != "No route found"
+                       for result in results["old"] + results["new"])
+        assert {result["traffic_version"] for result in results["new"] if "path" in result} == {
+            compiled.traffic_snapshot.version}
+    finally:
+        router.close()
+
+
+def test_alternative_routes_pass_quality_filters():
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    weights = compiled.weights
+    found_alternatives = 0
+    for start, end in sample_pairs(graph, count=25):
+        _, best_time = dijkstra(graph, start, end, engine="csr")
+        routes = alternative_routes(graph, start, end, count=3)
+        if best_time == float('inf'):
+            assert routes == []
+            continue
+        assert routes[0].total_time == pytest.approx(best_time)
+        assert len(routes) <= 3
+        found_alternatives += len(routes) - 1
+
+        seen = set()
+        for route in routes:
+            assert route.path[0] == start and route.path[-1] == end
+            assert len(set(route.path)) == len(route.path)
+            assert route.total_time <= best_time * 1.25 + 1e-9
+            assert route.total_time == pytest.approx(path_time(graph, route.path))
+            if seen:
+                shared = sum(weights[compiled.edge_ids.index(edge_id)]
+                             for edge_id in route.edge_ids if edge_id in seen)
+                assert shared <= 0.8 * route.total_time + 1e-9
+            seen.update(route.edge_ids)
+    assert found_alternatives > 0
+
+
+def test_alternative_routes_are_filtered_against_the_main_route():
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    weights = compiled.weights
+    for start, end in sample_pairs(graph, count=25):
+        main = dijkstra(graph, start, end, engine="csr")
+        if not main.found:
+            continue
+        routes = alternative_routes(graph, start, end, count=3, main=main)
+        assert routes[0] is main
+        seen = set(main.edge_ids)
+        for route in routes[1:]:
+            assert route.edge_ids != main.edge_ids
+            shared = sum(weights[compiled.edge_ids.index(edge_id)]
+                         for edge_id in route.edge_ids if edge_id in seen)
+            assert shared <= 0.8 * route.total_time + 1e-9
+            seen.update(route.edge_ids)
+
+
+def test_alternative_routes_for_the_same_node():
+    graph = GridGraph()
+    routes = alternative_routes(graph, 5, 5)
+    assert len(routes) == 1 and routes[0].total_time == 0
+
+
+def test_time_dependent_routes_follow_the_profiles():
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    compiled.traffic_profiles = TrafficProfiles.uniform(compiled.num_edges, rush_hour_profile())
+    profiles = get_traffic_profiles(graph)
+    for start, end in sample_pairs(graph, count=20):
+        for departure in ("02:00", "07:55", "17:00", "2024-05-06T21:50:00"):
+            route = td_dijkstra(graph, start, end, departure)
+            if not route.found:
+                assert not td_a_star(graph, start, end, departure).found
+                continue
+            assert td_a_star(graph, start, end, departure).total_time == pytest.approx(route.total_time)
+
+            # Replaying the roads at the times they are entered gives the same total
+            now = departure_hours(departure)
+            for edge_id in route.edge_ids:
+                edge = compiled.edge_ids.index(edge_id)
+                free_flow = compiled.lengths[edge] / 1000 / compiled.speeds[edge]
+                now += free_flow * profiles.multipliers_at(now)[edge]
+            assert now - departure_hours(departure) == pytest.approx(route.total_time)
+
+
+def test_time_dependent_route_matches_static_under_flat_profile():
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    compiled.traffic_profiles = TrafficProfiles.uniform(compiled.num_edges, [1.0] * 96)
+    compiled.set_traffic(np.ones(compiled.num_edges))
+    for start, end in sample_pairs(graph, count=20):
+        _, expected = dijkstra(graph, start, end, engine="csr")
+        route = find_path(graph, start, end, algorithm="a_star", departure_time=8.5)
+        assert route.total_time == pytest.approx(expected)
+
+
+def test_rush_hour_departure_takes_longer():
+    graph = GridGraph()
+    compiled = get_compiled_graph(graph)
+    compiled.traffic_profiles = TrafficProfiles.uniform(compiled.num_edges, rush_hour_profile())
+    night = td_dijkstra(graph, 0, 143, "03:00")
+    rush = td_dijkstra(graph, 0, 143, "17:00")
+    assert rush.total_time == pytest.approx(night.total_time * 2.2 / 0.8)
@@ -0,0 +1,55 @@
+import pytest
+import random
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.geospatial import haversine_distance
+from src.utils.spatial_index import SpatialIndex
+
+
+def make_index(count=2000, seed=5):
+    rng = random.Random(seed)
+    points = {n: (33.35 + rng.random() * 0.1, -111.98 + rng.random() * 0.12)
+              for n in range(count)}
+    index = SpatialIndex(list(points), [p[0] for p in points.values()],
+                         [p[1] for p in points.values()])
+    return index, points
+
+
+def query_points(seed=9):
+    rng = random.Random(seed)
+    # Inside the map, near its edges and well outside it
+    return [(33.3 + rng.random() * 0.2, -112.05 + rng.random() * 0.25) for _ in range(50)]
+
+
+@pytest.mark.parametrize("k", [1, 5, 40])
+def test_nearest_matches_linear_scan(k):
+    index, points = make_index()
+    for lat, lon in query_points():
+        expected = sorted(haversine_distance(lat, lon, *p) for p in points.values())[:k]
+        result = index.nearest(lat, lon, k)
+        assert [d for _, d in result] == pytest.approx(expected)
+        for node_id, distance in result:
+            assert haversine_distance(lat, lon, *points[node_id]) == pytest.approx(distance)
+
+
+def test_radius_queries_match_linear_scan():
+    index, points = make_index()
+    for lat, lon in query_points():
+        expected = sorted(n for n, p in points.items() if haversine_distance(lat, lon, *p) <= 1.5)
+        assert sorted(n for n, _ in index.within(lat, lon, 1.5)) == expected
+
+        expected = sorted(n for n, p in points.items()
+                          if ((p[0] - lat) ** 2 + (p[1] - lon) ** 2) ** 0.5 < 0.01)
+        assert sorted(n for n, _ in index.within_degrees(lat, lon, 0.01)) == expected
+
+
+def test_results_are_sorted_and_limited():
+    index, _ = make_index()
+    result = index.within(33.4, -111.92, 2.0, limit=10)
+    assert len(result) == 10
+    distances = [d for _, d in result]
+    assert distances == sorted(distances)
+    # Asking for more than there are returns every intersection
+    assert len(index.nearest(33.4, -111.92, 5000)) == 2000
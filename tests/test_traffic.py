@@ -0,0 +1,145 @@
+import pytest
+import random
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.data.traffic_data import TrafficData
+from src.data.traffic_matcher import MATCH_DISTANCE, TrafficMatcher, parse_traffic_points
+from src.data import traffic_matcher
+from src.data.graph_builder import get_compiled_graph
+from src.data.traffic_profiles import BINS_PER_DAY, TrafficProfiles, rush_hour_profile
+
+
+def random_traffic(count=200, seed=4):
+    rng = random.Random(seed)
+    return {f"{33.39 + rng.random() * 0.04}_{-111.91 + rng.random() * 0.04}": rng.uniform(0.8, 5.0)
+            for _ in range(count)}
+
+
+def expected_multipliers(map_data, traffic_data):
+    """Reference: linear scan from each road midpoint"""
+    points = [(float(k.split('_')[0]), float(k.split('_')[1]), v) for k, v in traffic_data.items()]
+    result = []
+    for road_id in get_compiled_graph(map_data).edge_ids:
+        road = map_data.roads[road_id]
+        mid_lat = (road.start.lat + road.end.lat) / 2
+        mid_lon = (road.start.lon + road.end.lon) / 2
+        lat, lon, value = min(points, key=lambda p: (p[0] - mid_lat) ** 2 + (p[1] - mid_lon) ** 2)
+        close = ((lat - mid_lat) ** 2 + (lon - mid_lon) ** 2) ** 0.5 <= MATCH_DISTANCE
+        result.append(value if close else 1.0)
+    return result
+
+
+def test_parse_skips_malformed_ids():
+    lats, lons, values = parse_traffic_points({"33.4_-111.9": 2.0, "r12": 1.5, "a_b": 1.1})
+    assert lats.tolist() == [33.4] and lons.tolist() == [-111.9] and values.tolist() == [2.0]
+
+
+@pytest.mark.parametrize("use_kdtree", [True, False])
+def test_matcher_assigns_nearest_point(monkeypatch, use_kdtree, make_test_map):
+    if not use_kdtree:
+        monkeypatch.setattr(traffic_matcher, "cKDTree", None)
+    elif traffic_matcher.cKDTree is None:
+        pytest.skip("scipy not installed")
+
+    map_data = make_test_map()
+    matcher = TrafficMatcher(get_compiled_graph(map_data))
+    traffic = random_traffic()
+    multipliers, matched = matcher.match(traffic)
+    assert multipliers.tolist() == pytest.approx(expected_multipliers(map_data, traffic))
+    assert matched == len(map_data.roads)
+
+    # Far-away points leave every road at free flow
+    multipliers, matched = matcher.match({"40.0_-100.0": 3.0})
+    assert matched == 0 and np.all(multipliers == 1.0)
+
+
+def test_update_applies_multipliers_everywhere(monkeypatch, make_test_map):
+    map_data = make_test_map()
+    traffic_data = TrafficData(map_data, delta_threshold=0)
+    traffic = random_traffic()
+    monkeypatch.setattr(traffic_data.traffic_api, "get_traffic_flow", lambda bbox: traffic)
+    traffic_data.update_traffic()
+    assert traffic_data.version == 1
+    fingerprint = traffic_data.fingerprint
+
+    compiled = get_compiled_graph(map_data)
+    expected = expected_multipliers(map_data, traffic)
+    assert compiled.traffic.tolist() == pytest.approx(expected)
+    for road_id, weight in zip(compiled.edge_ids, compiled.weights.tolist()):
+        assert map_data.roads[road_id].travel_time() == pytest.approx(weight)
+
+    # Same data again: nothing changed, so the snapshot and version stay
+    assert len(traffic_data.update_traffic()) == 0
+    assert traffic_data.version == 1
+    assert traffic_data.fingerprint == fingerprint
+    assert traffic_data.stats()["changed_edges"] == 0
+
+
+def test_update_applies_and_publishes_only_the_delta(monkeypatch, make_test_map):
+    map_data = make_test_map()
+    compiled = get_compiled_graph(map_data)
+    traffic_data = TrafficData(map_data, delta_threshold=0.1)
+    deltas = []
+    traffic_data.subscribe(deltas.append)
+    traffic_data.subscribe(lambda delta: 1 / 0)  # A failing subscriber does not stop updates
+    multipliers = np.ones(compiled.num_edges)
+    monkeypatch.setattr(traffic_data, "_match_roads_to_traffic", lambda data: multipliers.copy())
+    monkeypatch.setattr(traffic_data.traffic_api, "get_traffic_flow", lambda bbox: {})
+
+    old = compiled.traffic_snapshot
+    weight_list = old.weight_list()
+    multipliers[[2, 5]] = 2.0
+    multipliers[7] = 1.05  # Within the threshold
+    delta = traffic_data.update_traffic()
+    assert deltas == [delta]
+    assert delta.edges.tolist() == [2, 5] and delta.after.tolist() == [2.0, 2.0]
+    assert (delta.previous_version, delta.version) == (old.version, old.version + 1)
+    assert not delta.faster
+    assert delta.edge_ids == [compiled.edge_ids[2], compiled.edge_ids[5]]
+    assert compiled.traffic[7] == 1.0
+    assert map_data.roads[compiled.edge_ids[5]].current_traffic == 2.0
+    # Patched weights equal a full recomputation, and the old snapshot is untouched
+    new = compiled.traffic_snapshot
+    assert new.weights.tolist() == compiled._compute_weights(new.traffic).tolist()
+    assert new.weight_list() == new.weights.tolist()
+    assert old.weight_list() is weight_list and old.traffic[2] == 1.0
+
+    # Small moves add up against the value in use
+    multipliers[7] = 1.15
+    delta = traffic_data.update_traffic()
+    assert delta.edges.tolist() == [7] and len(deltas) == 2
+    multipliers[2] = 1.0
+    assert traffic_data.update_traffic().faster
+    stats = traffic_data.stats()
+    assert (stats["updates"], stats["changed_edges"], stats["total_changed_edges"]) == (3, 1, 4)
+
+
+def test_profiles_share_quantized_curves():
+    rng = np.random.default_rng(2)
+    curves = rng.uniform(0.8, 3.0, size=(3, BINS_PER_DAY))
+    # 300 edges following three curves, one of them with sub-step noise
+    multipliers = curves[np.arange(300) % 3]
+    multipliers[::3] += 0.001
+    profiles = TrafficProfiles.build(multipliers)
+
+    assert profiles.num_profiles == 3
+    assert profiles.memory_usage() == 300 * 4 + 3 * (BINS_PER_DAY + 1)
+    assert profiles.multipliers_at(0.0) == pytest.approx(multipliers[:, 0], abs=0.0126)
+    halfway = profiles.multipliers_at(1.125)  # between bins 4 and 5
+    assert halfway == pytest.approx((multipliers[:, 4] + multipliers[:, 5]) / 2, abs=0.0126)
+    # Wraps from the last bin back to the first at midnight
+    assert profiles.multipliers_at(23.875) == pytest.approx(
+        (multipliers[:, -1] + multipliers[:, 0]) / 2, abs=0.0126)
+    assert profiles.multipliers_at(24.0) == pytest.approx(profiles.multipliers_at(0.0))
+
+
+def test_rush_hour_profile_has_peaks():
+    profiles = TrafficProfiles.uniform(4, rush_hour_profile())
+    assert profiles.num_profiles == 1
+    assert profiles.multipliers_at(17.0).tolist() == [2.2] * 4
+    assert profiles.multipliers_at(3.0).tolist() == [0.8] * 4
+    assert profiles.min_multipliers().tolist() == [0.8] * 4
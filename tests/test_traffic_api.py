@@ -0,0 +1,159 @@
+import pytest
+import json
+import sys
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api.traffic_api import TomTomTrafficAPI, split_bbox
+
+BBOX = (33.30, -112.00, 33.50, -111.80)  # 2 x 2 tiles of 0.1 degrees
+
+
+class FakeTomTom(BaseHTTPRequestHandler):
+    """
+    Serves one flow segment per tile, at the tile's south-west corner
+
+    Tiles in `failing` answer 503 that many times first; tiles in `slow`
+    answer after `delay` seconds. Every tile has the ETag of `version`.
+    """
+
+    def do_GET(self):
+        state = self.server.state
+        bbox = parse_qs(urlparse(self.path).query)["bbox"][0]
+        with state["lock"]:
+            state["requests"].append((bbox, self.headers.get("If-None-Match")))
+            failures = state["failing"].get(bbox, 0)
+            if failures:
+                state["failing"][bbox] = failures - 1
+        if failures:
+            self._reply(503, b"busy")
+            return
+        if bbox in state["slow"]:
+            time.sleep(state["delay"])
+
+        etag = f'"{state["version"]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._reply(304, b"", etag)
+            return
+        lat, lon = bbox.split(",")[:2]
+        segment = {
+            "coordinates": {"coordinate": [{"latitude": float(lat), "longitude": float(lon)}]},
+            "currentSpeed": 30,
+            "freeFlowSpeed": 60 * state["version"]
+        }
+        body = json.dumps({"flowSegmentData": {"freeFlowSegmentData": [segment]}}).encode()
+        self._reply(200, body, etag)
+
+    def _reply(self, status, body, etag=None):
+        try:
+            self.send_response(status)
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # The client gave up waiting
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeTomTom)
+    httpd.daemon_threads = True
+    httpd.state = {"lock": threading.Lock(), "requests": [], "failing": {}, "slow": set(),
+                   "delay": 0, "version": 1}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_api(server, **kwargs):
+    url = f"http://127.0.0.1:{server.server_address[1]}/traffic/services/4/"
+    return TomTomTrafficAPI("test-key", base_url=url, tile_degrees=0.1, **kwargs)
+
+
+def tile_key(tile):
+    return ",".join(f"{value:.6f}" for value in tile)
+
+
+def point_id(key):
+    """Road id the fake server's segment for a tile gets"""
+    lat, lon = key.split(",")[:2]
+    return f"{float(lat)}_{float(lon)}"
+
+
+def test_split_bbox_covers_the_area():
+    tiles = split_bbox((33.30, -112.00, 33.55, -111.80), 0.1)
+    assert len(tiles) == 3 * 2
+    assert tiles[0][:2] == (33.30, -112.00) and tiles[-1][2:] == (33.55, -111.80)
+    assert all(t[2] - t[0] <= 0.1 + 1e-9 and t[3] - t[1] <= 0.1 + 1e-9 for t in tiles)
+    assert split_bbox((33.4, -111.9, 33.4, -111.9)) == [(33.4, -111.9, 33.4, -111.9)]
+
+
+def test_tiles_are_merged_and_revalidated(server):
+    api = make_api(server)
+    traffic = api.get_traffic_flow(BBOX)
+    assert sorted(traffic) == sorted(point_id(tile_key(tile)) for tile in split_bbox(BBOX, 0.1))
+    assert set(traffic.values()) == {2.0}
+    assert api.last_fetch["fetched"] == 4
+    assert all(etag is None for _, etag in server.state["requests"])
+
+    # Unchanged tiles answer 304 and keep their data
+    assert api.get_traffic_flow(BBOX) == traffic
+    assert api.last_fetch["not_modified"] == 4
+    assert all(etag == '"1"' for _, etag in server.state["requests"][4:])
+
+    server.state["version"] = 2
+    assert set(api.get_traffic_flow(BBOX).values()) == {4.0}
+    assert api.last_fetch["fetched"] == 4
+    api.close()
+
+
+def test_failed_tiles_are_retried_or_left_out(server):
+    tiles = [tile_key(tile) for tile in split_bbox(BBOX, 0.1)]
+    server.state["failing"] = {tiles[0]: 1, tiles[1]: 10}
+    api = make_api(server, retries=2)
+
+    traffic = api.get_traffic_flow(BBOX)
+    # The first tile succeeded on its retry, the second ran out of retries
+    assert len(traffic) == 3
+    assert api.last_fetch == dict(api.last_fetch, fetched=3, failed=1)
+    assert [bbox for bbox, _ in server.state["requests"]].count(tiles[0]) == 2
+    api.close()
+
+
+def test_slow_tiles_keep_their_last_data(server):
+    tiles = [tile_key(tile) for tile in split_bbox(BBOX, 0.1)]
+    api = make_api(server, timeout=0.3, retries=0, deadline=2)
+    first = api.get_traffic_flow(BBOX)
+
+    server.state["version"] = 2
+    server.state["slow"] = {tiles[3]}
+    server.state["delay"] = 1.0
+    start = time.time()
+    traffic = api.get_traffic_flow(BBOX)
+    assert time.time() - start < 1.0
+    assert api.last_fetch == dict(api.last_fetch, fetched=3, stale=1)
+    stale_id = point_id(tiles[3])
+    assert traffic[stale_id] == first[stale_id] == 2.0
+    assert sorted(value for key, value in traffic.items() if key != stale_id) == [4.0] * 3
+    api.close()
+
+
+def test_falls_back_to_simulated_data_when_every_tile_fails(server):
+    tiles = [tile_key(tile) for tile in split_bbox(BBOX, 0.1)]
+    server.state["failing"] = {tile: 10 for tile in tiles}
+    api = make_api(server, retries=0)
+    traffic = api.get_traffic_flow(BBOX)
+    assert api.last_fetch["failed"] == 4
+    assert "r0" in traffic
+    api.close()
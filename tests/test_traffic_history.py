@@ -0,0 +1,186 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.data.traffic_data import TrafficData
+from src.data.traffic_history import TrafficHistory
+from src.data.traffic_profiles import TrafficProfiles, get_traffic_profiles, refresh_traffic_profiles_async
+from src.data.graph_builder import get_compiled_graph
+
+EDGES = [f"road{i}" for i in range(5)]
+
+
+def fill(history, rows, start=1000.0, step=60.0):
+    """Append rows whose value encodes (row, edge) and return them"""
+    values = np.array([[row + edge / 10 for edge in range(history.num_edges)] for row in range(rows)])
+    for row in range(rows):
+        history.append(start + row * step, values[row])
+    return start + np.arange(rows) * step, values
+
+
+def test_reads_span_sealed_and_active_segments(tmp_path):
+    history = TrafficHistory(str(tmp_path), EDGES, segment_rows=4)
+    times, values = fill(history, 10)
+    assert history.num_rows == 10
+
+    read_times, read_values = history.read()
+    assert read_times.tolist() == times.tolist()
+    assert read_values == pytest.approx(values)
+
+    # [start, end) across a segment boundary, a subset of roads
+    read_times, read_values = history.read(times[2], times[7], edges=[1, 3])
+    assert read_times.tolist() == times[2:7].tolist()
+    assert read_values == pytest.approx(values[2:7][:, [1, 3]])
+
+    road_times, road_values = history.road(4, start=times[5])
+    assert road_times.tolist() == times[5:].tolist()
+    assert road_values == pytest.approx(values[5:, 4])
+
+    timestamp, latest = history.latest()
+    assert timestamp == times[-1] and latest == pytest.approx(values[-1])
+
+    with pytest.raises(ValueError):
+        history.append(times[-1], values[-1])
+
+
+def test_writers_sharing_a_directory_see_each_others_rows(tmp_path):
+    """Two handles (as in two workers) append in turn without losing or resealing rows"""
+    first = TrafficHistory(str(tmp_path), EDGES, segment_rows=4)
+    second = TrafficHistory(str(tmp_path), EDGES, segment_rows=4)
+    times, values = fill(first, 10)
+    for row in range(10):
+        (first if row % 2 else second).append(times[row] + 10000, values[row])
+
+    with pytest.raises(ValueError):
+        first.append(times[-1] + 10000, values[-1])
+    for history in (first, second):
+        read_times, read_values = history.read()
+        assert read_times.tolist() == times.tolist() + (times + 10000).tolist()
+        assert read_values == pytest.approx(np.concatenate([values, values]))
+        assert history.num_rows == 20
+
+
+def test_reopening_repairs_a_torn_append(tmp_path):
+    history = TrafficHistory(str(tmp_path), EDGES, segment_rows=4)
+    times, values = fill(history, 6)
+    history.close()
+    # A crash mid-append leaves part of a row behind
+    with open(history._values_path, 'ab') as file:
+        file.write(b"\x00" * 7)
+
+    reopened = TrafficHistory(str(tmp_path), EDGES, segment_rows=4)
+    read_times, read_values = reopened.read()
+    assert read_times.tolist() == times.tolist()
+    assert read_values == pytest.approx(values)
+    reopened.append(times[-1] + 60, values[-1])
+    assert reopened.num_rows == 7
+
+    # Another network gets its own history
+    assert TrafficHistory(str(tmp_path), EDGES[:3]).latest() is None
+
+
+def test_downsample_and_compact(tmp_path):
+    history = TrafficHistory(str(tmp_path), EDGES, segment_rows=4)
+    times, values = fill(history, 12, start=3600.0, step=900.0)  # three hours
+
+    bucket_times, means = history.downsample(3600, start=3600.0)
+    assert bucket_times.tolist() == [3600.0, 7200.0, 10800.0]
+    assert means == pytest.approx(values.reshape(3, 4, -1).mean(axis=1))
+
+    now = times[-1] + 60
+    stats = history.compact(retention=2 * 3600, downsample_after=0, interval=3600, now=now)
+    assert stats == {"removed": 1, "downsampled": 2}
+    read_times, read_values = history.read()
+    assert read_times.tolist() == [7200.0, 10800.0]
+    assert read_values == pytest.approx(values[4:].reshape(2, 4, -1).mean(axis=1))
+
+
+def test_profiles_from_history(tmp_path):
+    history = TrafficHistory(str(tmp_path), EDGES, segment_rows=8)
+    # Ten days with every road at 2.0 at 17:00 and 1.0 at 03:00 (local time)
+    day = np.datetime64('2024-05-06')
+    for offset in range(10):
+        for hour, level in ((3, 1.0), (17, 2.0)):
+            moment = (day + np.timedelta64(offset, 'D')).astype('datetime64[s]').astype(object)
+            timestamp = moment.replace(hour=hour).timestamp()
+            history.append(timestamp, np.full(len(EDGES), level))
+
+    profiles = TrafficProfiles.from_history(history)
+    assert profiles.num_profiles == 1
+    assert profiles.multipliers_at(17.0) == pytest.approx([2.0] * 5)
+    assert profiles.multipliers_at(3.0) == pytest.approx([1.0] * 5)
+    # Unobserved times of day fall back to each road's overall mean
+    assert profiles.multipliers_at(10.0) == pytest.approx([1.5] * 5)
+
+
+def test_profiles_fall_back_to_current_traffic_until_history_covers_a_day(tmp_path, make_test_map):
+    map_data = make_test_map()
+    compiled = get_compiled_graph(map_data)
+    history = TrafficHistory(str(tmp_path), compiled.edge_ids)
+    traffic = np.linspace(0.8, 2.0, compiled.num_edges)
+    compiled.set_traffic(traffic)
+
+    profiles = get_traffic_profiles(map_data)
+    assert profiles.source == "current"
+    for hour in (3.0, 8.5, 17.0):
+        assert profiles.multipliers_at(hour) == pytest.approx(traffic, abs=0.0126)
+    # The fallback follows traffic updates
+    compiled.set_traffic(traffic * 1.5)
+    assert get_traffic_profiles(map_data).multipliers_at(8.5) == pytest.approx(traffic * 1.5, abs=0.0126)
+
+    # Half a day of history is not enough to replace it
+    for hour in range(12):
+        history.append(1715000000.0 + hour * 3600, np.full(compiled.num_edges, 2.0))
+    refresh_traffic_profiles_async(map_data, history).join()
+    assert get_traffic_profiles(map_data).source == "current"
+
+    for hour in range(12, 25):
+        history.append(1715000000.0 + hour * 3600, np.full(compiled.num_edges, 2.0))
+    refresh_traffic_profiles_async(map_data, history).join()
+    profiles = get_traffic_profiles(map_data)
+    assert profiles.source == "history"
+    assert profiles.multipliers_at(8.5) == pytest.approx([2.0] * compiled.num_edges)
+    compiled.set_traffic(traffic)
+    assert get_traffic_profiles(map_data) is profiles
+
+
+def test_warm_restart_restores_latest_traffic(tmp_path, monkeypatch, make_test_map):
+    map_data = make_test_map()
+    edge_ids = get_compiled_graph(map_data).edge_ids
+    traffic_data = TrafficData(map_data, history=TrafficHistory(str(tmp_path), edge_ids))
+    monkeypatch.setattr(traffic_data.traffic_api, "get_traffic_flow",
+                        lambda bbox: {"33.405_-111.895": 2.5})
+    traffic_data.update_traffic()
+    expected = get_compiled_graph(map_data).traffic.copy()
+    assert (expected != 1.0).any()
+
+    restarted = make_test_map()
+    restored = TrafficData(restarted, history=TrafficHistory(str(tmp_path), edge_ids))
+    assert restored.restore_latest(max_age=60)
+    assert get_compiled_graph(restarted).traffic == pytest.approx(expected)
+    for road_id, traffic in zip(edge_ids, expected.tolist()):
+        assert restarted.roads[road_id].current_traffic == pytest.approx(traffic)
+
+    assert not TrafficData(make_test_map(), history=TrafficHistory(str(tmp_path), edge_ids)).restore_latest(max_age=-1)
+
+
+def test_history_write_errors_do_not_block_updates(tmp_path, monkeypatch, make_test_map):
+    map_data = make_test_map()
+    history = TrafficHistory(str(tmp_path), get_compiled_graph(map_data).edge_ids)
+    traffic_data = TrafficData(map_data, history=history)
+    monkeypatch.setattr(traffic_data.traffic_api, "get_traffic_flow",
+                        lambda bbox: {"33.405_-111.895": 2.5})
+
+    def full_disk(timestamp, multipliers):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(history, "append", full_disk)
+    published = []
+    traffic_data.subscribe(published.append)
+    delta = traffic_data.update_traffic()
+
+    assert len(delta) and published == [delta]
+    assert traffic_data.version == delta.snapshot.version